@@ -128,6 +128,76 @@ database_url = os.environ.get("DATABASE_URL")
 if database_url:
     DATABASES["default"] = dj_database_url.parse(database_url)
 
+# Survey submissions
+# Answers of one submission are written with a single batched INSERT;
+# very large surveys are split into chunks of this many rows.
+SURVEY_ANSWER_BATCH_SIZE = 500
+# Compiled submission plans are keyed by survey revision (last_updated),
+# so an edit simply moves on to a new key.
+SURVEY_PLAN_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Group commit: submissions arriving within this many seconds of each other
+# (threads of one process) share a single transaction. 0 disables it.
+SURVEY_GROUP_COMMIT_WINDOW = 0.005
+SURVEY_GROUP_COMMIT_MAX_BATCH = 200
+
+# Optional decoupled ingestion: survey_submit appends validated payloads to a
+# local SQLite journal and `manage.py drain_submissions` bulk-inserts them.
+SURVEY_SUBMISSION_SPOOL = os.environ.get('SURVEY_SUBMISSION_SPOOL', 'False') == 'True'
+SURVEY_SPOOL_PATH = os.environ.get('SURVEY_SPOOL_PATH', BASE_DIR / 'spool' / 'submissions.sqlite3')
+
+# Batch imports (NDJSON API, CSV command) are stored in chunks of this many responses.
+SURVEY_IMPORT_CHUNK_SIZE = 1000
+
+# Rendered respondent pages are cached per survey revision and language.
+# Surveys that shuffle questions/options get this many seeded variants.
+SURVEY_PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+SURVEY_PAGE_VARIANTS = 8
+
+# Survey page views are buffered per worker and written with F() increments
+# every FLUSH_INTERVAL seconds or once FLUSH_THRESHOLD hits are pending.
+SURVEY_VIEW_COUNT_FLUSH_INTERVAL = 10
+SURVEY_VIEW_COUNT_FLUSH_THRESHOLD = 100
+
+# Analytics payloads and correlation tables are cached per survey revision and
+# response watermark, so entries go stale on their own after a submit or edit.
+SURVEY_ANALYTICS_CACHE_TIMEOUT = 3600
+SURVEY_EXPORT_CACHE_TIMEOUT = 300
+
+# Cross-filter response indexes kept in each worker's memory (most recently
+# used surveys); an index holds every answer of its survey, so it is not
+# pickled through the cache backend.
+SURVEY_RESPONSE_INDEX_CACHE_SIZE = 16
+
+# Concurrent requests for the same uncached analytics/export result wait for a
+# single computation (a lock entry in the cache; needs a shared cache backend
+# to coalesce across worker processes). LOCK_TIMEOUT bounds a crashed leader,
+# WAIT how long a follower waits before computing on its own.
+SURVEY_SINGLE_FLIGHT_LOCK_TIMEOUT = 120
+SURVEY_SINGLE_FLIGHT_WAIT = 60
+
+# Rating questions with at least this many answers report their figures and
+# distribution from their t-digest sketch (exact while the scale has few
+# distinct values, approximate for wide ones) instead of decoding the exact
+# histogram. None keeps them exact.
+SURVEY_SKETCH_MIN_ANSWERS = 100000
+
+# Days shown by the response trend chart when no date range is selected, and
+# the longest range it accepts (hourly buckets over a year are ~8800 points).
+SURVEY_TREND_DEFAULT_DAYS = 30
+SURVEY_TREND_MAX_DAYS = 366
+
+# Cells per dense block when accumulating XᵀX for the correlation table
+# (1M cells = 8 MB of float64 per block, whatever the number of responses),
+# and per block of encoded answers handed to the sparse matrix builder.
+SURVEY_CORRELATION_BLOCK_CELLS = 1_000_000
+
+# Widest survey (numeric columns) whose correlation statistics are updated in
+# the submit transaction. The XᵀX blob is rewritten on every submit: ~80 KB and
+# ~0.3 ms of NumPy at 100 columns, ~2 MB and ~3 ms at 500, while the write lock
+# is held. Wider surveys are rebuilt on the next read instead.
+SURVEY_CORRELATION_INCREMENTAL_MAX_COLUMNS = 100
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -164,6 +234,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # Use simpler storage to prevent startup crashes if manifest is missing
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
 
+# Optional static snapshots of published surveys, pre-rendered (and gzipped) on
+# publish so the respondent page is served without templates or DB queries.
+# Files under STATIC_ROOT are also picked up by WhiteNoise at startup.
+SURVEY_STATIC_SNAPSHOTS = os.environ.get('SURVEY_STATIC_SNAPSHOTS', 'False') == 'True'
+SURVEY_SNAPSHOT_ROOT = os.path.join(STATIC_ROOT, 'surveys')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
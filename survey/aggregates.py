@@ -0,0 +1,304 @@
+"""
+Incrementally maintained per-question aggregates.
+
+Every stored submission folds its answers into QuestionAggregate histograms in
+the same transaction (see submission.save_submissions). The histograms are
+keyed by the raw answer values, so recording needs no knowledge of the question
+type beyond whether it is aggregated at all: free-text answers are nearly all
+distinct and would grow the row with every response, so TextQuestions are read
+from the answers instead. aggregate_analytics() interprets the histograms per
+question type and returns the same data as utility.get_question_analytics, in
+time that depends on the number of distinct answers rather than the number of
+responses; the figures come from the question models (stats.py) given the
+histograms. Rating answers also feed a mergeable t-digest (sketch.py); past
+SURVEY_SKETCH_MIN_ANSWERS answers a rating is reported from it alone.
+"""
+import json
+import math
+from collections import defaultdict
+from django.conf import settings
+from django.utils import timezone
+from . import sketch
+from .stats import scale_figures, summarize
+from .models import (
+    Answer, Question, QuestionAggregate, MultiChoiceQuestion, LikertQuestion,
+    RatingQuestion, RankQuestion, MatrixQuestion,
+)
+
+# The question types aggregate_analytics() reads from histograms
+AGGREGATED_TYPES = (MultiChoiceQuestion, LikertQuestion, RatingQuestion, RankQuestion, MatrixQuestion)
+
+
+def is_aggregated(question):
+    return isinstance(question, AGGREGATED_TYPES)
+
+def is_sketched(question):
+    """Only ratings read the digest (see _rating)."""
+    return isinstance(question, RatingQuestion)
+
+def aggregated_questions(submissions):
+    """
+    {question_id: sketched} of the aggregated questions answered in
+    `submissions`, from their 'aggregated' pairs (see
+    submission.build_submission); submissions built without them cost a single
+    type lookup.
+    """
+    aggregated, unknown = {}, set()
+    for s in submissions:
+        if 'aggregated' in s:
+            aggregated.update(s['aggregated'])
+        else:
+            unknown.update(question_id for question_id, _ in s['answers'])
+    unknown -= set(aggregated)
+    if unknown:
+        aggregated.update((q.id, is_sketched(q)) for q in Question.objects.filter(id__in=unknown).instance_of(*AGGREGATED_TYPES))
+    return aggregated
+
+def _key(value):
+    return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+def add_answer(aggregate, answer_data, weight=1):
+    """Fold one answer_data value into an aggregate (in memory)."""
+    if answer_data is not None and answer_data != '':
+        aggregate.answered += weight
+
+    if isinstance(answer_data, dict):
+        if any(v for v in answer_data.values() if v):
+            aggregate.filled += weight
+        for key, value in answer_data.items():
+            cell = aggregate.pairs.setdefault(key, {})
+            cell[_key(value)] = cell.get(_key(value), 0) + weight
+    else:
+        key = _key(answer_data)
+        aggregate.values[key] = aggregate.values.get(key, 0) + weight
+
+def numeric_value(answer_data):
+    """The score RatingQuestion reads from a scalar answer, or None."""
+    if answer_data == '' or isinstance(answer_data, (list, dict)):
+        return None
+    try:
+        value = float(answer_data)
+    except (ValueError, TypeError):
+        return None
+    return value if math.isfinite(value) else None
+
+def add_to_sketch(aggregate, answers):
+    """Merge the numeric ones of `answers` (iterable of (answer_data, count)) into a rating aggregate's digest."""
+    numeric = [(numeric_value(answer_data), count) for answer_data, count in answers]
+    aggregate.sketch = sketch.merge(aggregate.sketch or sketch.empty(),
+                                    [(value, count) for value, count in numeric if value is not None])
+
+def build_aggregates(aggregated):
+    """
+    Aggregates computed from the stored answers of the questions of
+    `aggregated` ({question_id: sketched}), as {question_id: unsaved aggregate}.
+    """
+    aggregates = {qid: QuestionAggregate(question_id=qid, values={}, pairs={}) for qid in aggregated}
+    rows = Answer.objects.filter(question_id__in=aggregates)
+    for question_id, answer_data in rows.values_list('question_id', 'answer_data').iterator(chunk_size=2000):
+        add_answer(aggregates[question_id], answer_data)
+    for question_id, aggregate in aggregates.items():
+        if aggregated[question_id]:
+            add_to_sketch(aggregate, _values(aggregate))
+    return aggregates
+
+def update_aggregates(answers, aggregated):
+    """
+    Fold freshly inserted Answer objects into the aggregates of their
+    questions, for the questions of `aggregated` (see aggregated_questions).
+    Runs inside the transaction that inserted them; the aggregate rows are
+    locked so concurrent submissions cannot lose each other's counts.
+    A question seen for the first time gets an empty aggregate; one that
+    already has answers but no aggregate (created before aggregates existed, or
+    dropped by a migration) is skipped rather than rescanned while the write
+    lock is held: rebuild_aggregates() restores it and analytics read its
+    answers meanwhile.
+    """
+    by_question = defaultdict(list)
+    for answer in answers:
+        if answer.question_id in aggregated:
+            by_question[answer.question_id].append(answer.answer_data)
+    if not by_question:
+        return
+
+    locked = {a.question_id: a for a in QuestionAggregate.objects.select_for_update().filter(question_id__in=by_question)}
+    missing = set(by_question) - set(locked)
+    if missing:
+        batch_responses = {answer.response_id for answer in answers}
+        fresh = [qid for qid in missing
+                 if not Answer.objects.filter(question_id=qid).exclude(response_id__in=batch_responses).exists()]
+        # Another transaction (a submit or a rebuild) may have created some of them meanwhile; theirs is as good as ours
+        QuestionAggregate.objects.bulk_create([QuestionAggregate(question_id=qid, values={}, pairs={}) for qid in fresh], ignore_conflicts=True)
+        locked.update({a.question_id: a for a in QuestionAggregate.objects.select_for_update().filter(question_id__in=missing)})
+        for question_id in set(by_question) - set(locked):
+            del by_question[question_id]
+
+    for question_id, values in by_question.items():
+        for answer_data in values:
+            add_answer(locked[question_id], answer_data)
+        if aggregated[question_id]:
+            add_to_sketch(locked[question_id], [(answer_data, 1) for answer_data in values])
+        locked[question_id].updated_at = timezone.now()
+    QuestionAggregate.objects.bulk_update(locked.values(), ['answered', 'filled', 'values', 'pairs', 'sketch', 'updated_at'])
+
+def rebuild_aggregates(questions):
+    """Recompute the aggregates of `questions` from scratch (dropping those of non-aggregated ones)."""
+    question_ids = [q.id for q in questions]
+    aggregates = build_aggregates({q.id: is_sketched(q) for q in questions if is_aggregated(q)})
+    QuestionAggregate.objects.filter(question_id__in=question_ids).delete()
+    QuestionAggregate.objects.bulk_create(aggregates.values())
+    return len(aggregates)
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def _values(aggregate):
+    """(answer_data, count) pairs of the scalar and list answers."""
+    return [(json.loads(key), count) for key, count in aggregate.values.items()]
+
+def _pairs(aggregate, key):
+    return [(json.loads(value), count) for value, count in aggregate.pairs[key].items()]
+
+def _add(histogram, score, count):
+    histogram[score] = histogram.get(score, 0) + count
+
+def _multi_choice(question, aggregate, data):
+    distribution = {option: 0 for option in question.options}
+    for answer_data, count in _values(aggregate):
+        if not answer_data:
+            continue
+        for item in (answer_data if isinstance(answer_data, list) else [answer_data]):
+            if item in distribution:
+                distribution[item] += count
+    data['distribution'] = distribution
+    data['chart_type'] = 'bar'
+
+def _likert(question, aggregate, data):
+    scores = {}
+    distribution = {opt: 0 for opt in question.options}
+    for answer_data, count in _values(aggregate):
+        val_str = str(answer_data)
+        if val_str in question.options:
+            _add(scores, question.options.index(val_str) + 1, count)
+        if val_str in distribution:
+            distribution[val_str] += count
+        elif val_str.isdigit() and 0 <= int(val_str) - 1 < len(question.options):
+            distribution[question.options[int(val_str) - 1]] += count
+
+    data.update(question.get_statistic(histogram=scores))
+    data['distribution'] = distribution
+    data['chart_type'] = 'bar'
+
+def use_sketch(aggregate):
+    """Large ratings are reported from their digest (SURVEY_SKETCH_MIN_ANSWERS, None keeps them exact)."""
+    threshold = settings.SURVEY_SKETCH_MIN_ANSWERS
+    return threshold is not None and aggregate.answered >= threshold and bool(aggregate.sketch)
+
+def _rating_from_sketch(question, digest, data):
+    """
+    Rating statistics from the digest alone, without decoding the histogram:
+    exact moments, sketch median, and the distribution from the centroids
+    (exact counts while the scale has at most sketch.COMPRESSION distinct values).
+    """
+    distribution = {i: 0 for i in range(question.range_min, question.range_max + 1)}
+    for mean, weight in digest['centroids']:
+        if round(mean) in distribution:
+            distribution[round(mean)] += weight
+    data['distribution'] = distribution
+
+    described = summarize([digest['n']], [digest['sum']], [digest['sum_squares']], [sketch.median(digest)])
+    figures = scale_figures(described, **question.scale())[0]
+    data.update(question.get_statistic(figures=figures))
+    data['average'] = round(figures['mean'], 2) if figures['n'] else 0
+
+def _rating(question, aggregate, data):
+    data['chart_type'] = 'bar'
+    if use_sketch(aggregate):
+        _rating_from_sketch(question, aggregate.sketch, data)
+        return
+
+    scores = {}
+    for answer_data, count in _values(aggregate):
+        if answer_data == '':
+            continue
+        try:
+            _add(scores, float(answer_data), count)
+        except (ValueError, TypeError):
+            continue
+
+    distribution = {i: 0 for i in range(question.range_min, question.range_max + 1)}
+    for score, count in scores.items():
+        if int(score) in distribution:
+            distribution[int(score)] += count
+
+    data['distribution'] = distribution
+    figures = question.get_figures(list(scores), counts=list(scores.values()))
+    data.update(question.get_statistic(figures=figures))
+    data['average'] = round(figures['mean'], 2) if figures['n'] else 0
+
+def _rank(question, aggregate, data):
+    stats = {opt: {'sum': 0, 'count': 0} for opt in question.options}
+    for item in aggregate.pairs:
+        if item not in stats:
+            continue
+        for score, count in _pairs(aggregate, item):
+            try:
+                stats[item]['sum'] += int(score) * count
+                stats[item]['count'] += count
+            except (ValueError, TypeError):
+                pass
+
+    results = {opt: round(s['sum'] / s['count'], 2) if s['count'] else 0 for opt, s in stats.items()}
+    data['distribution'] = dict(sorted(results.items(), key=lambda item: item[1], reverse=True))
+    data['chart_type'] = 'bar'
+
+def _matrix(question, aggregate, data):
+    data['total_question_answers'] = aggregate.filled
+
+    distribution = {row: {col: 0 for col in question.columns} for row in question.rows}
+    row_scores = {row: {} for row in question.rows}
+    for key in aggregate.pairs:
+        row = question.match_row(key)
+        if row is None:
+            continue
+        for col_val, count in _pairs(aggregate, key):
+            if col_val in question.columns:
+                distribution[row][col_val] += count
+                _add(row_scores[row], question.columns.index(col_val) + 1, count)
+
+    row_statistics = question.get_row_statistics(histograms=row_scores)
+    data['matrix_rows'] = []
+    for row, cols in distribution.items():
+        row_stat = row_statistics[row]
+        data['matrix_rows'].append({
+            'label': row,
+            'cols': cols,
+            'mean': row_stat['mean'],
+            'median': row_stat['median'],
+            'interpretation': row_stat['interpretation'],
+            't_stat': row_stat['t_stat'],
+            'total_responses': sum(cols.values()),
+        })
+    data['columns'] = question.columns
+    data['chart_type'] = 'stacked-bar'
+
+def aggregate_analytics(question, aggregate):
+    """The data of utility.get_question_analytics(question), read from its aggregate."""
+    data = {
+        'question': question,
+        'type': type(question).__name__,
+        'total_question_answers': aggregate.answered,
+    }
+    if isinstance(question, MultiChoiceQuestion):
+        _multi_choice(question, aggregate, data)
+    elif isinstance(question, LikertQuestion):
+        _likert(question, aggregate, data)
+    elif isinstance(question, RatingQuestion):
+        _rating(question, aggregate, data)
+    elif isinstance(question, RankQuestion):
+        _rank(question, aggregate, data)
+    elif isinstance(question, MatrixQuestion):
+        _matrix(question, aggregate, data)
+    return data
@@ -0,0 +1,81 @@
+"""
+Survey-level analytics.
+
+get_question_analytics() used to be called once per question, and each call
+re-read that question's answers several times (respondent count, scores,
+distribution, average...). get_survey_analytics() reads every answer of the
+requested questions in a single values_list stream and hands each question its
+pre-gathered values, so the analytics page costs the same number of queries
+whatever the question count. Questions with a QuestionAggregate skip the answer
+stream altogether (see aggregates.py). chart_payload() turns the analytics of
+a question into the data of its chart.
+"""
+from .aggregates import aggregate_analytics, is_aggregated
+from .models import Answer, QuestionAggregate, LikertQuestion, RatingQuestion, MatrixQuestion
+from .utility import get_question_analytics
+
+
+def gather_answers(questions):
+    """
+    One pass over the answers of `questions`.
+    Returns ({question_id: [answer_data, ...]}, {question_id: respondent count}),
+    where a respondent counts once they gave a non-empty answer.
+    """
+    answers = {q.id: [] for q in questions}
+    respondents = {q.id: set() for q in questions}
+    if not questions:
+        return answers, {}
+
+    rows = Answer.objects.filter(question_id__in=answers)\
+                         .values_list('question_id', 'response_id', 'answer_data')
+    for question_id, response_id, answer_data in rows.iterator(chunk_size=2000):
+        answers[question_id].append(answer_data)
+        if answer_data is not None and answer_data != '':
+            respondents[question_id].add(response_id)
+
+    return answers, {question_id: len(ids) for question_id, ids in respondents.items()}
+
+def get_survey_analytics(questions):
+    """Analytics data for each of `questions`, in order (see get_question_analytics)."""
+    questions = list(questions)
+    if not questions:
+        return []
+
+    aggregates = {a.question_id: a for a in QuestionAggregate.objects.filter(question__in=[q for q in questions if is_aggregated(q)])}
+    # Questions answered before aggregates existed (and not rebuilt yet) are read from the answers
+    answers, respondent_counts = gather_answers([q for q in questions if q.id not in aggregates])
+
+    return [
+        aggregate_analytics(q, aggregates[q.id]) if q.id in aggregates else
+        get_question_analytics(q, answers=answers[q.id], respondent_count=respondent_counts[q.id])
+        for q in questions
+    ]
+
+def chart_payload(data):
+    """Chart.js data of one question, from its analytics data (see get_question_analytics)."""
+    question = data['question']
+    payload = {
+        'labels': [],
+        'values': [],
+        'question_label': question.label,
+    }
+    if isinstance(question, MatrixQuestion):
+        # Stacked bars: one dataset per column, one bar per row
+        payload['labels'] = question.rows
+        payload['datasets'] = [
+            {'label': col, 'data': [row['cols'].get(col, 0) for row in data['matrix_rows']]}
+            for col in question.columns
+        ]
+        payload['is_stacked'] = True
+    elif 'distribution' in data:
+        distribution = data['distribution']
+        if isinstance(question, (LikertQuestion, RatingQuestion)):
+            payload['labels'] = [str(k) for k in distribution.keys()]
+        else:
+            payload['labels'] = list(distribution.keys())
+        payload['values'] = list(distribution.values())
+        if isinstance(question, LikertQuestion):
+            payload['average'] = data['mean']
+        elif isinstance(question, RatingQuestion):
+            payload['average'] = data['average']
+    return payload
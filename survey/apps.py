@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MysurveyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'survey'
+
+    def ready(self):
+        from . import signals  # registers the snapshot receivers
@@ -0,0 +1,131 @@
+"""
+Per-option response bitmaps for cross-filtered analytics.
+
+A survey's ResponseIndex numbers its responses 0..n-1 (ordinals) and keeps,
+for every (question, option) pair, a NumPy bool array with True at the
+ordinals of the responses that chose it, plus each question's answers laid
+out by ordinal. A filter such as "respondents who chose B on Q2" is then
+an AND/OR of a few arrays, and the analytics of any question over the
+matching responses are computed from the index without another query.
+
+Options are the raw answer values: each selected item of a multiple choice
+answer, the value of a single-choice, Likert or Rating answer, and
+"key=value" for every cell of a Matrix or Rank answer. Free-text questions
+keep their answers but get no bitmaps. The index is cached per survey
+revision in each worker's memory by caching.cached_response_index().
+"""
+from collections import defaultdict
+import numpy as np
+from django.utils import timezone
+from .models import Answer, Response, TextQuestion
+from .utility import get_question_analytics
+
+
+def option_keys(answer_data):
+    """The options an answer counts towards."""
+    if answer_data is None or answer_data == '':
+        return []
+    if isinstance(answer_data, list):
+        return [str(item) for item in answer_data if item != '']
+    if isinstance(answer_data, dict):
+        return [f"{key}={value}" for key, value in answer_data.items() if value]
+    return [str(answer_data)]
+
+def parse_filters(values):
+    """
+    'question_id:option' query values as {question_id: [option, ...]},
+    ignoring malformed ones.
+    """
+    filters = defaultdict(list)
+    for value in values:
+        question_id, _, option = value.partition(':')
+        if question_id.isdigit() and option:
+            filters[int(question_id)].append(option)
+    return dict(filters)
+
+
+class ResponseIndex:
+    def __init__(self, response_ids, days, answers, bitmaps):
+        self.response_ids = response_ids
+        # Local creation date of each response, for date-range filters
+        self.days = days
+        # {question_id: [answer_data or None, ...]} by ordinal
+        self.answers = answers
+        # {question_id: {option: bool array}}
+        self.bitmaps = bitmaps
+
+    @classmethod
+    def build(cls, survey):
+        """Index every response of `survey` (a query for the responses, one for the question types, one answer stream)."""
+        responses = list(Response.objects.filter(survey=survey).order_by('id').values_list('id', 'created_at'))
+        response_ids = np.array([response_id for response_id, _ in responses], dtype=np.int64)
+        days = np.array([timezone.localdate(created_at) for _, created_at in responses], dtype='datetime64[D]')
+        size = len(response_ids)
+        ordinal_of = {response_id: ordinal for ordinal, (response_id, _) in enumerate(responses)}
+        text_questions = set(survey.questions.instance_of(TextQuestion).values_list('id', flat=True))
+
+        answers = defaultdict(lambda: [None] * size)
+        ordinals = defaultdict(lambda: defaultdict(list))
+        rows = Answer.objects.filter(response__survey=survey)\
+                             .values_list('response_id', 'question_id', 'answer_data')
+        for response_id, question_id, answer_data in rows.iterator(chunk_size=2000):
+            ordinal = ordinal_of[response_id]
+            answers[question_id][ordinal] = answer_data
+            if question_id not in text_questions:
+                for option in option_keys(answer_data):
+                    ordinals[question_id][option].append(ordinal)
+
+        bitmaps = {}
+        for question_id, options in ordinals.items():
+            bitmaps[question_id] = {}
+            for option, positions in options.items():
+                bitmap = np.zeros(size, dtype=bool)
+                bitmap[positions] = True
+                bitmaps[question_id][option] = bitmap
+        return cls(response_ids, days, dict(answers), bitmaps)
+
+    def __len__(self):
+        return len(self.response_ids)
+
+    def everyone(self):
+        return np.ones(len(self), dtype=bool)
+
+    def match(self, filters):
+        """
+        Responses matching `filters` ({question_id: [option, ...]}): options
+        of one question are OR'ed, questions are AND'ed.
+        """
+        mask = self.everyone()
+        for question_id, options in filters.items():
+            chosen = np.zeros(len(self), dtype=bool)
+            for option in options:
+                bitmap = self.bitmaps.get(question_id, {}).get(option)
+                if bitmap is not None:
+                    chosen |= bitmap
+            mask &= chosen
+        return mask
+
+    def between(self, start=None, end=None):
+        """Responses created from date `start` to date `end` (inclusive; None leaves that side open)."""
+        mask = self.everyone()
+        if start is not None:
+            mask &= self.days >= np.datetime64(start, 'D')
+        if end is not None:
+            mask &= self.days <= np.datetime64(end, 'D')
+        return mask
+
+    def question_answers(self, question_id, mask):
+        """The answers to a question among the responses of `mask`."""
+        answers = self.answers.get(question_id)
+        if answers is None:
+            return []
+        return [answers[ordinal] for ordinal in np.flatnonzero(mask) if answers[ordinal] is not None]
+
+    def analytics(self, questions, mask):
+        """get_question_analytics() of each question over the responses of `mask`."""
+        results = []
+        for question in questions:
+            answers = self.question_answers(question.id, mask)
+            respondents = sum(1 for answer_data in answers if answer_data != '')
+            results.append(get_question_analytics(question, answers=answers, respondent_count=respondents))
+        return results
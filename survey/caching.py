@@ -0,0 +1,140 @@
+"""
+Cache for analytics results.
+
+Keys carry the survey revision (last_updated, bumped by every edit) and a
+response watermark (highest Response id and response count), so a new
+submission, an edit or a deleted response makes the old entries unreachable
+without any explicit invalidation, and from any code path or worker.
+A repeat visit to an unchanged survey costs the watermark query and cache reads.
+
+Misses go through single_flight(), so concurrent requests for the same result
+(a dozen stakeholders opening a survey that just closed) wait for one
+computation instead of running it in parallel.
+
+Response indexes (bitmaps.py) are the exception: they hold every answer of a
+survey, and the cache backend would pickle one on every set and unpickle it on
+every filtered request, so each worker keeps its most recently used ones in
+memory instead.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Count
+from .analytics import get_survey_analytics
+from .bitmaps import ResponseIndex
+from .models import Response
+from .utility import get_correlation_table, get_survey_export_data, get_survey_data_by_sections
+
+# How often requests waiting on another one's computation look for its result
+POLL_INTERVAL = 0.05
+
+# {survey id: (revision, ResponseIndex)}, least recently used first
+_response_indexes = OrderedDict()
+_response_indexes_lock = threading.Lock()
+
+
+def response_watermark(survey):
+    """(highest response id, response count) of the survey, in one query."""
+    watermark = Response.objects.filter(survey=survey).order_by()\
+                                .aggregate(last_id=Max('id'), count=Count('id'))
+    return watermark['last_id'] or 0, watermark['count']
+
+def analytics_revision(survey, watermark=None):
+    last_id, count = watermark or response_watermark(survey)
+    return f"{survey.last_updated.isoformat()}:{last_id}:{count}"
+
+def _digest(values):
+    return hashlib.md5(",".join(str(v) for v in values).encode()).hexdigest()
+
+def single_flight(key, compute, timeout):
+    """
+    cache[key], computed by at most one caller at a time. The caller that wins
+    the lock entry (an atomic cache.add) computes and stores the result; the
+    others poll the cache for it. If the leader fails, a waiter takes over the
+    lock; past SURVEY_SINGLE_FLIGHT_WAIT a waiter computes on its own.
+    Coalescing spans workers only with a shared cache backend.
+    Results are stored wrapped in a 1-tuple, so a None result (e.g. no
+    correlation table) is cached like any other instead of reading as a miss.
+    """
+    cached = cache.get(key)
+    if cached is not None:
+        return cached[0]
+
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + settings.SURVEY_SINGLE_FLIGHT_WAIT
+    while True:
+        if cache.add(lock_key, True, settings.SURVEY_SINGLE_FLIGHT_LOCK_TIMEOUT):
+            try:
+                result = compute()
+                cache.set(key, (result,), timeout)
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        time.sleep(POLL_INTERVAL)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0]
+        if time.monotonic() > deadline:
+            return compute()
+
+def cached_survey_analytics(survey, questions, revision=None):
+    """get_survey_analytics(questions), with each question's payload cached per revision."""
+    questions = list(questions)
+    revision = revision or analytics_revision(survey)
+    keys = {q.id: f"survey:{survey.id}:analytics:{q.id}:{revision}" for q in questions}
+
+    cached = cache.get_many(list(keys.values()))
+    missing = [q for q in questions if keys[q.id] not in cached]
+    if missing:
+        def compute():
+            return {keys[data['question'].id]: data for data in get_survey_analytics(missing)}
+
+        batch_key = f"survey:{survey.id}:analytics-batch:{_digest(q.id for q in missing)}:{revision}"
+        computed = single_flight(batch_key, compute, settings.SURVEY_ANALYTICS_CACHE_TIMEOUT)
+        cache.set_many(computed, settings.SURVEY_ANALYTICS_CACHE_TIMEOUT)
+        cached.update(computed)
+
+    return [cached[keys[q.id]] for q in questions]
+
+def cached_correlation_table(survey, questions_id, revision=None):
+    """get_correlation_table() cached per revision and question set."""
+    revision = revision or analytics_revision(survey)
+    key = f"survey:{survey.id}:correlation:{_digest(sorted(map(str, questions_id)))}:{revision}"
+
+    return single_flight(key, lambda: get_correlation_table(survey, questions_id),
+                         settings.SURVEY_ANALYTICS_CACHE_TIMEOUT)
+
+def cached_export_data(survey, format_type, revision=None):
+    """get_survey_export_data(survey, format_type) for the full export, cached per revision."""
+    revision = revision or analytics_revision(survey)
+    key = f"survey:{survey.id}:export:{format_type}:{revision}"
+    return single_flight(key, lambda: get_survey_export_data(survey, format_type),
+                         settings.SURVEY_EXPORT_CACHE_TIMEOUT)
+
+def cached_sections_data(survey, format_type, revision=None):
+    """get_survey_data_by_sections(survey, format_type) for the full export, cached per revision."""
+    revision = revision or analytics_revision(survey)
+    key = f"survey:{survey.id}:export-sections:{format_type}:{revision}"
+    return single_flight(key, lambda: get_survey_data_by_sections(survey, format_type),
+                         settings.SURVEY_EXPORT_CACHE_TIMEOUT)
+
+def cached_response_index(survey, revision=None):
+    """The survey's ResponseIndex (per-option bitmaps), built once per revision and worker."""
+    revision = revision or analytics_revision(survey)
+    with _response_indexes_lock:
+        entry = _response_indexes.get(survey.id)
+        if entry is not None and entry[0] == revision:
+            _response_indexes.move_to_end(survey.id)
+            return entry[1]
+
+    index = ResponseIndex.build(survey)
+    with _response_indexes_lock:
+        _response_indexes[survey.id] = (revision, index)
+        _response_indexes.move_to_end(survey.id)
+        while len(_response_indexes) > settings.SURVEY_RESPONSE_INDEX_CACHE_SIZE:
+            _response_indexes.popitem(last=False)
+    return index
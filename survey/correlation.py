@@ -0,0 +1,161 @@
+"""
+Running sufficient statistics for the correlation table.
+
+CorrelationStats keeps, per survey, the response count n, the column sums and
+XᵀX of the numeric response matrix (numeric.py, missing values as 0) for every
+column of the survey. Every stored submission adds its rows in the submit
+transaction (see submission.save_submissions), so the correlation of any
+subset of questions is a slice of these arrays passed to sparse.pearson(),
+without reading a single Answer row. Only surveys up to
+SURVEY_CORRELATION_INCREMENTAL_MAX_COLUMNS columns are kept up to date this
+way: the XᵀX blob grows with the square of the width and is rewritten on every
+submit, so wider surveys are left to the rebuild on read.
+
+The statistics are tied to a column layout (schema). A survey edit that
+changes the layout, or deleted responses (n no longer matches the response
+count), makes them stale; the next read rebuilds them from the answers, as
+does the rebuild_correlation_stats command.
+"""
+import hashlib
+import io
+import json
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from .models import CorrelationStats, Response, SectionHeader
+from .numeric import question_columns, build_sparse_matrix
+from .sparse import pearson
+
+
+def _pack(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+def _unpack(blob):
+    return np.load(io.BytesIO(bytes(blob)), allow_pickle=False)
+
+def _build_layout(questions):
+    headers, description = [], []
+    for question in questions:
+        question_headers = question_columns(question)[0]
+        headers.extend(question_headers)
+        description.append([question.id, type(question).__name__, question_headers])
+    schema = hashlib.md5(json.dumps(description, ensure_ascii=False).encode()).hexdigest()
+    return questions, headers, schema
+
+def _schema_key(survey_id, schema):
+    return f"survey:{survey_id}:correlation-questions:{schema}"
+
+def survey_layout(survey):
+    """(data questions by position, column headers, schema hash), cached per survey revision."""
+    key = f"survey:{survey.id}:correlation-layout:{survey.last_updated.isoformat()}"
+    layout = cache.get(key)
+    if layout is None:
+        layout = _build_layout(list(survey.questions.not_instance_of(SectionHeader).order_by('position')))
+        cache.set(key, layout, settings.SURVEY_PLAN_CACHE_TIMEOUT)
+        cache.set(_schema_key(survey.id, layout[2]), layout, settings.SURVEY_PLAN_CACHE_TIMEOUT)
+    return layout
+
+def _cached_layout(survey_id, schema):
+    """The layout cached for `schema` by survey_layout(), or None (never queries)."""
+    return cache.get(_schema_key(survey_id, schema))
+
+def submission_block(questions, submissions):
+    """
+    Dense rows of the numeric matrix for submission dicts (see
+    submission.build_submission), missing values as 0, plus which columns
+    hold a number in any of them.
+    """
+    starts, encoders, missing = {}, {}, []
+    for question in questions:
+        question_headers, unanswered, encode = question_columns(question)
+        starts[question.id] = len(missing)
+        encoders[question.id] = encode
+        missing.extend([unanswered] * len(question_headers))
+
+    block = np.tile(np.array(missing, dtype=np.float64), (len(submissions), 1))
+    for row, submission in enumerate(submissions):
+        for question_id, answer_data in submission['answers']:
+            if question_id in encoders:
+                for offset, value in encoders[question_id](answer_data):
+                    block[row, starts[question_id] + offset] = value
+    observed = ~np.isnan(block).all(axis=0)
+    return np.nan_to_num(block), observed
+
+def rebuild_correlation_stats(survey, layout=None):
+    """Recompute the survey's statistics from its stored answers."""
+    questions, _, schema = layout or survey_layout(survey)
+    matrix, _, observed, response_ids = build_sparse_matrix(survey, questions)
+    stats, _ = CorrelationStats.objects.update_or_create(survey=survey, defaults={
+        'schema': schema,
+        'n': len(response_ids),
+        'sums': _pack(matrix.column_sums()),
+        'gram': _pack(matrix.gram(settings.SURVEY_CORRELATION_BLOCK_CELLS)),
+        'observed': _pack(observed),
+    })
+    return stats
+
+def update_correlation_stats(submissions):
+    """
+    Add freshly stored submissions to their surveys' statistics. Runs inside
+    the transaction that stored them, with the statistics rows locked. Surveys
+    without statistics, wider than SURVEY_CORRELATION_INCREMENTAL_MAX_COLUMNS,
+    or whose layout is not cached (or changed since) are left to the next
+    rebuild, so no layout query or large blob rewrite happens here.
+    """
+    by_survey = {}
+    for s in submissions:
+        by_survey.setdefault(s['survey_id'], []).append(s)
+
+    layouts = {}
+    for survey_id, schema in CorrelationStats.objects.filter(survey_id__in=by_survey).values_list('survey_id', 'schema'):
+        layout = _cached_layout(survey_id, schema)
+        if layout is not None and len(layout[1]) <= settings.SURVEY_CORRELATION_INCREMENTAL_MAX_COLUMNS:
+            layouts[survey_id] = layout
+    if not layouts:
+        return
+
+    for stats in CorrelationStats.objects.select_for_update().filter(survey_id__in=layouts):
+        questions, _, schema = layouts[stats.survey_id]
+        if stats.schema != schema:
+            continue
+        block, observed = submission_block(questions, by_survey[stats.survey_id])
+        stats.n += len(block)
+        stats.sums = _pack(_unpack(stats.sums) + block.sum(axis=0))
+        stats.gram = _pack(_unpack(stats.gram) + block.T @ block)
+        stats.observed = _pack(_unpack(stats.observed) | observed)
+        stats.save(update_fields=['n', 'sums', 'gram', 'observed', 'updated_at'])
+
+def current_stats(survey):
+    """The survey's statistics and layout, rebuilt first when missing or stale."""
+    layout = survey_layout(survey)
+    stats = CorrelationStats.objects.filter(survey=survey).first()
+    if stats is None or stats.schema != layout[2] or stats.n != Response.objects.filter(survey=survey).count():
+        stats = rebuild_correlation_stats(survey, layout)
+    return stats, layout
+
+def correlation_of(survey, questions_id=None):
+    """
+    Pearson correlation of the columns of the selected questions (all when
+    `questions_id` is empty), from the running statistics.
+    Returns (selected questions, correlation matrix, columns holding a number, n).
+    """
+    stats, (questions, _, _) = current_stats(survey)
+    if questions_id:
+        selected_ids = {str(question_id) for question_id in questions_id}
+    else:
+        selected_ids = {str(q.id) for q in questions}
+
+    columns, selected, start = [], [], 0
+    for question in questions:
+        width = len(question_columns(question)[0])
+        if str(question.id) in selected_ids:
+            selected.append(question)
+            columns.extend(range(start, start + width))
+        start += width
+
+    columns = np.array(columns, dtype=np.int64)
+    sums, gram, observed = _unpack(stats.sums), _unpack(stats.gram), _unpack(stats.observed)
+    correlation = pearson(stats.n, sums[columns], gram[np.ix_(columns, columns)])
+    return selected, correlation, observed[columns], stats.n
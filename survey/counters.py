@@ -0,0 +1,56 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+# Per-worker buffer of survey page views: {survey_id: hits not yet written}
+_lock = threading.Lock()
+_pending = defaultdict(int)
+_last_flush = time.monotonic()
+
+
+def record_view(survey_id):
+    """
+    Count one view of a survey page. Hits are accumulated in memory and written
+    in bulk by flush_views(), so page views never rewrite the survey row.
+    """
+    global _last_flush
+    with _lock:
+        _pending[survey_id] += 1
+        due = (
+            time.monotonic() - _last_flush >= settings.SURVEY_VIEW_COUNT_FLUSH_INTERVAL
+            or sum(_pending.values()) >= settings.SURVEY_VIEW_COUNT_FLUSH_THRESHOLD
+        )
+    if due:
+        flush_views()
+
+def pending_views(survey_id):
+    """Views recorded by this worker that are not in the database yet."""
+    with _lock:
+        return _pending.get(survey_id, 0)
+
+def flush_views():
+    """Write the buffered views with one F()-based UPDATE per survey."""
+    from .models import Survey
+
+    global _last_flush
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+    for survey_id, hits in pending.items():
+        try:
+            Survey.objects.filter(pk=survey_id).update(view_count=F('view_count') + hits)
+        except Exception:
+            # Keep the hits for the next flush rather than losing them
+            logger.exception("Could not flush view count for survey %s", survey_id)
+            with _lock:
+                _pending[survey_id] += hits
+
+atexit.register(flush_views)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from survey.models import Survey
+from survey.rollups import backfill_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hourly/daily response rollups from the stored responses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_uuid', nargs='*', help="Surveys to backfill (default: all).")
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.all()
+        if options['survey_uuid']:
+            surveys = surveys.filter(uuid__in=options['survey_uuid'])
+            if surveys.count() != len(options['survey_uuid']):
+                raise CommandError("Unknown survey uuid.")
+
+        total = 0
+        for survey in surveys.iterator():
+            with transaction.atomic():
+                count = backfill_rollups(survey)
+            total += count
+            self.stdout.write(f"{survey.title}: {count} buckets")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} rollup buckets written."))
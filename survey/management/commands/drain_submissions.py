@@ -0,0 +1,30 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from survey import spool
+
+
+class Command(BaseCommand):
+    help = "Move spooled survey submissions into Response/Answer with bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Submissions written per transaction.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the spool is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain what is spooled now and exit.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.stdout.write(f"Draining {settings.SURVEY_SPOOL_PATH} ({spool.pending_count()} pending)")
+
+        drained = 0
+        while True:
+            count = spool.drain(batch_size)
+            drained += count
+            if count:
+                self.stdout.write(f"Stored {count} submissions ({drained} total)")
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {drained} submissions stored."))
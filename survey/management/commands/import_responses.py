@@ -0,0 +1,101 @@
+import csv
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from survey.aggregates import is_aggregated, is_sketched
+from survey.models import Survey, CustomUser
+from survey.submission import decode_export_cell, save_in_chunks
+from survey.utility import get_header_table
+
+
+class Command(BaseCommand):
+    help = (
+        "Import historical responses from a CSV shaped like the 'raw' export: "
+        "'Respondent', 'Submitted At', then one column per question label."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_uuid')
+        parser.add_argument('csv_file')
+        parser.add_argument('--chunk-size', type=int, default=settings.SURVEY_IMPORT_CHUNK_SIZE,
+                            help="Rows read and bulk-inserted per transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            survey = Survey.objects.get(uuid=options['survey_uuid'])
+        except (Survey.DoesNotExist, ValueError):
+            raise CommandError(f"Survey {options['survey_uuid']} does not exist.")
+
+        self.skipped = 0
+        with open(options['csv_file'], newline='', encoding='utf-8-sig') as csv_file:
+            reader = csv.reader(csv_file)
+            try:
+                columns = next(reader)
+            except StopIteration:
+                raise CommandError("The CSV file is empty.")
+
+            stored, replayed = save_in_chunks(
+                self.read_submissions(survey, columns, reader),
+                options['chunk_size'],
+                on_flush=lambda stored, replayed: self.stdout.write(f"Imported {stored} responses..."),
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {stored} responses imported, {self.skipped} rows skipped."))
+
+    def map_columns(self, survey, columns):
+        """Match CSV columns to questions with the same header logic as the raw export."""
+        header, data_questions = get_header_table(survey, "raw")
+        by_label = {}
+        for label, question in zip(header[2:], data_questions):
+            by_label.setdefault(label, []).append(question)
+
+        mapping = []
+        for index, column in enumerate(columns):
+            if column in ('Respondent', 'Submitted At'):
+                continue
+            if by_label.get(column):
+                mapping.append((index, by_label[column].pop(0)))
+            else:
+                self.stderr.write(f"Column '{column}' does not match any question and is ignored.")
+        return mapping
+
+    def read_submissions(self, survey, columns, reader):
+        """Stream the rows as submissions; only the current chunk is ever held in memory."""
+        mapping = self.map_columns(survey, columns)
+        aggregated = [[question.id, is_sketched(question)] for _, question in mapping if is_aggregated(question)]
+        respondent_index = columns.index('Respondent') if 'Respondent' in columns else None
+        submitted_index = columns.index('Submitted At') if 'Submitted At' in columns else None
+        respondent_ids = {}
+
+        for line_number, row in enumerate(reader, start=2):
+            try:
+                created_at = timezone.now()
+                if submitted_index is not None and row[submitted_index]:
+                    created_at = timezone.make_aware(datetime.strptime(row[submitted_index], '%Y-%m-%d %H:%M:%S'))
+
+                respondent_id = None
+                username = row[respondent_index] if respondent_index is not None else ''
+                if username and username != 'Anonymous':
+                    if username not in respondent_ids:
+                        respondent_ids[username] = CustomUser.objects.filter(username=username).values_list('id', flat=True).first()
+                    respondent_id = respondent_ids[username]
+
+                answers = []
+                for index, question in mapping:
+                    answer_data = decode_export_cell(question, row[index] if index < len(row) else None)
+                    if answer_data is not None:
+                        answers.append((question.id, answer_data))
+            except (ValueError, IndexError) as e:
+                self.skipped += 1
+                self.stderr.write(f"Line {line_number} skipped: {e}")
+                continue
+
+            yield {
+                'survey_id': survey.id,
+                'respondent_id': respondent_id,
+                'token': None,
+                'created_at': created_at,
+                'answers': answers,
+                'aggregated': aggregated,
+            }
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from survey.aggregates import rebuild_aggregates
+from survey.models import Survey, SectionHeader
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-question answer aggregates from the stored answers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_uuid', nargs='*', help="Surveys to rebuild (default: all).")
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.all()
+        if options['survey_uuid']:
+            surveys = surveys.filter(uuid__in=options['survey_uuid'])
+            if surveys.count() != len(options['survey_uuid']):
+                raise CommandError("Unknown survey uuid.")
+
+        total = 0
+        for survey in surveys.iterator():
+            questions = survey.questions.not_instance_of(SectionHeader)
+            # Submissions racing the rebuild wait on the deleted rows and re-apply their answers
+            with transaction.atomic():
+                count = rebuild_aggregates(questions)
+            total += count
+            self.stdout.write(f"{survey.title}: {count} questions")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} aggregates rebuilt."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from survey.correlation import rebuild_correlation_stats
+from survey.models import Survey
+
+
+class Command(BaseCommand):
+    help = "Recompute the running correlation statistics from the stored answers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_uuid', nargs='*', help="Surveys to rebuild (default: all).")
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.all()
+        if options['survey_uuid']:
+            surveys = surveys.filter(uuid__in=options['survey_uuid'])
+            if surveys.count() != len(options['survey_uuid']):
+                raise CommandError("Unknown survey uuid.")
+
+        total = 0
+        for survey in surveys.iterator():
+            with transaction.atomic():
+                stats = rebuild_correlation_stats(survey)
+            total += 1
+            self.stdout.write(f"{survey.title}: {stats.n} responses")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} surveys rebuilt."))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0044_force_cleanup_social_apps'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='response',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0045_response_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='submission_token',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0046_response_submission_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answered', models.IntegerField(default=0)),
+                ('filled', models.IntegerField(default=0)),
+                ('values', models.JSONField(default=dict)),
+                ('pairs', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='aggregate', to='survey.question')),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:28
+
+from django.db import migrations, models
+
+
+def drop_aggregates(apps, schema_editor):
+    # Existing aggregates have no sketch; they are rebuilt from the answers by
+    # rebuild_aggregates, analytics read the answers meanwhile
+    apps.get_model('survey', 'QuestionAggregate').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0047_question_aggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionaggregate',
+            name='sketch',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(drop_aggregates, migrations.RunPython.noop),
+    ]
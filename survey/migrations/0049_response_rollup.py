@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0048_question_aggregate_sketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('responses', models.IntegerField(default=0)),
+                ('questions', models.JSONField(default=dict)),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='survey.survey')),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'constraints': [models.UniqueConstraint(fields=('survey', 'period', 'bucket'), name='unique_response_rollup')],
+            },
+        ),
+    ]
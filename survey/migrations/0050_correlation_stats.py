@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0049_response_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorrelationStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('schema', models.CharField(max_length=32)),
+                ('n', models.IntegerField(default=0)),
+                ('sums', models.BinaryField()),
+                ('gram', models.BinaryField()),
+                ('observed', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('survey', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='correlation_stats', to='survey.survey')),
+            ],
+        ),
+    ]
@@ -1,11 +1,13 @@
-from django.db import models
+from django.db import models, connection
+from django.db.models import Count
 from django.contrib.auth.models import AbstractUser
 from polymorphic.models import PolymorphicModel
-import math
-import statistics
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 import uuid
+from .counters import pending_views
+from .stats import label_codes, scale_statistics
 
 class CustomUser(AbstractUser):
     pass
@@ -61,16 +63,71 @@ class Survey(models.Model):
             'avg_response_time': self.get_avg_response_time(),
         }
     
+    @property
+    def total_view_count(self):
+        """Stored views plus the ones still buffered by this worker."""
+        return self.view_count + pending_views(self.pk)
+
     def get_completion_rate(self):
         """Calculate completion rate: (Responses / Views) * 100"""
-        if self.view_count > 0:
-            return round((self.response_count / self.view_count) * 100, 2)
+        views = self.total_view_count
+        if views > 0:
+            return round((self.response_count / views) * 100, 2)
         return 0
     
     def get_avg_response_time(self):
         """Calculate average response time (placeholder)"""
         return "N/A"
     
+def answer_values(question, answers=None):
+    """
+    The answer_data of every answer to `question`. Statistics methods accept
+    the values pre-gathered (see analytics.get_survey_analytics) and only
+    query the question's answers when called on their own.
+    """
+    if answers is None:
+        return Answer.objects.filter(question=question).values_list('answer_data', flat=True)
+    return answers
+
+def answer_value_counts(question):
+    """(answer_data, count) per distinct answer to `question`, grouped in the database."""
+    return Answer.objects.filter(question=question).order_by()\
+                         .values_list('answer_data').annotate(count=Count('id'))
+
+# Items of multi-select answers, exploded and counted by the database's JSON
+# functions; a scalar answer counts as a single item.
+ANSWER_ITEM_COUNTS_SQL = {
+    'sqlite': """
+        SELECT item.value, COUNT(*) FROM {table} AS a, json_each(a.answer_data) AS item
+        WHERE a.question_id = %s AND json_type(a.answer_data) IN ('array', 'text')
+        GROUP BY item.value
+    """,
+    'postgresql': """
+        SELECT item, COUNT(*) FROM {table} AS a,
+            jsonb_array_elements_text(CASE jsonb_typeof(a.answer_data)
+                WHEN 'array' THEN a.answer_data ELSE jsonb_build_array(a.answer_data) END) AS item
+        WHERE a.question_id = %s AND jsonb_typeof(a.answer_data) IN ('array', 'string')
+        GROUP BY item
+    """,
+}
+
+def answer_item_counts(question):
+    """(item, count) over the items of list answers and the scalar answers to `question`."""
+    sql = ANSWER_ITEM_COUNTS_SQL.get(connection.vendor)
+    if sql is None:
+        # No JSON table function: group whole answers in the database, explode lists here
+        counts = {}
+        for answer_data, count in answer_value_counts(question):
+            if not answer_data or isinstance(answer_data, dict):
+                continue
+            for item in (answer_data if isinstance(answer_data, list) else [answer_data]):
+                counts[item] = counts.get(item, 0) + count
+        return list(counts.items())
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(table=Answer._meta.db_table), [question.id])
+        return cursor.fetchall()
+
 class Question(PolymorphicModel):
     survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='questions', verbose_name=_("Survey"))
     label = models.TextField(verbose_name=_("Label"))
@@ -102,15 +159,19 @@ class MultiChoiceQuestion(Question):
     NAME = _("Multi-Choice Question")
 
 
-    def get_answer_distribution(self):
+    def get_answer_distribution(self, answers=None):
         """Get distribution of answers for this question"""
-        answers = Answer.objects.filter(question=self)
-        
         # Initialize with 0 for all existing options
         distribution = {option: 0 for option in self.options}
+
+        if answers is None:
+            # One row per selected option comes back from the database
+            for item, count in answer_item_counts(self):
+                if item in distribution:
+                    distribution[item] += count
+            return distribution
         
-        for answer in answers:
-            answer_data = answer.answer_data
+        for answer_data in answers:
             if not answer_data: # Skip None or empty string
                 continue
                 
@@ -135,62 +196,65 @@ class LikertQuestion(Question):
     options = models.JSONField(default=list, verbose_name=_("Options"))
     NAME = _("Likert Question")
 
-    def get_all_scores(self):
+    def get_all_scores(self, answers=None):
         """Helper to get all numeric scores (1-based index) from answers."""
+        codes = label_codes(self.options)
         scores = []
-        answers = Answer.objects.filter(question=self)
-        for answer in answers:
-            val_str = str(answer.answer_data)
-            if val_str in self.options:
-                scores.append(self.options.index(val_str) + 1)
+        for answer_data in answer_values(self, answers):
+            score = codes.get(str(answer_data))
+            if score is not None:
+                scores.append(score)
         return scores
 
+    def get_figures(self, scores, hypothetical_mean=3.0, counts=None):
+        """stats.scale_statistics figures of one list of scores (each occurring counts[i] times when given)."""
+        return scale_statistics([scores], midpoint=hypothetical_mean, scale_points=len(self.options),
+                                integer_scores=True, round_mean_to=3, counts=None if counts is None else [counts])[0]
+
     def get_mean(self, scores=None):
         if scores is None:
             scores = self.get_all_scores()
-        return round(statistics.mean(scores), 3) if scores else 0
+        return round(self.get_figures(scores)['mean'], 3) if scores else 0
 
     def get_median(self, scores=None):
         if scores is None:
             scores = self.get_all_scores()
-        return round(statistics.median(scores), 3) if scores else 0
+        return round(self.get_figures(scores)['median'], 3) if scores else 0
+
+    def get_statistic(self, answers=None, histogram=None):
+        """Return mean, median and CI as a dict, from the answers or a {score: count} histogram."""
+        if histogram is None:
+            figures = self.get_figures(self.get_all_scores(answers))
+        else:
+            figures = self.get_figures(list(histogram), counts=list(histogram.values()))
+        if not figures['n']:
+            return {'mean': 0, 'median': 0, 'interpretation': "N/A", 't_test': None}
 
-    def get_statistic(self):
-        """Return mean, median and CI as a dict."""
-        score = self.get_all_scores()
         return {
-            'mean': self.get_mean(score),
-            'median': self.get_median(score),
-            'interpretation': self.get_interpretation(score),
-            't_test': self.get_t_test(scores=score)
+            'mean': round(figures['mean'], 3),
+            'median': round(figures['median'], 3),
+            'interpretation': self.options[figures['interpretation_index']],
+            't_test': None if figures['t_stat'] is None else round(figures['t_stat'], 5)
         }
 
     def get_t_test(self, scores=None, hypothetical_mean=3.0):
         """One-sample T-test against neutral midpoint (default 3.0 for 5-pt scale)"""
         if scores is None:
             scores = self.get_all_scores()
-        n = len(scores)
-        if n < 2:
-            return None
-            
-        mean = statistics.mean(scores)
-        std_dev = statistics.stdev(scores)
-        
-        if std_dev == 0:
-            return 0 # Avoid division by zero
-            
-        t_stat = (mean - hypothetical_mean) / (std_dev / math.sqrt(n))
-        return round(t_stat, 5)
+        # None below two scores; 0 when every score is the same
+        t_stat = self.get_figures(scores, hypothetical_mean)['t_stat']
+        return None if t_stat is None else round(t_stat, 5)
     
-    def get_rating_distribution(self):
+    def get_rating_distribution(self, answers=None):
         """Get distribution of ratings"""
-        answers = Answer.objects.filter(question=self)
         distribution = {opt: 0 for opt in self.options} # Initialize with option labels
         
-        for answer in answers:
-            val_str = str(answer.answer_data)
+        # Grouped in the database unless the answers were passed in
+        counts = answer_value_counts(self) if answers is None else [(answer_data, 1) for answer_data in answers]
+        for answer_data, count in counts:
+            val_str = str(answer_data)
             if val_str in distribution:
-                distribution[val_str] += 1
+                distribution[val_str] += count
             # If data is numeric (old format), try to map it to the label
             elif str(val_str).isdigit():
                  try:
@@ -198,7 +262,7 @@ class LikertQuestion(Question):
                      idx = int(val_str) - 1
                      if 0 <= idx < len(self.options):
                          label = self.options[idx]
-                         distribution[label] += 1
+                         distribution[label] += count
                  except (ValueError, IndexError):
                      pass
 
@@ -225,36 +289,12 @@ class LikertQuestion(Question):
         else:
             scores = [score]
 
-        if not scores:
-            return "N/A"
-            
-        mean = self.get_mean(scores)
-        
-        count = len(self.options)
-        if count == 0:
+        if not scores or not self.options:
             return "N/A"
-            
-        # Formula: Interval = (Max - Min) / Count
-        # Standard Likert Scale: Min=1, Max=Count
-        min_score = 1
-        max_score = count
-        interval = (max_score - min_score) / count
-        
-        if interval == 0:
-            return self.options[0]
-            
-        # Determine index based on the user's formula
-        # Index = floor((Mean - Min) / Interval)
-        raw_index = (mean - min_score) / interval
-        index = int(raw_index)
-        
-        # Clamp index to handle edge case of Mean == Max Score
-        if index >= count:
-            index = count - 1
-        if index < 0:
-            index = 0
-            
-        return self.options[index]
+
+        # Formula: Interval = (Max - Min) / Count, Index = floor((Mean - Min) / Interval),
+        # on the mean rounded as get_mean shows it (see stats.interpretation_index)
+        return self.options[self.get_figures(scores)['interpretation_index']]
 
 class MatrixQuestion(Question):
     rows = models.JSONField(default=list, verbose_name=_("Rows"))
@@ -262,72 +302,58 @@ class MatrixQuestion(Question):
 
     NAME = _("Matrix Question")
 
-    def get_row_statistics(self):
-        """Returns statistics for each row: {'Row 1': {'mean': x, 'median': y}, ...}"""
-        answers = Answer.objects.filter(question=self)
-        row_scores = {row: [] for row in self.rows}
-        
-        for ans in answers:
-            data = ans.answer_data 
-            if isinstance(data, dict):
-                for key, col_val in data.items():
-                    # Match key to row
-                    matched_row = None
-                    if key in self.rows:
-                        matched_row = key
-                    else:
-                        # Try matching 'Row Label_rowX' format
-                        for row in self.rows:
-                             if key.startswith(f"{row}_row"):
-                                 matched_row = row
-                                 break
-                    
-                    if matched_row and col_val in self.columns:
-                        row_scores[matched_row].append(self.columns.index(col_val) + 1)
-                        
+    def match_row(self, key):
+        """Row label of an answer key: the label itself or the legacy 'Row Label_rowX' format."""
+        if key in self.rows:
+            return key
+        for row in self.rows:
+            if key.startswith(f"{row}_row"):
+                return row
+        return None
+
+    def get_row_statistics(self, answers=None, histograms=None):
+        """
+        Returns statistics for each row: {'Row 1': {'mean': x, 'median': y}, ...},
+        from the answers or per-row {score: count} histograms.
+        """
+        if histograms is None:
+            codes = label_codes(self.columns)
+            row_of = {}  # answer key -> row, matched once per distinct key
+            row_scores = {row: [] for row in self.rows}
+
+            for data in answer_values(self, answers):
+                if isinstance(data, dict):
+                    for key, col_val in data.items():
+                        if key not in row_of:
+                            row_of[key] = self.match_row(key)
+                        score = codes.get(col_val) if isinstance(col_val, str) else None
+                        if row_of[key] and score is not None:
+                            row_scores[row_of[key]].append(score)
+            counts = None
+        else:
+            row_scores = {row: list(histograms.get(row, {})) for row in self.rows}
+            counts = [list(histograms.get(row, {}).values()) for row in self.rows]
+
+        # All rows in one pass over a (scores x rows) array
+        all_figures = scale_statistics(list(row_scores.values()), midpoint=3.0,
+                                       scale_points=len(self.columns), integer_scores=True, counts=counts)
         result = {}
-        for row, scores in row_scores.items():
-            if scores:
-                interpretation = "N/A"
-                try:
-                    std_dev = statistics.stdev(scores)
-                    mean = statistics.mean(scores)
-                    t_stat = 0
-                    
-                    if len(scores) > 1 and std_dev > 0:
-                        midpoint = 3.0 
-                        t_stat = (mean - midpoint) / (std_dev / math.sqrt(len(scores)))
-                    
-                    # Calculate Interpretation using (Max-Min)/Count formula
-                    if self.columns:
-                        count = len(self.columns)
-                        min_score = 1
-                        max_score = count
-                        interval = (max_score - min_score) / count
-                        
-                        if interval > 0:
-                            raw_index = (mean - min_score) / interval
-                            index = int(raw_index)
-                            if index >= count: index = count - 1
-                            if index < 0: index = 0
-                            interpretation = self.columns[index]
-
-                except statistics.StatisticsError:
-                    std_dev = 0
-                    t_stat = 0
-                    interpretation = "N/A"
-                    
-                result[row] = {
-                    'mean': round(statistics.mean(scores), 2),
-                    'median': round(statistics.median(scores), 2),
-                    'interpretation': interpretation, # Replaces CI
-                    't_stat': round(t_stat, 5)
-                }
-            else:
-                 result[row] = {'mean': 0, 'median': 0, 'interpretation': 'N/A', 't_stat': 0}
+        for row, figures in zip(row_scores, all_figures):
+            if not figures['n']:
+                result[row] = {'mean': 0, 'median': 0, 'interpretation': 'N/A', 't_stat': 0}
+                continue
+
+            # A single score has no standard deviation, which leaves the row uninterpreted
+            interpreted = figures['n'] > 1 and len(self.columns) > 1
+            result[row] = {
+                'mean': round(figures['mean'], 2),
+                'median': round(figures['median'], 2),
+                'interpretation': self.columns[figures['interpretation_index']] if interpreted else 'N/A', # Replaces CI
+                't_stat': round(figures['t_stat'], 5) if figures['n'] > 1 else 0
+            }
         return result
 
-    def get_matrix_distribution(self):
+    def get_matrix_distribution(self, answers=None):
         """
         Returns a heatmap-like distribution:
         {
@@ -335,24 +361,17 @@ class MatrixQuestion(Question):
             'Row 2': {'Col A': 1, 'Col B': 6}
         }
         """
-        answers = Answer.objects.filter(question=self)
-        
         # Initialize structure
         distribution = {row: {col: 0 for col in self.columns} for row in self.rows}
         
-        for ans in answers:
-            data = ans.answer_data # Expected: {'Row 1': 'Col A', 'Row 2': 'Col B'} or {'Row 1_row1': ...}
+        # Expected: {'Row 1': 'Col A', 'Row 2': 'Col B'} or {'Row 1_row1': ...}
+        row_of = {}
+        for data in answer_values(self, answers):
             if isinstance(data, dict):
                 for key, col_val in data.items():
-                    # Match key to row
-                    matched_row = None
-                    if key in distribution:
-                        matched_row = key
-                    else:
-                        for row in self.rows:
-                             if key.startswith(f"{row}_row"):
-                                 matched_row = row
-                                 break
+                    if key not in row_of:
+                        row_of[key] = self.match_row(key)
+                    matched_row = row_of[key]
 
                     if matched_row and col_val in distribution[matched_row]:
                         distribution[matched_row][col_val] += 1
@@ -399,94 +418,76 @@ class RatingQuestion(Question):
     max_label = models.CharField(max_length=50, blank=True, null=True, verbose_name=_("Max Label")) # e.g. "Excellent"
     NAME = _("Rating Question")
 
-    def get_all_scores(self):
-        answers = Answer.objects.filter(question=self)
+    def get_all_scores(self, answers=None):
         scores = []
-        for answer in answers:
+        for answer_data in answer_values(self, answers):
             try:
-                if answer.answer_data == '':
+                if answer_data == '':
                     continue
-                scores.append(float(answer.answer_data))
+                scores.append(float(answer_data))
             except (ValueError, TypeError):
                 continue
         return scores
 
+    def scale(self):
+        """stats.scale_statistics arguments of the rating range, tested against its midpoint."""
+        return {'midpoint': (self.range_min + self.range_max) / 2,
+                'scale_points': self.range_max - self.range_min + 1, 'min_score': self.range_min}
+
+    def get_figures(self, scores, counts=None):
+        """stats.scale_statistics figures of one list of scores (each occurring counts[i] times when given)."""
+        return scale_statistics([scores], counts=None if counts is None else [counts], **self.scale())[0]
+
     def get_mean(self, scores=None):
         if scores is None:
             scores = self.get_all_scores()
-        return round(statistics.mean(scores), 3) if scores else 0
+        return round(self.get_figures(scores)['mean'], 3) if scores else 0
 
     def get_median(self, scores=None):
         if scores is None:
             scores = self.get_all_scores()
-        return round(statistics.median(scores), 3) if scores else 0
+        return round(self.get_figures(scores)['median'], 3) if scores else 0
+
+    def get_statistic(self, answers=None, histogram=None, figures=None):
+        """
+        Return mean, median and CI as a dict, from the answers, a {score: count}
+        histogram or already computed figures (see get_figures).
+        """
+        if figures is None and histogram is None:
+            figures = self.get_figures(self.get_all_scores(answers))
+        elif figures is None:
+            figures = self.get_figures(list(histogram), counts=list(histogram.values()))
+        if not figures['n']:
+            return {'mean': 0, 'median': 0, 'interpretation': "N/A", 't_test': None}
 
-    def get_statistic(self):
-        """Return mean, median and CI as a dict."""
-        scores = self.get_all_scores()
         return {
-            'mean': self.get_mean(scores),
-            'median': self.get_median(scores),
-            'interpretation': self.get_interpretation(scores),
-            't_test': self.get_t_test(scores=scores)
+            'mean': round(figures['mean'], 3),
+            'median': round(figures['median'], 3),
+            'interpretation': self.get_interpretation(figures=figures),
+            't_test': None if figures['t_stat'] is None else round(figures['t_stat'], 5)
         }
 
-    def get_interpretation(self, scores=None):
+    def get_interpretation(self, scores=None, figures=None):
         """
         Returns text interpretation (numeric value) based on interval formula:
         (Max - Min) / Count.
         """
-        if scores is None:
-            scores = self.get_all_scores()
-        if not scores:
-            return "N/A"
-            
-        mean = statistics.mean(scores)
-        
-        # Calculate number of options in the range (e.g. 1 to 5 is 5 options)
-        num_options = self.range_max - self.range_min + 1
-        if num_options == 0:
+        if figures is None:
+            figures = self.get_figures(self.get_all_scores() if scores is None else scores)
+        # Number of options in the range (e.g. 1 to 5 is 5 options)
+        if not figures['n'] or self.range_max - self.range_min + 1 == 0:
             return "N/A"
 
-        # Formula: Interval = (Max Score - Min Score) / Number of Options
-        interval = (self.range_max - self.range_min) / num_options
-        
-        if interval == 0:
-             return str(self.range_min)
-
-        # Determine index corresponding to the mean
-        # index = floor((Mean - Min) / Interval)
-        raw_index = (mean - self.range_min) / interval
-        index = int(raw_index)
-        
-        # Clamp index
-        if index >= num_options:
-            index = num_options - 1
-        if index < 0:
-            index = 0
-            
-        # Map index back to the rating value
-        result_value = self.range_min + index
-        
-        return str(result_value)
+        # index = floor((Mean - Min) / Interval), mapped back to the rating value
+        return str(self.range_min + figures['interpretation_index'])
 
     def get_t_test(self, scores=None):
         """One-sample T-test against the range midpoint"""
         if scores is None:
             scores = self.get_all_scores()
-        n = len(scores)
-        if n < 2:
-            return None
-            
-        midpoint = (self.range_min + self.range_max) / 2
-        mean = statistics.mean(scores)
-        std_dev = statistics.stdev(scores)
-        
-        if std_dev == 0:
-            return 0
-            
-        t_stat = (mean - midpoint) / (std_dev / math.sqrt(n))
-        return round(t_stat, 5)
+        # None below two scores; 0 when every score is the same
+        t_stat = self.get_figures(scores)['t_stat']
+        return None if t_stat is None else round(t_stat, 5)
     
     def get_numeric_answer(self, answer_data):
         """Returns the rating value directly."""
@@ -494,19 +495,15 @@ class RatingQuestion(Question):
             return "N/A"
         return str(answer_data)
 
-    def get_average_rating(self):
+    def get_average_rating(self, answers=None):
         """Calculate average rating for this question"""
-        answers = Answer.objects.filter(question=self)
-        if not answers.exists():
-            return 0
-        
         total = 0
         count = 0
-        for answer in answers:
+        for answer_data in answer_values(self, answers):
             try:
-                if answer.answer_data == '':
+                if answer_data == '':
                     continue
-                val = float(answer.answer_data)
+                val = float(answer_data)
                 total += val
                 count += 1
             except (ValueError, TypeError):
@@ -517,22 +514,23 @@ class RatingQuestion(Question):
             
         return round(total / count, 2)
 
-    def get_rating_distribution(self):
+    def get_rating_distribution(self, answers=None):
         """Get distribution of ratings"""
-        answers = Answer.objects.filter(question=self)
         distribution = {}
         
         # Initialize distribution
         for i in range(self.range_min, self.range_max + 1):
             distribution[i] = 0
         
-        for answer in answers:
+        # Grouped in the database unless the answers were passed in
+        counts = answer_value_counts(self) if answers is None else [(answer_data, 1) for answer_data in answers]
+        for answer_data, count in counts:
             try:
-                if answer.answer_data == '':
+                if answer_data == '':
                     continue
-                val = int(float(answer.answer_data))
+                val = int(float(answer_data))
                 if val in distribution:
-                    distribution[val] += 1
+                    distribution[val] += count
             except (ValueError, TypeError):
                 continue
         
@@ -561,19 +559,17 @@ class RankQuestion(Question):
             pass
         return ""
 
-    def get_average_ranks(self):
+    def get_average_ranks(self, answers=None):
         """
         Returns a dict of {option_name: average_rank_position}.
         weighted score = (number of options - rank) + 1
         Higher number = Better rank
         """
-        answers = Answer.objects.filter(question=self)
         stats = {opt: {'sum': 0, 'count': 0} for opt in self.options}
         num_options = len(self.options)
         
-        for answer in answers:
-            # answer_data is expected to be a dict {'Option A': '1', 'Option B': '2'}
-            ranking_dict = answer.answer_data 
+        # answer_data is expected to be a dict {'Option A': '1', 'Option B': '2'}
+        for ranking_dict in answer_values(self, answers):
             if isinstance(ranking_dict, dict):
                 for item, score in ranking_dict.items():
                         try:
@@ -597,8 +593,11 @@ class RankQuestion(Question):
 class Response(models.Model):
     survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='responses')
     respondent = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: spooled and imported responses keep their original submit time
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     completed = models.BooleanField(default=True)
+    # One-time token rendered into the survey form; replays of the same submit are ignored
+    submission_token = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -612,4 +611,75 @@ class Answer(models.Model):
     answer_data = models.JSONField(null=True, blank=True)
     
     def __str__(self):
-        return f"Answer for {self.question.label[:30]}: {self.answer_data}"
\ No newline at end of file
+        return f"Answer for {self.question.label[:30]}: {self.answer_data}"
+
+class QuestionAggregate(models.Model):
+    """
+    Running answer counts for one question, folded in with every stored
+    submission (see aggregates.py). Distributions, means and t-tests are derived
+    from these histograms instead of re-reading every Answer row.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='aggregate')
+    # Answers that are neither null nor an empty string
+    answered = models.IntegerField(default=0)
+    # Dict (matrix) answers with at least one filled value
+    filled = models.IntegerField(default=0)
+    # {json of a scalar or list answer: count}
+    values = models.JSONField(default=dict)
+    # {key of a dict answer: {json of its value: count}}
+    pairs = models.JSONField(default=dict)
+    # t-digest of the numeric answers of a rating question (see sketch.py)
+    sketch = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Aggregate for {self.question_id}: {self.answered} answers"
+
+
+class ResponseRollup(models.Model):
+    """
+    Responses to one survey within one hour or day, with the answer histograms
+    of each question over that bucket (see rollups.py).
+    """
+    PERIOD_CHOICES = [
+        ("hour", _("Hour")),
+        ("day", _("Day")),
+    ]
+
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='rollups')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    # Start of the hour/day in the project time zone
+    bucket = models.DateTimeField()
+    responses = models.IntegerField(default=0)
+    # {question id: {'answered', 'filled', 'values', 'pairs'}}, as in QuestionAggregate
+    questions = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['survey', 'period', 'bucket'], name='unique_response_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.survey_id} {self.period} {self.bucket}: {self.responses} responses"
+
+
+class CorrelationStats(models.Model):
+    """
+    Running sufficient statistics of a survey's numeric response matrix
+    (see correlation.py): the correlation of any set of its columns is derived
+    from these without reading the answers.
+    """
+    survey = models.OneToOneField(Survey, on_delete=models.CASCADE, related_name='correlation_stats')
+    # Hash of the column layout the statistics were computed for
+    schema = models.CharField(max_length=32)
+    # Responses folded in
+    n = models.IntegerField(default=0)
+    # NumPy arrays (np.save): column sums, XᵀX and the columns holding at least one number
+    sums = models.BinaryField()
+    gram = models.BinaryField()
+    observed = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Correlation statistics for {self.survey_id}: {self.n} responses"
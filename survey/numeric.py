@@ -0,0 +1,143 @@
+"""
+Numeric response matrix.
+
+build_sparse_matrix() lays a survey's responses out in the columns of the
+'numeric' export layout (one-hot options for choice, Likert and Matrix
+questions, one rank per option for Rank questions, the value itself for Rating
+and Text questions), one row per response, as a sparse.CSRMatrix. It reads the
+answers as one values_list stream and writes the encoded values straight into
+the matrix, instead of building rows of '1'/'0' strings and converting them
+with pandas; correlation.py and any later modeling start from it.
+
+Values follow get_numeric_answer() followed by pd.to_numeric(errors='coerce'):
+an unanswered choice, Likert or Matrix question is all zeros, while a missing
+rating, rank or text is NaN. Neither is stored: the matrix fills the columns of
+the latter with NaN (toarray() gives the NaNs back, the correlation counts them
+as 0). The answers stream in response order and are encoded into typed arrays
+one block of rows at a time, so building the matrix costs its own size (12
+bytes per stored cell) plus one block, never a dense copy.
+"""
+import math
+from array import array
+import numpy as np
+from django.conf import settings
+from .models import Answer, Response, LikertQuestion, MultiChoiceQuestion, MatrixQuestion, RankQuestion
+from .sparse import CSRBuilder
+
+
+def to_number(value):
+    """float(value) for numbers and numeric strings, NaN otherwise."""
+    if isinstance(value, bool) or value is None or isinstance(value, (list, dict)):
+        return math.nan
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return math.nan
+
+def question_columns(question):
+    """
+    (column headers, value when unanswered, encoder) of one question, where
+    encoder(answer_data) yields (column offset, value) pairs.
+    """
+    if isinstance(question, (LikertQuestion, MultiChoiceQuestion)):
+        offsets = {}
+        for offset, option in enumerate(question.options):
+            offsets.setdefault(option, []).append(offset)
+
+        def encode(answer_data):
+            chosen = answer_data if isinstance(answer_data, list) and isinstance(question, MultiChoiceQuestion) else [answer_data]
+            for item in chosen:
+                if isinstance(item, str):
+                    for offset in offsets.get(item, ()):
+                        yield offset, 1.0
+
+        return [f"{question.label} [{option}]" for option in question.options], 0.0, encode
+
+    if isinstance(question, MatrixQuestion):
+        offsets = {}
+        for j, col in enumerate(question.columns):
+            offsets.setdefault(col, []).append(j)
+        width = len(question.columns)
+
+        def encode(answer_data):
+            if not isinstance(answer_data, dict):
+                return
+            for i, row in enumerate(question.rows):
+                # Support both legacy keys ("<row>_row<i>") and the newer plain row key
+                selected = answer_data.get(row) or answer_data.get(f'{row}_row{i + 1}')
+                if isinstance(selected, str):
+                    for j in offsets.get(selected, ()):
+                        yield i * width + j, 1.0
+
+        headers = [f"{question.label} [{row} - {col}]" for row in question.rows for col in question.columns]
+        return headers, 0.0, encode
+
+    if isinstance(question, RankQuestion):
+        def encode(answer_data):
+            if isinstance(answer_data, dict):
+                for offset, option in enumerate(question.options):
+                    yield offset, to_number(answer_data.get(option) or None)
+
+        return [f"{question.label} [{option}]" for option in question.options], math.nan, encode
+
+    # Rating and Text questions: the answer itself
+    def encode(answer_data):
+        yield 0, to_number(answer_data)
+
+    return [question.label], math.nan, encode
+
+def _layout(questions):
+    """Column headers, per-column value when unanswered, first column and encoder of each question."""
+    headers, missing, starts, encoders = [], [], {}, {}
+    for question in questions:
+        question_headers, unanswered, encode = question_columns(question)
+        starts[question.id] = len(headers)
+        encoders[question.id] = encode
+        headers.extend(question_headers)
+        missing.extend([unanswered] * len(question_headers))
+    return headers, np.array(missing, dtype=np.float32), starts, encoders
+
+def _fill_matrix(builder, survey, response_ids, starts, encoders, block_cells):
+    """
+    Encode the survey's answers from one stream ordered by response (so by
+    row) into `builder`, handing it the cells in typed arrays of about
+    `block_cells` cells that each end on a row boundary.
+    """
+    if not response_ids or not encoders:
+        return
+    row_of = {response_id: row for row, response_id in enumerate(response_ids)}
+    stream = Answer.objects.filter(response__survey=survey, question_id__in=encoders)\
+                           .order_by('response_id')\
+                           .values_list('response_id', 'question_id', 'answer_data')
+    rows, columns, values = array('i'), array('i'), array('d')
+    for response_id, question_id, answer_data in stream.iterator(chunk_size=2000):
+        row, start = row_of[response_id], starts[question_id]
+        if len(values) >= block_cells and row != rows[-1]:
+            builder.add_cells(rows, columns, values)
+            rows, columns, values = array('i'), array('i'), array('d')
+        for offset, value in encoders[question_id](answer_data):
+            rows.append(row)
+            columns.append(start + offset)
+            values.append(value)
+    builder.add_cells(rows, columns, values)
+
+def _response_ids(survey):
+    return list(Response.objects.filter(survey=survey).order_by('id').values_list('id', flat=True))
+
+def build_sparse_matrix(survey, questions):
+    """
+    Numeric matrix of the survey's responses over `questions` (no SectionHeaders),
+    plus which columns hold at least one number: a column that is NaN in every
+    row is dropped from the correlation rather than treated as constant.
+    Returns (CSRMatrix, column headers, observed columns mask, response ids in row order).
+    """
+    headers, missing, starts, encoders = _layout(questions)
+    response_ids = _response_ids(survey)
+
+    builder = CSRBuilder((len(response_ids), len(headers)), fill=missing)
+    _fill_matrix(builder, survey, response_ids, starts, encoders, settings.SURVEY_CORRELATION_BLOCK_CELLS)
+    matrix = builder.to_matrix()
+
+    # Columns answered as 0 by default always hold numbers; the others once a value was stored
+    observed = (~np.isnan(missing) | (matrix.column_counts() > 0)) & bool(response_ids)
+    return matrix, headers, observed, response_ids
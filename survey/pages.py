@@ -0,0 +1,95 @@
+import gzip
+import os
+import random
+import shutil
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+from .templatetags.survey_extras import group_by_sections
+
+
+def render_survey_questions(survey, seed):
+    """Render the respondent question flow of a survey for one shuffle seed."""
+    questions = list(survey.questions.all().order_by('position'))
+    sections = group_by_sections(questions, survey.shuffle_questions, seed=seed)
+    html = render_to_string('partials/survey_questions_display.html', {
+        'survey': survey,
+        'questions': questions,
+        'shuffle_seed': seed,
+    })
+    return {
+        'html': html,
+        'section_count': len(sections),
+        'question_count': sum(len(section['questions']) for section in sections),
+        'shuffled': survey.shuffle_questions or any(getattr(q, 'randomize_options', False) for q in questions),
+    }
+
+def get_survey_page(survey):
+    """
+    Cached rendering of the survey questions, keyed by uuid, revision (last_updated)
+    and language. Surveys that shuffle questions or options are cached as
+    SURVEY_PAGE_VARIANTS seeded variants, one of which is picked per request.
+    """
+    base_key = f'survey:{survey.uuid}:page:{survey.last_updated.isoformat()}:{get_language()}'
+
+    def variant(seed):
+        key = f'{base_key}:{seed}'
+        page = cache.get(key)
+        if page is None:
+            page = render_survey_questions(survey, seed)
+            cache.set(key, page, settings.SURVEY_PAGE_CACHE_TIMEOUT)
+        return page
+
+    page = variant(0)
+    if page['shuffled']:
+        page = variant(random.randrange(settings.SURVEY_PAGE_VARIANTS))
+    return dict(page, html=mark_safe(page['html']))
+
+
+# ---------------------------------------------------------------------------
+# Static snapshots
+# ---------------------------------------------------------------------------
+
+def snapshot_path(survey_uuid, language):
+    return os.path.join(settings.SURVEY_SNAPSHOT_ROOT, str(survey_uuid), f'{language}.html')
+
+def publish_snapshot(survey):
+    """
+    Pre-render the respondent page into a static HTML file per language (plus a
+    gzip copy) under SURVEY_SNAPSHOT_ROOT. The page carries no per-visitor
+    state: the CSRF and submission tokens and any pending messages are fetched
+    from survey_session. A shuffled survey is frozen to whichever cached variant
+    get_survey_page() picks at publish time, until the next refresh.
+    """
+    for language, _name in settings.LANGUAGES:
+        with translation.override(language):
+            page = get_survey_page(survey)
+            html = render_to_string('Survey_Start.html', {
+                'survey': survey,
+                'questions_html': page['html'],
+                'section_count': page['section_count'],
+                'question_count': page['question_count'],
+                'static_snapshot': True,
+            })
+
+        path = snapshot_path(survey.uuid, language)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a visitor never gets a half-written file; the
+        # gzip copy goes first so it exists whenever the plain file does
+        for target, content in ((f'{path}.gz', gzip.compress(html.encode('utf-8'))), (path, html.encode('utf-8'))):
+            with open(f'{target}.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(f'{target}.tmp', target)
+
+def remove_snapshot(survey):
+    shutil.rmtree(os.path.join(settings.SURVEY_SNAPSHOT_ROOT, str(survey.uuid)), ignore_errors=True)
+
+def refresh_snapshot(survey):
+    """Keep the static snapshot in line with the survey state after a publish/edit/unpublish."""
+    if settings.SURVEY_STATIC_SNAPSHOTS and survey.state == 'published':
+        publish_snapshot(survey)
+    else:
+        remove_snapshot(survey)
@@ -0,0 +1,210 @@
+"""
+Hourly and daily response rollups.
+
+Every stored submission adds itself to the ResponseRollup rows of its hour and
+its day (see submission.save_submissions): a response count plus, per
+question, the same answer histograms as QuestionAggregate (free-text
+questions, which are not aggregated, only count their answers). Trend charts
+read the counts; date-range analytics sum the day buckets of the window into
+in-memory aggregates and hand them to aggregates.aggregate_analytics(), so a
+window of a few weeks costs a few dozen rows whatever the number of answers.
+
+Buckets start at the hour/day in the project time zone. backfill_rollups()
+rebuilds a survey's rollups from Response.created_at. Until it has run for a
+survey answered before rollups existed (or after responses were deleted), the
+day buckets do not add up to the response count and readers fall back to the
+responses themselves (see rollups_complete()).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .aggregates import add_answer, is_aggregated
+from .models import Answer, Response, ResponseRollup, QuestionAggregate
+
+PERIODS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+
+def bucket_start(moment, period):
+    """Start of the hour or day containing `moment`, in the current time zone."""
+    local = timezone.localtime(moment)
+    if period == 'hour':
+        return local.replace(minute=0, second=0, microsecond=0)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def day_start(day):
+    """Aware start of a date in the current time zone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def parse_day(value):
+    """A YYYY-MM-DD query parameter as a date, or None when missing or invalid."""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+def _empty_histogram():
+    return {'answered': 0, 'filled': 0, 'values': {}, 'pairs': {}}
+
+def _merge_histogram(target, histogram):
+    """Add a {'answered', 'filled', 'values', 'pairs'} histogram into an aggregate (or a _Histogram)."""
+    def add(counts, other):
+        for key, count in other.items():
+            counts[key] = counts.get(key, 0) + count
+
+    target.answered += histogram['answered']
+    target.filled += histogram['filled']
+    add(target.values, histogram['values'])
+    for key, cell in histogram['pairs'].items():
+        add(target.pairs.setdefault(key, {}), cell)
+
+
+class _Histogram:
+    """Attribute access to a plain dict histogram, for add_answer() and _merge_histogram()."""
+    def __init__(self, histogram):
+        self.__dict__ = histogram
+
+
+def _collect(rows, responses, aggregated):
+    """
+    Bucket deltas from (created_at, question_id, answer_data) rows and response
+    creation times, as {(period, bucket): {'responses': n, 'questions': {...}}}.
+    Questions outside `aggregated` only add to their 'answered' count.
+    """
+    deltas = defaultdict(lambda: {'responses': 0, 'questions': defaultdict(_empty_histogram)})
+    for created_at in responses:
+        for period in PERIODS:
+            deltas[(period, bucket_start(created_at, period))]['responses'] += 1
+    for created_at, question_id, answer_data in rows:
+        for period in PERIODS:
+            histogram = deltas[(period, bucket_start(created_at, period))]['questions'][str(question_id)]
+            if question_id in aggregated:
+                add_answer(_Histogram(histogram), answer_data)
+            elif answer_data is not None and answer_data != '':
+                histogram['answered'] += 1
+    return deltas
+
+def update_rollups(submissions, aggregated):
+    """
+    Add freshly stored submissions to their surveys' hour and day rollups,
+    with histograms for the question ids in `aggregated` (see
+    aggregates.aggregated_questions). Runs inside the transaction that stored
+    them; the rollup rows are locked so concurrent submissions cannot lose
+    each other's counts.
+    """
+    by_survey = defaultdict(list)
+    for s in submissions:
+        by_survey[s['survey_id']].append(s)
+
+    for survey_id, stored in by_survey.items():
+        deltas = _collect(
+            [(s['created_at'], question_id, answer_data) for s in stored for question_id, answer_data in s['answers']],
+            [s['created_at'] for s in stored],
+            aggregated,
+        )
+        buckets = Q()
+        for period, bucket in deltas:
+            buckets |= Q(period=period, bucket=bucket)
+        rollups = ResponseRollup.objects.select_for_update().filter(buckets, survey_id=survey_id)
+
+        locked = {(r.period, r.bucket): r for r in rollups}
+        if len(locked) < len(deltas):
+            # Another transaction may have created some of them meanwhile
+            ResponseRollup.objects.bulk_create(
+                [ResponseRollup(survey_id=survey_id, period=period, bucket=bucket)
+                 for period, bucket in deltas if (period, bucket) not in locked],
+                ignore_conflicts=True,
+            )
+            locked = {(r.period, r.bucket): r for r in rollups.all()}
+
+        for key, delta in deltas.items():
+            rollup = locked[key]
+            rollup.responses += delta['responses']
+            for question_id, histogram in delta['questions'].items():
+                _merge_histogram(_Histogram(rollup.questions.setdefault(question_id, _empty_histogram())), histogram)
+        ResponseRollup.objects.bulk_update(locked.values(), ['responses', 'questions'])
+
+def backfill_rollups(survey):
+    """Recompute a survey's rollups from its stored responses and answers. Returns the number of buckets."""
+    aggregated = {q.id for q in survey.questions.all() if is_aggregated(q)}
+    rows = Answer.objects.filter(response__survey=survey)\
+                         .values_list('response__created_at', 'question_id', 'answer_data')
+    responses = Response.objects.filter(survey=survey).values_list('created_at', flat=True)
+    deltas = _collect(rows.iterator(chunk_size=2000), responses.iterator(chunk_size=2000), aggregated)
+
+    ResponseRollup.objects.filter(survey=survey).delete()
+    ResponseRollup.objects.bulk_create(
+        [ResponseRollup(survey=survey, period=period, bucket=bucket,
+                        responses=delta['responses'], questions=dict(delta['questions']))
+         for (period, bucket), delta in deltas.items()],
+        batch_size=500,
+    )
+    return len(deltas)
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def _window(survey, period, start, end):
+    """Rollups of `period` with start <= bucket < end (either bound may be None)."""
+    rollups = ResponseRollup.objects.filter(survey=survey, period=period)
+    if start is not None:
+        rollups = rollups.filter(bucket__gte=start)
+    if end is not None:
+        rollups = rollups.filter(bucket__lt=end)
+    return rollups
+
+def rollups_complete(survey, response_count=None):
+    """Whether the survey's day rollups account for every one of its responses."""
+    if response_count is None:
+        response_count = Response.objects.filter(survey=survey).count()
+    counted = ResponseRollup.objects.filter(survey=survey, period='day').aggregate(total=Sum('responses'))['total']
+    return (counted or 0) == response_count
+
+def _response_counts(survey, period, start, end):
+    """{bucket: responses} counted from the responses themselves."""
+    responses = Response.objects.filter(survey=survey, created_at__gte=start, created_at__lt=end)\
+                                .annotate(bucket=Trunc('created_at', period, tzinfo=timezone.get_current_timezone()))\
+                                .values_list('bucket').annotate(count=Count('id')).order_by()
+    return dict(responses)
+
+def trend(survey, period, start, end):
+    """
+    Responses per bucket from `start` up to `end` (aware datetimes), as a list
+    of (bucket start, count) including the empty buckets.
+    """
+    if rollups_complete(survey):
+        counts = dict(_window(survey, period, start, end).values_list('bucket', 'responses'))
+    else:
+        counts = _response_counts(survey, period, start, end)
+    counts = {timezone.localtime(bucket): count for bucket, count in counts.items()}
+
+    series = []
+    bucket = bucket_start(start, period)
+    while bucket < end:
+        series.append((bucket, counts.get(bucket, 0)))
+        # Step in local wall time so days stay aligned across DST changes
+        bucket = bucket_start(timezone.make_aware(timezone.make_naive(bucket) + PERIODS[period]), period)
+    return series
+
+def window_aggregates(survey, questions, start=None, end=None):
+    """
+    In-memory QuestionAggregates of `questions` over the day buckets from date
+    `start` to date `end` (inclusive; None leaves that side open), plus the
+    number of responses in the window.
+    """
+    aggregates = {q.id: QuestionAggregate(question_id=q.id, values={}, pairs={}, sketch={}) for q in questions}
+    responses = 0
+    rollups = _window(survey, 'day', start and day_start(start), end and day_start(end + timedelta(days=1)))
+    for rollup in rollups.only('responses', 'questions'):
+        responses += rollup.responses
+        for question_id, histogram in rollup.questions.items():
+            if int(question_id) in aggregates:
+                _merge_histogram(aggregates[int(question_id)], histogram)
+    return aggregates, responses
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Survey
+from .pages import refresh_snapshot, remove_snapshot
+
+
+@receiver(post_save, sender=Survey)
+def schedule_snapshot_refresh(sender, instance, **kwargs):
+    """
+    Re-publish (or drop) the static snapshot once the transaction that saved
+    the survey commits, whichever view saved it. The views save a survey twice
+    around its formset; one refresh per transaction is enough.
+    """
+    if getattr(instance, '_snapshot_refresh_scheduled', False):
+        return
+    instance._snapshot_refresh_scheduled = True
+
+    def refresh():
+        instance._snapshot_refresh_scheduled = False
+        refresh_snapshot(instance)
+
+    transaction.on_commit(refresh)
+
+@receiver(post_delete, sender=Survey)
+def schedule_snapshot_removal(sender, instance, **kwargs):
+    """The start page is served from the snapshot before any lookup, so it must go with the survey."""
+    transaction.on_commit(lambda: remove_snapshot(instance))
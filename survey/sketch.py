@@ -0,0 +1,99 @@
+"""
+Mergeable quantile sketch for numeric answers (a merging t-digest).
+
+A digest is a plain dict so it can live in a JSONField:
+    {'centroids': [[mean, weight], ...], 'n', 'sum', 'sum_squares', 'min', 'max', 'exact'}
+Equal values share one centroid, so a small discrete scale (1-5, 0-10...) is
+kept as exact counts and its quantiles are exact. Once the number of distinct
+values exceeds the compression, neighbouring centroids are merged under the
+t-digest size bound and quantiles become approximate (accurate at the tails,
+within a fraction of a percent of rank around the median). n, sum and
+sum_squares stay exact, so means and t-statistics (stats.summarize) are
+never approximated.
+"""
+import math
+
+COMPRESSION = 100
+
+
+def empty():
+    return {'centroids': [], 'n': 0, 'sum': 0.0, 'sum_squares': 0.0, 'min': None, 'max': None, 'exact': True}
+
+def _k(q, compression):
+    """t-digest k1 scale function: centroids are small near the tails and large near the median."""
+    return compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+def _compress(centroids, total, compression):
+    merged = []
+    cumulative = 0
+    k_left = _k(0, compression)
+    mean, weight = centroids[0]
+    for next_mean, next_weight in centroids[1:]:
+        if _k((cumulative + weight + next_weight) / total, compression) - k_left <= 1:
+            mean = (mean * weight + next_mean * next_weight) / (weight + next_weight)
+            weight += next_weight
+        else:
+            merged.append([mean, weight])
+            cumulative += weight
+            k_left = _k(cumulative / total, compression)
+            mean, weight = next_mean, next_weight
+    merged.append([mean, weight])
+    return merged
+
+def merge(digest, values, compression=COMPRESSION):
+    """
+    Fold `values` (iterable of (value, weight)) or another digest's centroids
+    into `digest` in place. Digests built from disjoint answers merge into the
+    digest of their union.
+    """
+    by_mean = {mean: weight for mean, weight in digest['centroids']}
+    for value, weight in values:
+        by_mean[value] = by_mean.get(value, 0) + weight
+        digest['n'] += weight
+        digest['sum'] += value * weight
+        digest['sum_squares'] += value * value * weight
+        digest['min'] = value if digest['min'] is None else min(digest['min'], value)
+        digest['max'] = value if digest['max'] is None else max(digest['max'], value)
+
+    centroids = sorted([mean, weight] for mean, weight in by_mean.items())
+    if len(centroids) > compression:
+        centroids = _compress(centroids, digest['n'], compression)
+        digest['exact'] = False
+    digest['centroids'] = centroids
+    return digest
+
+def quantile(digest, q):
+    """
+    Value at quantile q (0..1). Exact digests follow statistics.median's rule
+    for q=0.5 (mean of the two middle values when n is even); compressed ones
+    interpolate between centroid centres.
+    """
+    n = digest['n']
+    if not n:
+        return None
+    centroids = digest['centroids']
+
+    if digest['exact']:
+        def nth(index):
+            for mean, weight in centroids:
+                if index < weight:
+                    return mean
+                index -= weight
+        position = q * (n - 1)
+        lower, upper = nth(math.floor(position)), nth(math.ceil(position))
+        return lower + (upper - lower) * (position - math.floor(position))
+
+    rank = q * n
+    cumulative = 0
+    previous_centre, previous_mean = 0, digest['min']
+    for mean, weight in centroids:
+        centre = cumulative + weight / 2
+        if rank < centre:
+            span = centre - previous_centre
+            return previous_mean + (mean - previous_mean) * ((rank - previous_centre) / span if span else 0)
+        cumulative += weight
+        previous_centre, previous_mean = centre, mean
+    return digest['max']
+
+def median(digest):
+    return quantile(digest, 0.5)
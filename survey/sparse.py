@@ -0,0 +1,146 @@
+"""
+Compressed sparse row matrices and Pearson correlation from sufficient statistics.
+
+One-hot survey columns (choice options, Likert labels, Matrix cells) are
+almost all zeros, so the response matrix is kept as CSR: the non-zero values
+of each row, their column indices and the row offsets. The correlation of its
+columns only needs the number of rows, the column sums and the Gram matrix
+XᵀX, which is accumulated over dense blocks of a few rows at a time; the
+full dense matrix is never materialized. Plain NumPy, no SciPy dependency.
+"""
+from array import array
+import numpy as np
+
+
+class CSRMatrix:
+    def __init__(self, data, indices, indptr, shape, fill=None):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = shape
+        # Per column, the value of the cells that are not stored: 0, or NaN for
+        # columns where an absent value is missing rather than zero
+        self.fill = np.zeros(shape[1]) if fill is None else np.asarray(fill, dtype=np.float64)
+
+    @classmethod
+    def from_cells(cls, rows, cols, values, shape, fill=None):
+        """
+        CSR matrix from (row, column, value) cells; see CSRBuilder.add_cells.
+        Large inputs that arrive in row order are cheaper through a CSRBuilder.
+        """
+        builder = CSRBuilder(shape, fill)
+        builder.add_cells(rows, cols, values)
+        return builder.to_matrix()
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    def column_sums(self):
+        return np.bincount(self.indices, weights=self.data, minlength=self.shape[1])
+
+    def column_counts(self):
+        """Stored cells per column."""
+        return np.bincount(self.indices, minlength=self.shape[1])
+
+    def row_blocks(self, max_cells):
+        """
+        Dense float64 blocks of consecutive rows, each at most `max_cells`
+        cells, with every cell that is not stored as 0 (missing values count as
+        0 in the correlation).
+        """
+        n_rows, n_cols = self.shape
+        step = max(1, max_cells // max(n_cols, 1))
+        for start in range(0, n_rows, step):
+            stop = min(start + step, n_rows)
+            block = np.zeros((stop - start, n_cols))
+            lo, hi = self.indptr[start], self.indptr[stop]
+            block_rows = np.repeat(np.arange(stop - start), np.diff(self.indptr[start:stop + 1]))
+            block[block_rows, self.indices[lo:hi]] = self.data[lo:hi]
+            yield block
+
+    def gram(self, max_cells=1_000_000):
+        """XᵀX, accumulated block by block."""
+        gram = np.zeros((self.shape[1], self.shape[1]))
+        for block in self.row_blocks(max_cells):
+            gram += block.T @ block
+        return gram
+
+    def toarray(self):
+        """Dense float64 matrix, with the column fill (0 or NaN) in the cells that are not stored."""
+        dense = np.tile(self.fill, (self.shape[0], 1))
+        dense[np.repeat(np.arange(self.shape[0]), np.diff(self.indptr)), self.indices] = self.data
+        return dense
+
+
+class CSRBuilder:
+    """
+    Assembles a CSRMatrix from blocks of cells, each covering rows that come
+    after those of the previous blocks. The stored values and column indices
+    are appended to typed arrays (12 bytes per stored cell) and handed to NumPy
+    without a copy, so building costs the size of the result plus one block.
+    """
+    def __init__(self, shape, fill=None):
+        self.shape = shape
+        self.fill = np.zeros(shape[1]) if fill is None else np.asarray(fill, dtype=np.float64)
+        self.data = array('d')
+        self.indices = array('i')
+        self.row_counts = np.zeros(shape[0], dtype=np.int64)
+
+    def add_cells(self, rows, cols, values):
+        """
+        Add (row, column, value) cells, as lists, arrays or typed array.array
+        buffers (read in place). A cell given twice keeps its last value;
+        cells equal to their column's fill are left out, and so are NaN cells
+        (NaN counts as 0 in a column filled with 0).
+        """
+        rows, cols = np.asarray(rows), np.asarray(cols)
+        values = np.asarray(values, dtype=np.float64)
+        n_cols = self.shape[1]
+        if not len(values):
+            return
+
+        # Cells in row-major order; a stable sort keeps repeated cells in input
+        # order, so the last of each run is the one that was given last
+        keys = rows.astype(np.int64) * n_cols + cols
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        last = np.append(keys[1:] != keys[:-1], True)
+        keys, values = keys[last], values[order[last]]
+        keep = ~np.isnan(values) & (values != self.fill[keys % n_cols])
+        keys, values = keys[keep], values[keep]
+
+        self.row_counts += np.bincount(keys // n_cols, minlength=self.shape[0])
+        self.data.frombytes(values.tobytes())
+        self.indices.frombytes((keys % n_cols).astype(np.int32).tobytes())
+
+    def to_matrix(self):
+        indptr = np.zeros(self.shape[0] + 1, dtype=np.int64)
+        np.cumsum(self.row_counts, out=indptr[1:])
+        data = np.frombuffer(self.data, dtype=np.float64)
+        indices = np.frombuffer(self.indices, dtype=np.int32)
+        return CSRMatrix(data, indices, indptr, self.shape, self.fill)
+
+
+def pearson(n, sums, gram):
+    """
+    Pearson correlation matrix from the row count, column sums and XᵀX.
+    Pairs involving a column without variance are 0 (as df.corr().fillna(0)),
+    including that column's diagonal entry.
+    """
+    sums = np.asarray(sums, dtype=np.float64)
+    if n < 2:
+        return np.zeros((len(sums), len(sums)))
+    covariance = (np.asarray(gram, dtype=np.float64) - np.outer(sums, sums) / n) / (n - 1)
+    variance = np.diag(covariance).copy()
+    # Cancellation can leave a constant column with a tiny non-zero variance
+    variance[variance <= 1e-12 * np.maximum(np.abs(np.diag(gram)) / n, 1)] = 0
+    deviation = np.sqrt(variance)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = covariance / np.outer(deviation, deviation)
+    correlation[~np.isfinite(correlation)] = 0
+    correlation[variance == 0, :] = 0
+    correlation[:, variance == 0] = 0
+    np.fill_diagonal(correlation, np.where(variance > 0, 1.0, 0.0))
+    return np.clip(correlation, -1.0, 1.0)
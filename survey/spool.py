@@ -0,0 +1,102 @@
+"""
+Durable local spool for survey submissions.
+
+When SURVEY_SUBMISSION_SPOOL is on, survey_submit appends validated payloads
+to a small SQLite journal (separate from the main database) and answers the
+respondent immediately. `manage.py drain_submissions` moves them into
+Response/Answer in bulk.
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from .models import Survey, Question, CustomUser
+from .submission import save_submissions, drop_replays
+
+_local = threading.local()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submission (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL
+)
+"""
+
+
+def _connect():
+    """One connection per thread; WAL + synchronous=FULL so an acknowledged append survives a crash."""
+    path = Path(settings.SURVEY_SPOOL_PATH)
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute(SCHEMA)
+        _local.conn = conn
+        _local.path = path
+    return conn
+
+def _encode(submission):
+    payload = dict(submission)
+    payload['created_at'] = submission['created_at'].isoformat()
+    return json.dumps(payload)
+
+def _decode(payload):
+    submission = json.loads(payload)
+    submission['created_at'] = parse_datetime(submission['created_at'])
+    submission['answers'] = [tuple(pair) for pair in submission['answers']]
+    return submission
+
+def spool_submission(submission):
+    """Append one submission (see submission.build_submission) to the spool."""
+    _connect().execute("INSERT INTO submission (payload) VALUES (?)", (_encode(submission),))
+
+def read_batch(limit):
+    """Oldest spooled submissions first, as a list of (spool_id, submission)."""
+    rows = _connect().execute("SELECT id, payload FROM submission ORDER BY id LIMIT ?", (limit,)).fetchall()
+    return [(spool_id, _decode(payload)) for spool_id, payload in rows]
+
+def delete_batch(spool_ids):
+    """Forget submissions once they are committed to the main database."""
+    if spool_ids:
+        placeholders = ",".join("?" * len(spool_ids))
+        _connect().execute(f"DELETE FROM submission WHERE id IN ({placeholders})", list(spool_ids))
+
+def pending_count():
+    return _connect().execute("SELECT COUNT(*) FROM submission").fetchone()[0]
+
+def drain(batch_size):
+    """
+    Move one batch from the spool into Response/Answer. Replayed tokens and
+    submissions whose survey was deleted meanwhile are dropped, answers to
+    deleted questions are skipped and deleted respondents become anonymous.
+    Returns the batch size.
+    """
+    batch = read_batch(batch_size)
+    if not batch:
+        return 0
+
+    submissions = [submission for _, submission in batch]
+    survey_ids = {s['survey_id'] for s in submissions}
+    live_surveys = set(Survey.objects.filter(id__in=survey_ids).values_list('id', flat=True))
+    live_questions = set(Question.objects.filter(survey_id__in=survey_ids).values_list('id', flat=True))
+    live_respondents = set(CustomUser.objects.filter(
+        id__in={s['respondent_id'] for s in submissions if s['respondent_id']}
+    ).values_list('id', flat=True))
+
+    to_save = []
+    for s in drop_replays(submissions):
+        if s['survey_id'] not in live_surveys:
+            continue
+        s['answers'] = [(qid, data) for qid, data in s['answers'] if qid in live_questions]
+        if s['respondent_id'] not in live_respondents:
+            s['respondent_id'] = None
+        to_save.append(s)
+
+    if to_save:
+        save_submissions(to_save)
+    delete_batch([spool_id for spool_id, _ in batch])
+    return len(batch)
@@ -0,0 +1,139 @@
+"""
+Vectorized statistics for scale questions (Likert, Rating and Matrix rows).
+
+Scores are laid out as columns of a 2-D float array, one column per question or
+matrix row and NaN where a column has fewer scores, so the figures of many
+columns are computed at once. Scores may carry counts (a {score: count}
+histogram, as the question aggregates keep), or come as running moments
+(summarize(), for the rating sketches), so every analytics path shares these
+formulas. Results equal what the statistics module gives on each column's
+expanded list of scores; scale_statistics() also reproduces its int/float
+result types so rendered values do not change.
+"""
+import warnings
+import numpy as np
+
+
+def label_codes(labels):
+    """{label: 1-based score}, keeping the first position of a repeated label (like list.index)."""
+    codes = {}
+    for score, label in enumerate(labels, start=1):
+        codes.setdefault(label, score)
+    return codes
+
+def pad_columns(score_lists):
+    """Stack score lists of different lengths as columns, padding with NaN."""
+    length = max((len(scores) for scores in score_lists), default=0)
+    columns = np.full((length, len(score_lists)), np.nan)
+    for index, scores in enumerate(score_lists):
+        columns[:len(scores), index] = scores
+    return columns
+
+def weighted_median(scores, counts):
+    """statistics.median() of `scores` repeated `counts` times (NaN when there are none)."""
+    order = np.argsort(scores)
+    scores, cumulative = np.asarray(scores)[order], np.cumsum(np.asarray(counts)[order])
+    n = cumulative[-1] if len(cumulative) else 0
+    if not n:
+        return np.nan
+    lower = scores[np.searchsorted(cumulative, (n - 1) // 2, side='right')]
+    upper = scores[np.searchsorted(cumulative, n // 2, side='right')]
+    return (lower + upper) / 2
+
+def summarize(n, total, total_squares, median):
+    """
+    Per-column n, mean, median and sample standard deviation from the running
+    moments (n, sum, sum of squares) and medians. mean is NaN for empty
+    columns, stdev for columns with fewer than two scores.
+    """
+    n, total, total_squares = (np.asarray(a, dtype=float) for a in (n, total, total_squares))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / n
+        variance = (n * total_squares - total * total) / (n * (n - 1))
+        stdev = np.sqrt(np.maximum(variance, 0.0))
+    stdev[n < 2] = np.nan
+
+    return {'n': n, 'mean': mean, 'median': np.asarray(median, dtype=float), 'stdev': stdev}
+
+def describe(columns, counts=None):
+    """
+    summarize() of each column of a 2-D score array (NaN = no score), each
+    score weighted by the matching cell of `counts` when given.
+    """
+    columns = np.asarray(columns, dtype=float)
+    valid = ~np.isnan(columns)
+    filled = np.where(valid, columns, 0.0)
+    weights = valid.astype(float) if counts is None else np.where(valid, np.nan_to_num(np.asarray(counts, dtype=float)), 0.0)
+
+    if counts is None:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN columns
+            median = np.nanmedian(columns, axis=0) if len(columns) else np.full(columns.shape[1], np.nan)
+    else:
+        median = np.array([weighted_median(filled[valid[:, c], c], weights[valid[:, c], c]) for c in range(columns.shape[1])])
+
+    return summarize(weights.sum(axis=0), (weights * filled).sum(axis=0), (weights * filled * filled).sum(axis=0), median)
+
+def t_stats(described, midpoint):
+    """One-sample t against `midpoint` per column: NaN with fewer than two scores, 0 when stdev is 0."""
+    n, mean, stdev = described['n'], described['mean'], described['stdev']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = (mean - midpoint) / (stdev / np.sqrt(n))
+    t = np.where(stdev == 0, 0.0, t)
+    t[n < 2] = np.nan
+    return t
+
+def interpretation_index(mean, count, min_score=1):
+    """
+    Bucket of `mean` on a scale of `count` points starting at `min_score`:
+    floor((mean - min) / ((max - min) / count)), clamped to the scale.
+    """
+    mean = np.asarray(mean, dtype=float)
+    count = np.broadcast_to(np.asarray(count, dtype=float), mean.shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        interval = (count - 1) / count
+        index = np.trunc((mean - min_score) / interval)
+    index = np.where(interval > 0, index, 0)
+    return np.clip(np.nan_to_num(index), 0, np.maximum(count - 1, 0)).astype(int)
+
+def scale_statistics(score_lists, midpoint, scale_points, min_score=1, integer_scores=False, round_mean_to=None, counts=None):
+    """
+    Figures for several score lists at once (questions or matrix rows sharing
+    a scale), as plain Python values per list: n, mean, median, stdev,
+    t_stat and interpretation_index (None where undefined).
+
+    counts, when given, holds the number of times each score occurs (lists
+    parallel to score_lists). With integer_scores, integral means and
+    odd-length medians are ints, as the statistics module returns them; a zero
+    stdev gives a t_stat of 0. round_mean_to interprets the mean rounded to
+    that many digits.
+    """
+    described = describe(pad_columns(score_lists), None if counts is None else pad_columns(counts))
+    return scale_figures(described, midpoint, scale_points, min_score, integer_scores, round_mean_to)
+
+def scale_figures(described, midpoint, scale_points, min_score=1, integer_scores=False, round_mean_to=None):
+    """The scale_statistics() figures of each column of describe() or summarize() output."""
+    t = t_stats(described, midpoint)
+    mean = described['mean']
+    if round_mean_to is not None:
+        mean = np.array([round(float(m), round_mean_to) for m in mean])
+    index = interpretation_index(mean, scale_points, min_score)
+
+    results = []
+    for column in range(len(described['n'])):
+        n = int(described['n'][column])
+        figures = {'n': n, 'mean': None, 'median': None, 'stdev': None, 't_stat': None, 'interpretation_index': None}
+        if n:
+            figures['mean'] = float(described['mean'][column])
+            figures['median'] = float(described['median'][column])
+            figures['interpretation_index'] = int(index[column])
+            if integer_scores:
+                if figures['mean'].is_integer():
+                    figures['mean'] = int(figures['mean'])
+                if n % 2 == 1:
+                    figures['median'] = int(figures['median'])
+        if n > 1:
+            figures['stdev'] = float(described['stdev'][column])
+            figures['t_stat'] = 0 if figures['stdev'] == 0 else float(t[column])
+        results.append(figures)
+    return results
@@ -0,0 +1,438 @@
+import json
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext as _
+from .aggregates import aggregated_questions, is_aggregated, is_sketched, update_aggregates
+from .rollups import update_rollups
+from .correlation import update_correlation_stats
+from .models import Survey, Response, Answer, SectionHeader, MatrixQuestion, RankQuestion, MultiChoiceQuestion, TextQuestion, RatingQuestion
+
+
+# ---------------------------------------------------------------------------
+# Decoders: one per question type, each turns form data into answer_data
+# ---------------------------------------------------------------------------
+
+def decode_choice(field, data):
+    """Single value, or a list when several inputs share the same name."""
+    values = data.getlist(field['key'])
+    if len(values) > 1:
+        return values
+    elif len(values) == 1:
+        return values[0] # Single string handling
+    return ''
+
+def decode_matrix(field, data):
+    """One radio group per row, named '<row label>_row<i>'."""
+    return {row_label: data.get(post_key) or "" for row_label, post_key in field['row_keys']}
+
+def decode_rank(field, data):
+    """
+    Save as dict where key is the rank (1-based).
+    The frontend sends the items bottom-up, hence values[::-1].
+    """
+    values = data.getlist(field['key'])
+    if not values:
+        return ""
+    return {val: str(i) for i, val in enumerate(values[::-1], start=1)}
+
+
+# ---------------------------------------------------------------------------
+# Submission plan
+# ---------------------------------------------------------------------------
+
+def build_submission_plan(survey):
+    """
+    Compile everything survey_submit needs to know about a survey into a
+    plain, picklable structure: the ordered form keys of each question,
+    its decoder, its required flag and the limits checked by validate_submission.
+    """
+    fields = []
+    for question in survey.questions.all().order_by('position'):
+        if isinstance(question, SectionHeader):
+            continue
+
+        field = {
+            'question_id': question.id,
+            'label': question.label,
+            'key': f'question_{question.position}',
+            'required': question.required,
+            'decoder': decode_choice,
+            'aggregated': is_aggregated(question),
+            'sketched': is_sketched(question),
+        }
+        if isinstance(question, MatrixQuestion):
+            field['decoder'] = decode_matrix
+            field['row_keys'] = [(row_label, f'{row_label}_row{i}') for i, row_label in enumerate(question.rows, start=1)]
+        elif isinstance(question, RankQuestion):
+            field['decoder'] = decode_rank
+        elif isinstance(question, MultiChoiceQuestion) and question.allow_multiple:
+            field['min_selected'] = question.the_minimum_number_of_options_to_be_selected
+        elif isinstance(question, TextQuestion):
+            field['min_length'] = question.min_length
+            field['max_length'] = question.max_length
+        elif isinstance(question, RatingQuestion):
+            field['range'] = (question.range_min, question.range_max)
+        fields.append(field)
+
+    return {
+        'survey_id': survey.id,
+        'revision': survey.last_updated.isoformat(),
+        'fields': fields,
+    }
+
+def _plan_cache_key(survey):
+    return f'survey:{survey.id}:submission-plan:{survey.last_updated.isoformat()}'
+
+def get_submission_plan(survey):
+    """Return the cached plan for the survey's current revision, compiling it on a miss."""
+    key = _plan_cache_key(survey)
+    plan = cache.get(key)
+    if plan is None:
+        plan = build_submission_plan(survey)
+        cache.set(key, plan, settings.SURVEY_PLAN_CACHE_TIMEOUT)
+    return plan
+
+def warm_submission_plan(survey):
+    """Compile the plan right after a publish/edit so respondents never pay for it."""
+    # Re-read the revision: save(update_fields=...) bumps last_updated in memory only.
+    survey = Survey.objects.get(pk=survey.pk)
+    return get_submission_plan(survey)
+
+
+# ---------------------------------------------------------------------------
+# Parsing and persistence
+# ---------------------------------------------------------------------------
+
+def parse_submission(plan, data):
+    """
+    Turn the submitted form data into a list of (field, answer_data) pairs.
+    Nothing is written to the database here, so the whole payload can be
+    inspected before a transaction is opened.
+    """
+    return [(field, field['decoder'](field, data)) for field in plan['fields']]
+
+def validate_submission(answers):
+    """
+    Check a parsed submission against the survey rules without touching the
+    database. Returns a list of error messages (empty when the payload is valid).
+    """
+    errors = []
+    for field, answer_data in answers:
+        label = field['label']
+
+        if 'row_keys' in field:
+            answered = isinstance(answer_data, dict) and all(answer_data.values())
+        else:
+            answered = bool(answer_data)
+
+        if not answered:
+            if field['required']:
+                errors.append(_('"%s" is required.') % label)
+            continue
+
+        if field.get('min_selected'):
+            selected = len(answer_data) if isinstance(answer_data, list) else 1
+            if selected < field['min_selected']:
+                errors.append(_('Select at least %(count)s options for "%(label)s".') % {'count': field['min_selected'], 'label': label})
+
+        if field.get('min_length') is not None and len(str(answer_data)) < field['min_length']:
+            errors.append(_('"%(label)s" must be at least %(count)s characters long.') % {'count': field['min_length'], 'label': label})
+
+        if field.get('max_length') is not None and len(str(answer_data)) > field['max_length']:
+            errors.append(_('"%(label)s" must be at most %(count)s characters long.') % {'count': field['max_length'], 'label': label})
+
+        if 'range' in field:
+            range_min, range_max = field['range']
+            try:
+                value = int(answer_data)
+            except (ValueError, TypeError):
+                value = None
+            if value is None or not range_min <= value <= range_max:
+                errors.append(_('"%(label)s" must be a rating between %(min)s and %(max)s.') % {'min': range_min, 'max': range_max, 'label': label})
+
+    return errors
+
+def build_submission(survey, respondent, answers, token=None):
+    """
+    Package a parsed submission as a plain dict (ids and JSON data only), the
+    unit that is spooled, batched and bulk-inserted.
+    """
+    submission = {
+        'survey_id': survey.id,
+        'respondent_id': respondent.id if respondent else None,
+        'token': token,
+        'created_at': timezone.now(),
+        'answers': [(field['question_id'], answer_data) for field, answer_data in answers],
+    }
+    # [question id, keeps a digest] pairs of the aggregated questions, as a list so
+    # the ids stay ints through the spool's JSON; left out for plans cached before
+    # these flags existed, in which case save_submissions looks the questions up.
+    if all('sketched' in field for field, _ in answers):
+        submission['aggregated'] = [[field['question_id'], field['sketched']] for field, _ in answers if field['aggregated']]
+    return submission
+
+def is_replay(token):
+    """True when a submission with this one-time token was already stored (one indexed lookup)."""
+    return bool(token) and Response.objects.filter(submission_token=token).exists()
+
+def drop_replays(submissions):
+    """
+    Filter out submissions whose token is already stored or repeated earlier
+    in the same list (one indexed lookup for the whole list).
+    """
+    seen_tokens = set(Response.objects.filter(
+        submission_token__in={s['token'] for s in submissions if s.get('token')}
+    ).values_list('submission_token', flat=True))
+
+    fresh = []
+    for s in submissions:
+        if s.get('token'):
+            if s['token'] in seen_tokens:
+                continue
+            seen_tokens.add(s['token'])
+        fresh.append(s)
+    return fresh
+
+def save_submissions(submissions):
+    """
+    Persist many submissions in one transaction: one batched INSERT for the
+    Responses and one for all of their Answers (chunked for very large batches),
+    then fold the answers into the question aggregates, the hourly/daily rollups
+    and the correlation statistics.
+    Returns the created Responses in the same order.
+    """
+    batch_size = settings.SURVEY_ANSWER_BATCH_SIZE
+    with transaction.atomic():
+        responses = Response.objects.bulk_create(
+            [Response(survey_id=s['survey_id'], respondent_id=s['respondent_id'],
+                      created_at=s['created_at'], submission_token=s.get('token'))
+             for s in submissions],
+            batch_size=batch_size,
+        )
+        answers = Answer.objects.bulk_create(
+            [Answer(response=response, question_id=question_id, answer_data=answer_data)
+             for response, s in zip(responses, submissions)
+             for question_id, answer_data in s['answers']],
+            batch_size=batch_size,
+        )
+        aggregated = aggregated_questions(submissions)
+        update_aggregates(answers, aggregated)
+        update_rollups(submissions, aggregated)
+        update_correlation_stats(submissions)
+    return responses
+
+
+def save_in_chunks(submissions, chunk_size, on_flush=None, on_error=None):
+    """
+    Consume an iterable of submissions and store them with save_submissions()
+    every `chunk_size` items, so memory stays bounded for large imports.
+    `on_flush(stored, replayed)` is called after each chunk for progress output.
+    Each chunk is its own transaction; with `on_error(chunk, exc)` a chunk that
+    fails with a DatabaseError is rolled back and reported there instead of
+    aborting the import (earlier chunks stay committed either way).
+    Returns (stored, replayed) counts.
+    """
+    stored = replayed = 0
+    chunk = []
+
+    def flush():
+        nonlocal stored, replayed
+        try:
+            fresh = drop_replays(chunk)
+            if fresh:
+                save_submissions(fresh)
+        except DatabaseError as e:
+            if on_error is None:
+                raise
+            on_error(list(chunk), e)
+            chunk.clear()
+            return
+        stored += len(fresh)
+        replayed += len(chunk) - len(fresh)
+        chunk.clear()
+        if on_flush:
+            on_flush(stored, replayed)
+
+    for submission in submissions:
+        chunk.append(submission)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return stored, replayed
+
+
+# ---------------------------------------------------------------------------
+# Group commit
+# ---------------------------------------------------------------------------
+
+class GroupCommitter:
+    """
+    Collects submissions that arrive within a few milliseconds of each other
+    (across request threads of this process) and writes them with a single
+    save_submissions() call, i.e. one transaction and one commit per group.
+
+    The first thread to arrive becomes the leader: it waits `window` seconds
+    for others to join, commits the group and wakes everyone up. If more
+    submissions queued up meanwhile, leadership passes to the oldest of them.
+    """
+
+    def __init__(self, window, max_batch):
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._queue = []
+        self._leader_active = False
+
+    def submit(self, submission):
+        """Queue a submission and block until its group is committed; returns its Response."""
+        entry = {'submission': submission, 'wake': threading.Event(), 'done': False, 'response': None, 'error': None}
+        with self._lock:
+            self._queue.append(entry)
+            is_leader = not self._leader_active
+            self._leader_active = True
+
+        if is_leader:
+            time.sleep(self.window)
+        else:
+            entry['wake'].wait()
+
+        if not entry['done']:
+            # Leader (first arrival or promoted): commit the oldest group
+            with self._lock:
+                batch = self._queue[:self.max_batch]
+                del self._queue[:self.max_batch]
+            self._commit(batch)
+            with self._lock:
+                if self._queue:
+                    self._queue[0]['wake'].set()  # hand leadership over
+                else:
+                    self._leader_active = False
+
+        if entry['error'] is not None:
+            raise entry['error']
+        return entry['response']
+
+    def _commit(self, batch):
+        try:
+            responses = save_submissions([entry['submission'] for entry in batch])
+            for entry, response in zip(batch, responses):
+                entry['response'] = response
+        except Exception:
+            # Don't let one bad submission fail the whole group: retry one by one
+            for entry in batch:
+                try:
+                    entry['response'] = save_submissions([entry['submission']])[0]
+                except Exception as e:
+                    entry['error'] = e
+
+        for entry in batch:
+            entry['done'] = True
+            entry['wake'].set()
+
+_group_committer = None
+
+def commit_submission(submission):
+    """
+    Store one submission, sharing the transaction with concurrent ones when
+    SURVEY_GROUP_COMMIT_WINDOW is set. Returns the created Response.
+    """
+    global _group_committer
+    if not settings.SURVEY_GROUP_COMMIT_WINDOW:
+        return save_submissions([submission])[0]
+    if _group_committer is None:
+        _group_committer = GroupCommitter(settings.SURVEY_GROUP_COMMIT_WINDOW, settings.SURVEY_GROUP_COMMIT_MAX_BATCH)
+    return _group_committer.submit(submission)
+
+
+# ---------------------------------------------------------------------------
+# Batch import (NDJSON)
+# ---------------------------------------------------------------------------
+
+TOKEN_MAX_LENGTH = Response._meta.get_field('submission_token').max_length
+
+def parse_ndjson_submissions(survey, lines, errors):
+    """
+    Yield submissions from NDJSON lines, one response per line:
+
+        {"answers": {"question_1": "Red", "Service_row1": "Good"},
+         "submitted_at": "2026-01-31T10:00:00Z", "submission_token": "..."}
+
+    `answers` uses the same field names as the survey form, so each line is
+    decoded and validated by the same plan as survey_submit. Invalid lines are
+    reported in `errors` as {'line': n, 'errors': [...]} and skipped; each
+    yielded submission carries its `line` number for later error reports.
+    """
+    plan = get_submission_plan(survey)
+
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+            answers = record['answers']
+            data = MultiValueDict({
+                key: [str(v) for v in (value if isinstance(value, list) else [value])]
+                for key, value in answers.items()
+            })
+            submitted_at = parse_datetime(record['submitted_at']) if record.get('submitted_at') else None
+            token = record.get('submission_token')
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            errors.append({'line': line_number, 'errors': [_('Invalid record: %s') % e]})
+            continue
+
+        if token is not None and (not isinstance(token, str) or len(token) > TOKEN_MAX_LENGTH):
+            errors.append({'line': line_number, 'errors': [
+                _('submission_token must be a string of at most %d characters.') % TOKEN_MAX_LENGTH]})
+            continue
+
+        parsed = parse_submission(plan, data)
+        line_errors = validate_submission(parsed)
+        if line_errors:
+            errors.append({'line': line_number, 'errors': line_errors})
+            continue
+
+        submission = build_submission(survey, None, parsed, token=token)
+        submission['line'] = line_number
+        if submitted_at:
+            if timezone.is_naive(submitted_at):
+                submitted_at = timezone.make_aware(submitted_at)
+            submission['created_at'] = submitted_at
+        yield submission
+
+
+# ---------------------------------------------------------------------------
+# Historical import (CSV shaped like the "raw" export)
+# ---------------------------------------------------------------------------
+
+def _split_pairs(cell):
+    """'Row A: Col 1 | Row B: Col 2' -> {'Row A': 'Col 1', 'Row B': 'Col 2'} (quotes optional)."""
+    pairs = {}
+    for item in cell.split(" | "):
+        key, sep, value = item.partition(": ")
+        if sep:
+            pairs[key] = value.strip().strip("'")
+    return pairs
+
+def decode_export_cell(question, cell):
+    """
+    Inverse of the raw export formatting in get_survey_export_data: lists are
+    joined with ' | ', dicts are 'key: value' pairs and missing answers are 'N/A'.
+    Returns None when the cell holds no answer.
+    """
+    if cell is None or cell.strip() in ("", "N/A"):
+        return None
+    if isinstance(question, (MatrixQuestion, RankQuestion)):
+        return _split_pairs(cell) or None
+    if isinstance(question, MultiChoiceQuestion) and question.allow_multiple and " | " in cell:
+        return cell.split(" | ")
+    return cell
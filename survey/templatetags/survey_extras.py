@@ -24,20 +24,37 @@ def get_surveys(value):
 
 @register.filter
 def shuffle_if(seq, condition):
-    """Shuffle if condition is True, otherwise return original"""
+    """
+    Shuffle if condition is truthy, otherwise return original.
+    A string condition is used as the seed, so the same seed gives the same order.
+    """
     if condition:
         try:
             result = list(seq)[:] 
-            random.shuffle(result)
+            rng = random.Random(condition) if isinstance(condition, str) else random
+            rng.shuffle(result)
             return result
         except:
             return seq
     return seq
 
 
+@register.simple_tag(takes_context=True)
+def survey_sections(context, questions, shuffle_questions=False):
+    """
+    {% survey_sections questions survey.shuffle_questions as sections %}
+    Same as group_by_sections, seeded with `shuffle_seed` from the context when present.
+    """
+    return group_by_sections(questions, shuffle_questions, seed=context.get('shuffle_seed'))
+
 @register.filter
-def group_by_sections(questions, shuffle_questions=False):
-    """Split a flat question list/queryset into sections using SectionHeader as page titles."""
+def group_by_sections(questions, shuffle_questions=False, seed=None):
+    """
+    Split a flat question list/queryset into sections using SectionHeader as page titles.
+    With a `seed`, the shuffled order of questions and randomized options is
+    deterministic, so a bounded set of rendered variants can be cached.
+    """
+    rng = random.Random(seed) if seed is not None else random
     try:
         items = list(questions)
     except TypeError:
@@ -60,7 +77,7 @@ def group_by_sections(questions, shuffle_questions=False):
             # Close previous section if it has any questions
             if current_questions:
                 if shuffle_questions:
-                    random.shuffle(current_questions)
+                    rng.shuffle(current_questions)
 
                 sections.append({
                     'title': current_title,
@@ -77,7 +94,7 @@ def group_by_sections(questions, shuffle_questions=False):
 
     if current_questions:
         if shuffle_questions:
-            random.shuffle(current_questions)
+            rng.shuffle(current_questions)
 
         sections.append({
             'title': current_title,
@@ -90,9 +107,13 @@ def group_by_sections(questions, shuffle_questions=False):
     for section in sections:
         new_questions_list = []
         for question in section['questions']:
+            option_seed = getattr(question, 'randomize_options', False)
+            if option_seed and seed is not None:
+                option_seed = f"{seed}:{question.id}"
             new_questions_list.append({
                 'question': question,
-                'visual_index': display_counter
+                'visual_index': display_counter,
+                'option_seed': option_seed,
             })
             display_counter += 1
         section['questions'] = new_questions_list
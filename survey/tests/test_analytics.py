@@ -0,0 +1,422 @@
+import pytest
+from django.http import QueryDict
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from survey.analytics import get_survey_analytics
+from survey.utility import get_question_analytics
+from survey.tests.factories import (
+    SurveyFactory,
+    ResponseFactory,
+    AnswerFactory,
+    MultiChoiceQuestionFactory,
+    LikertQuestionFactory,
+    MatrixQuestionFactory,
+    RatingQuestionFactory,
+    RankQuestionFactory,
+    TextQuestionFactory,
+)
+
+
+def make_survey(extra_ratings=0):
+    survey = SurveyFactory(state='published')
+    multi = MultiChoiceQuestionFactory(survey=survey, position=1, allow_multiple=True)
+    likert = LikertQuestionFactory(survey=survey, position=2)
+    matrix = MatrixQuestionFactory(survey=survey, position=3)
+    rating = RatingQuestionFactory(survey=survey, position=4)
+    rank = RankQuestionFactory(survey=survey, position=5)
+    for position in range(6, 6 + extra_ratings):
+        RatingQuestionFactory(survey=survey, position=position)
+
+    answers = [
+        (["Red", "Blue"], "Agree", {"Row 1": "Col 2", "Row 2": "Col 3"}, "4", {"Option A": "1", "Option B": "3", "Option C": "2"}),
+        ("Green", "2", {"Row 1_row1": "Col 1", "Row 2": ""}, "5", {"Option A": "2", "Option B": "1", "Option C": "3"}),
+        ("", "Neutral", {"Row 1": "", "Row 2": ""}, "", {}),
+        (["Yellow"], "Strongly Agree", {"Row 1": "Col 3", "Row 2": "Col 1"}, "2", {"Option A": "3", "Option B": "2", "Option C": "1"}),
+    ]
+    for values in answers:
+        response = ResponseFactory(survey=survey)
+        for question, answer_data in zip([multi, likert, matrix, rating, rank], values):
+            AnswerFactory(response=response, question=question, answer_data=answer_data)
+    return survey
+
+
+@pytest.mark.django_db
+class TestSurveyAnalytics:
+    def test_matches_per_question_analytics(self):
+        survey = make_survey()
+        questions = list(survey.questions.all())
+
+        assert get_survey_analytics(questions) == [get_question_analytics(q) for q in questions]
+
+    def test_analytics_page_queries_do_not_grow_with_questions(self, client):
+        def count_queries(survey):
+            client.force_login(survey.created_by)
+            with CaptureQueriesContext(connection) as queries:
+                assert client.get(reverse('SurveyAnalytics', args=[survey.uuid])).status_code == 200
+            return len(queries)
+
+        assert count_queries(make_survey()) == count_queries(make_survey(extra_ratings=10))
+
+
+@pytest.mark.django_db
+class TestQuestionAggregates:
+    def test_rebuilt_aggregates_match_answer_analytics(self):
+        import io
+        from django.core.management import call_command
+        from survey.models import QuestionAggregate
+        survey = make_survey()
+        questions = list(survey.questions.all())
+
+        call_command('rebuild_aggregates', str(survey.uuid), stdout=io.StringIO())
+
+        assert QuestionAggregate.objects.filter(question__survey=survey).count() == 5
+        assert get_survey_analytics(questions) == [get_question_analytics(q) for q in questions]
+
+    def test_submissions_update_aggregates(self):
+        from survey.aggregates import rebuild_aggregates
+        from survey.submission import build_submission, save_submissions
+        from survey.models import QuestionAggregate
+        survey = make_survey()
+        multi, likert, matrix, rating, rank = survey.questions.all()
+
+        def submit(*values):
+            fields = [{'question_id': q.id} for q in (multi, likert, matrix, rating, rank)]
+            save_submissions([build_submission(survey, None, list(zip(fields, values)))])
+
+        # Questions answered before their aggregate existed are left to rebuild_aggregates
+        submit(["Red"], "Disagree", {"Row 1": "Col 1", "Row 2": "Col 2"}, "1", {"Option A": "1", "Option B": "2", "Option C": "3"})
+        assert not QuestionAggregate.objects.filter(question__survey=survey).exists()
+        rebuild_aggregates([multi, likert, matrix, rating, rank])
+        submit("Blue", "Agree", {"Row 1": "Col 3", "Row 2": ""}, "3", {"Option A": "3", "Option B": "1", "Option C": "2"})
+
+        assert QuestionAggregate.objects.get(question=rating).answered == 5
+        # Only ratings read a digest
+        assert QuestionAggregate.objects.get(question=rating).sketch['n'] == 5
+        assert not QuestionAggregate.objects.get(question=likert).sketch
+        questions = [multi, likert, matrix, rating, rank]
+        assert get_survey_analytics(questions) == [get_question_analytics(q) for q in questions]
+
+    def test_free_text_is_not_aggregated(self):
+        from survey.submission import build_submission, get_submission_plan, parse_submission, save_submissions
+        from survey.models import QuestionAggregate
+        survey = SurveyFactory(state='published')
+        rating = RatingQuestionFactory(survey=survey, position=1)
+        text = TextQuestionFactory(survey=survey, position=2, is_long_answer=False)
+        plan = get_submission_plan(survey)
+
+        for n in range(3):
+            post = QueryDict(mutable=True)
+            post.update({'question_1': str(n + 1), 'question_2': f"Free text answer {n}"})
+            save_submissions([build_submission(survey, None, parse_submission(plan, post))])
+
+        assert QuestionAggregate.objects.get(question=rating).answered == 3
+        assert not QuestionAggregate.objects.filter(question=text).exists()
+        assert get_survey_analytics([rating, text]) == [get_question_analytics(q) for q in (rating, text)]
+
+
+@pytest.mark.django_db
+class TestAnalyticsCache:
+    def test_repeat_visits_are_served_from_cache_until_a_new_response(self, client):
+        survey = make_survey()
+        rating = survey.questions.get(position=4)
+        client.force_login(survey.created_by)
+        url = reverse('SurveyAnalytics', args=[survey.uuid])
+
+        def visit():
+            with CaptureQueriesContext(connection) as queries:
+                page = client.get(url)
+            rating_data = next(d for d in page.context['analytics_data'] if d['question'].id == rating.id)
+            return len(queries), rating_data['distribution'][3]
+
+        first_queries, first_count = visit()
+        cached_queries, cached_count = visit()
+        assert cached_queries < first_queries
+        assert cached_count == first_count == 0
+
+        # A new response moves the watermark, so the next visit recomputes
+        AnswerFactory(response=ResponseFactory(survey=survey), question=rating, answer_data="3")
+        _, fresh_count = visit()
+        assert fresh_count == 1
+
+
+class TestSingleFlight:
+    def test_concurrent_callers_share_one_computation(self):
+        import threading
+        import time
+        import uuid
+        from survey.caching import single_flight
+
+        key = f"test:single-flight:{uuid.uuid4().hex}"
+        calls = []
+        def compute():
+            calls.append(1)
+            time.sleep(0.3)
+            return {'value': 42}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(single_flight(key, compute, 60))) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [{'value': 42}] * 6
+
+    def test_waiter_takes_over_when_the_leader_fails(self):
+        import uuid
+        from django.core.cache import cache
+        from survey.caching import single_flight
+
+        key = f"test:single-flight:{uuid.uuid4().hex}"
+        with pytest.raises(ZeroDivisionError):
+            single_flight(key, lambda: 1 / 0, 60)
+
+        # The failed leader released its lock
+        assert cache.get(f"{key}:lock") is None
+        assert single_flight(key, lambda: 'ok', 60) == 'ok'
+
+    def test_none_results_are_cached(self):
+        import uuid
+        from survey.caching import single_flight
+
+        key = f"test:single-flight:{uuid.uuid4().hex}"
+        calls = []
+        def compute():
+            calls.append(1)
+            return None
+
+        assert single_flight(key, compute, 60) is None
+        assert single_flight(key, compute, 60) is None
+        assert len(calls) == 1
+
+
+@pytest.mark.django_db
+class TestResponseRollups:
+    ANSWERS = [
+        # (day, multi, likert, matrix, rating, rank)
+        (1, ["Red", "Blue"], "Agree", {"Row 1": "Col 2", "Row 2": "Col 3"}, "4", {"Option A": "1", "Option B": "3", "Option C": "2"}),
+        (1, "Green", "Disagree", {"Row 1": "Col 1", "Row 2": ""}, "5", {"Option A": "2", "Option B": "1", "Option C": "3"}),
+        (3, ["Yellow"], "Strongly Agree", {"Row 1": "Col 3", "Row 2": "Col 1"}, "2", {"Option A": "3", "Option B": "2", "Option C": "1"}),
+    ]
+
+    def submit_answers(self):
+        from datetime import datetime, timezone as dt_timezone
+        from survey.submission import build_submission, save_submissions
+        survey = SurveyFactory(state='published')
+        questions = [
+            MultiChoiceQuestionFactory(survey=survey, position=1, allow_multiple=True),
+            LikertQuestionFactory(survey=survey, position=2),
+            MatrixQuestionFactory(survey=survey, position=3),
+            RatingQuestionFactory(survey=survey, position=4),
+            RankQuestionFactory(survey=survey, position=5),
+        ]
+        fields = [{'question_id': q.id} for q in questions]
+        for day, *values in self.ANSWERS:
+            submission = build_submission(survey, None, list(zip(fields, values)))
+            submission['created_at'] = datetime(2026, 3, day, 10, 30, tzinfo=dt_timezone.utc)
+            save_submissions([submission])
+        return survey, questions
+
+    def test_date_window_matches_analytics_of_its_answers(self):
+        from datetime import date
+        from survey.aggregates import aggregate_analytics
+        from survey.rollups import window_aggregates
+        survey, questions = self.submit_answers()
+
+        aggregates, responses = window_aggregates(survey, questions, date(2026, 3, 1), date(2026, 3, 2))
+
+        assert responses == 2
+        for index, question in enumerate(questions, start=1):
+            answers = [row[index] for row in self.ANSWERS if row[0] == 1]
+            assert aggregate_analytics(question, aggregates[question.id]) == \
+                   get_question_analytics(question, answers=answers, respondent_count=len(answers))
+
+    def test_free_text_only_counts_answers(self):
+        from datetime import datetime, timezone as dt_timezone
+        from survey.models import ResponseRollup
+        from survey.submission import build_submission, get_submission_plan, parse_submission, save_submissions
+        survey = SurveyFactory(state='published')
+        text = TextQuestionFactory(survey=survey, position=1, is_long_answer=False)
+        plan = get_submission_plan(survey)
+
+        for n in range(3):
+            post = QueryDict(mutable=True)
+            post.update({'question_1': f"Free text answer {n}"})
+            submission = build_submission(survey, None, parse_submission(plan, post))
+            submission['created_at'] = datetime(2026, 3, 1, 10, n, tzinfo=dt_timezone.utc)
+            save_submissions([submission])
+
+        for rollup in ResponseRollup.objects.filter(survey=survey):
+            assert rollup.questions[str(text.id)] == {'answered': 3, 'filled': 0, 'values': {}, 'pairs': {}}
+
+    def test_backfill_matches_incremental_rollups(self):
+        import io
+        from django.core.management import call_command
+        from survey.models import ResponseRollup
+        survey, _ = self.submit_answers()
+
+        def rollups():
+            return sorted(ResponseRollup.objects.filter(survey=survey).values_list('period', 'bucket', 'responses', 'questions'))
+
+        incremental = rollups()
+        call_command('backfill_rollups', str(survey.uuid), stdout=io.StringIO())
+
+        assert len(incremental) == 4  # two days and two hours
+        assert rollups() == incremental
+
+    def test_trend_endpoint_fills_empty_buckets(self, client):
+        survey, _ = self.submit_answers()
+        client.force_login(survey.created_by)
+
+        response = client.get(reverse('survey_trend', args=[survey.uuid]), {'start': '2026-03-01', 'end': '2026-03-04'})
+
+        assert response.json() == {
+            'period': 'day',
+            'labels': ['2026-03-01', '2026-03-02', '2026-03-03', '2026-03-04'],
+            'values': [2, 0, 1, 0],
+        }
+        hourly = client.get(reverse('survey_trend', args=[survey.uuid]), {'period': 'hour', 'start': '2026-03-01', 'end': '2026-03-01'}).json()
+        assert len(hourly['values']) == 24
+        assert hourly['values'][10] == 2
+
+    def test_analytics_page_filters_by_date_range(self, client):
+        survey, questions = self.submit_answers()
+        client.force_login(survey.created_by)
+
+        page = client.get(reverse('SurveyAnalytics', args=[survey.uuid]), {'start': '2026-03-02'})
+
+        assert page.context['total_responses'] == 1
+        rating_data = next(d for d in page.context['analytics_data'] if d['question'].id == questions[3].id)
+        assert rating_data['distribution'][2] == 1 and rating_data['distribution'][4] == 0
+
+    def test_surveys_without_rollups_read_the_responses(self, client):
+        from survey.models import ResponseRollup
+        survey, questions = self.submit_answers()
+        ResponseRollup.objects.filter(survey=survey).delete()  # answered before rollups existed
+        client.force_login(survey.created_by)
+
+        trend = client.get(reverse('survey_trend', args=[survey.uuid]), {'start': '2026-03-01', 'end': '2026-03-04'}).json()
+        assert trend['values'] == [2, 0, 1, 0]
+        hourly = client.get(reverse('survey_trend', args=[survey.uuid]), {'period': 'hour', 'start': '2026-03-01', 'end': '2026-03-01'}).json()
+        assert hourly['values'][10] == 2
+
+        page = client.get(reverse('SurveyAnalytics', args=[survey.uuid]), {'start': '2026-03-02'})
+        assert page.context['total_responses'] == 1
+        rating_data = next(d for d in page.context['analytics_data'] if d['question'].id == questions[3].id)
+        assert rating_data['distribution'][2] == 1 and rating_data['distribution'][4] == 0
+
+
+@pytest.mark.django_db
+class TestResponseIndex:
+    def test_filtered_analytics_match_analytics_of_matching_responses(self):
+        from survey.bitmaps import ResponseIndex
+        survey = make_survey()
+        questions = list(survey.questions.all())
+        multi, rating = questions[0], questions[3]
+        index = ResponseIndex.build(survey)
+
+        # Red or Green on the multiple choice question: the first two responses
+        mask = index.match({multi.id: ['Red', 'Green']})
+        assert mask.tolist() == [True, True, False, False]
+
+        expected = []
+        for question in questions:
+            answers = [a.answer_data for a in question.answers.order_by('response_id')][:2]
+            expected.append(get_question_analytics(question, answers=answers, respondent_count=sum(1 for a in answers if a != '')))
+        assert index.analytics(questions, mask) == expected
+
+        # Filters on different questions are AND'ed
+        assert index.match({multi.id: ['Red', 'Green'], rating.id: ['5']}).tolist() == [False, True, False, False]
+
+    def test_index_is_kept_in_memory_per_revision(self, settings):
+        from survey.caching import cached_response_index
+        settings.SURVEY_RESPONSE_INDEX_CACHE_SIZE = 1
+        survey, other = make_survey(), make_survey()
+
+        index = cached_response_index(survey)
+        assert cached_response_index(survey) is index
+
+        AnswerFactory(response=ResponseFactory(survey=survey), question=survey.questions.get(position=4), answer_data="3")
+        rebuilt = cached_response_index(survey)
+        assert rebuilt is not index and len(rebuilt) == 5
+
+        cached_response_index(other)  # evicts the least recently used survey
+        assert cached_response_index(survey) is not rebuilt
+
+    def test_chart_data_accepts_filters(self, client):
+        survey = make_survey()
+        multi, rating = survey.questions.get(position=1), survey.questions.get(position=4)
+        client.force_login(survey.created_by)
+        url = reverse('GetChartData', args=[survey.uuid, rating.id])
+
+        data = client.get(url, {'filter': f'{multi.id}:Yellow'}).json()
+
+        assert dict(zip(data['labels'], data['values'])) == {'1': 0, '2': 1, '3': 0, '4': 0, '5': 0}
+
+    def test_analytics_page_applies_filters(self, client):
+        survey = make_survey()
+        multi = survey.questions.get(position=1)
+        client.force_login(survey.created_by)
+
+        page = client.get(reverse('SurveyAnalytics', args=[survey.uuid]), {'filter': [f'{multi.id}:Red', f'{multi.id}:Yellow']})
+
+        assert page.context['total_responses'] == 2
+        assert [f['option'] for f in page.context['active_filters']] == ['Red', 'Yellow']
+
+
+@pytest.mark.django_db
+class TestSurveyChartData:
+    def test_returns_every_question_chart(self, client):
+        survey = make_survey()
+        client.force_login(survey.created_by)
+
+        payload = client.get(reverse('SurveyChartData', args=[survey.uuid])).json()
+
+        assert payload['total_responses'] == 4
+        for question in survey.questions.all():
+            single = client.get(reverse('GetChartData', args=[survey.uuid, question.id])).json()
+            assert payload['questions'][str(question.id)] == single
+        matrix = payload['questions'][str(survey.questions.get(position=3).id)]
+        assert matrix['is_stacked'] and matrix['labels'] == ["Row 1", "Row 2"]
+
+    def test_not_modified_until_a_new_response(self, client):
+        survey = make_survey()
+        rating = survey.questions.get(position=4)
+        client.force_login(survey.created_by)
+        url = reverse('SurveyChartData', args=[survey.uuid])
+
+        first = client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            repeat = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert repeat.status_code == 304
+        assert len(queries) <= 4  # session, user, survey, watermark
+
+        AnswerFactory(response=ResponseFactory(survey=survey), question=rating, answer_data="3")
+        assert client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code == 200
+
+
+@pytest.mark.django_db
+class TestCorrelationData:
+    def test_returns_matrix_labels_and_legend(self, client):
+        survey = make_survey(extra_ratings=1)
+        ratings = survey.questions.filter(position__in=[4, 6]).order_by('position')
+        AnswerFactory(response=survey.responses.first(), question=ratings[1], answer_data="5")
+        client.force_login(survey.created_by)
+        url = reverse('correlation_data', args=[survey.uuid])
+
+        payload = client.get(url, {'correlation_question': [q.id for q in ratings]}).json()
+
+        assert payload['labels'] == ["Q1", "Q2"]
+        assert len(payload['matrix']) == 2 and all(len(row) == 2 for row in payload['matrix'])
+        assert [item['label'] for item in payload['legend']] == [q.label for q in ratings]
+
+    def test_null_without_enough_columns(self, client):
+        survey = make_survey()
+        rating = survey.questions.get(position=4)
+        client.force_login(survey.created_by)
+        url = reverse('correlation_data', args=[survey.uuid])
+
+        assert client.get(url, {'correlation_question': rating.id}).json() is None
+        assert client.get(url).json() is None
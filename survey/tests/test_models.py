@@ -169,4 +169,73 @@ class TestMultiChoiceQuestionModel:
         
         assert distribution["Morning"] == 1
         assert distribution["Evening"] == 1
-        assert "Afternoon" not in distribution or distribution["Afternoon"] == 0
\ No newline at end of file
+        assert "Afternoon" not in distribution or distribution["Afternoon"] == 0
+
+@pytest.mark.django_db
+class TestViewCounter:
+    def test_views_are_buffered_then_flushed(self, settings):
+        from survey.counters import record_view, flush_views
+        settings.SURVEY_VIEW_COUNT_FLUSH_INTERVAL = 3600
+        settings.SURVEY_VIEW_COUNT_FLUSH_THRESHOLD = 1000
+        flush_views()
+
+        survey = SurveyFactory()
+        ResponseFactory(survey=survey)
+        for _ in range(4):
+            record_view(survey.id)
+
+        # Nothing written yet, but the completion rate already sees the hits
+        survey.refresh_from_db()
+        assert survey.view_count == 0
+        assert survey.get_completion_rate() == 25.0
+
+        flush_views()
+        survey.refresh_from_db()
+        assert survey.view_count == 4
+        assert survey.get_completion_rate() == 25.0
+
+    def test_flush_does_not_touch_other_columns(self, settings):
+        from survey.counters import record_view
+        settings.SURVEY_VIEW_COUNT_FLUSH_INTERVAL = 0
+
+        survey = SurveyFactory()
+        last_updated = survey.last_updated
+        record_view(survey.id)
+
+        survey.refresh_from_db()
+        assert survey.view_count == 1
+        assert survey.last_updated == last_updated
+
+
+@pytest.mark.django_db
+class TestDatabaseDistributions:
+    def answer(self, question, values):
+        for value in values:
+            AnswerFactory(response=ResponseFactory(survey=question.survey), question=question, answer_data=value)
+        return values
+
+    def test_multi_choice_items_are_counted_in_one_query(self, django_assert_num_queries):
+        question = MultiChoiceQuestionFactory(options=["Red", "Green", "Blue"], allow_multiple=True)
+        values = self.answer(question, [["Red", "Blue"], "Red", ["Blue"], "", None, ["Green", "Purple"], "Red"])
+
+        with django_assert_num_queries(1):
+            distribution = question.get_answer_distribution()
+
+        assert distribution == {"Red": 3, "Green": 1, "Blue": 2}
+        assert distribution == question.get_answer_distribution(values)
+
+    def test_scale_distributions_are_grouped_in_one_query(self, django_assert_num_queries):
+        likert = LikertQuestionFactory()
+        rating = RatingQuestionFactory(range_min=1, range_max=5)
+        likert_values = self.answer(likert, ["Agree", "Agree", "2", "Neutral", "", "Unknown"])
+        rating_values = self.answer(rating, ["4", "4", "5", "", "4.0", "9", "x"])
+
+        with django_assert_num_queries(2):
+            likert_distribution = likert.get_rating_distribution()
+            rating_distribution = rating.get_rating_distribution()
+
+        assert likert_distribution["Agree"] == 2
+        assert likert_distribution["Disagree"] == 1
+        assert likert_distribution == likert.get_rating_distribution(likert_values)
+        assert rating_distribution == {1: 0, 2: 0, 3: 0, 4: 3, 5: 1}
+        assert rating_distribution == rating.get_rating_distribution(rating_values)
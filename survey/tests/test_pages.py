@@ -0,0 +1,118 @@
+import pytest
+from django.urls import reverse
+from survey.pages import get_survey_page, render_survey_questions, refresh_snapshot, snapshot_path
+from survey.tests.factories import SurveyFactory, SectionHeaderFactory, MultiChoiceQuestionFactory, RatingQuestionFactory
+
+
+@pytest.mark.django_db
+class TestSurveyPageCache:
+    def test_start_page_is_served_from_cache(self, client, django_assert_max_num_queries):
+        survey = SurveyFactory(state='published', anonymous_responses=True)
+        RatingQuestionFactory(survey=survey, position=1, label="How was it?")
+        SectionHeaderFactory(survey=survey, position=2)
+        RatingQuestionFactory(survey=survey, position=3)
+
+        first = client.get(reverse('survey_start', args=[survey.uuid]))
+        assert first.context['section_count'] == 2
+        assert first.context['question_count'] == 2
+
+        # Only the survey lookup; no polymorphic question queries
+        with django_assert_max_num_queries(1):
+            second = client.get(reverse('survey_start', args=[survey.uuid]))
+        assert "How was it?" in second.content.decode()
+
+    def test_shuffled_variants_are_deterministic_per_seed(self):
+        survey = SurveyFactory(shuffle_questions=True)
+        for position in range(1, 8):
+            MultiChoiceQuestionFactory(survey=survey, position=position, randomize_options=True,
+                                       options=[f"Option {n}" for n in range(8)])
+
+        assert render_survey_questions(survey, 3)['html'] == render_survey_questions(survey, 3)['html']
+        assert render_survey_questions(survey, 3)['html'] != render_survey_questions(survey, 4)['html']
+        assert get_survey_page(survey)['shuffled']
+
+
+@pytest.mark.django_db
+class TestStaticSnapshot:
+    def test_published_survey_is_served_from_snapshot(self, client, settings, tmp_path, django_assert_num_queries):
+        import gzip, os
+        settings.SURVEY_STATIC_SNAPSHOTS = True
+        settings.SURVEY_SNAPSHOT_ROOT = str(tmp_path)
+        survey = SurveyFactory(state='published', anonymous_responses=True)
+        RatingQuestionFactory(survey=survey, position=1, label="How was it?")
+
+        refresh_snapshot(survey)
+        assert os.path.exists(snapshot_path(survey.uuid, 'en'))
+
+        with django_assert_num_queries(0):
+            page = client.get(reverse('survey_start', args=[survey.uuid]), HTTP_ACCEPT_LANGUAGE='en', HTTP_ACCEPT_ENCODING='gzip')
+            html = gzip.decompress(b"".join(page.streaming_content)).decode()
+        assert page['Content-Encoding'] == 'gzip'
+        assert "How was it?" in html
+        assert reverse('survey_session', args=[survey.uuid]) in html
+
+        session = client.get(reverse('survey_session', args=[survey.uuid])).json()
+        assert session['csrf_token'] and session['submission_token']
+
+        survey.state = 'archived'
+        survey.save()
+        refresh_snapshot(survey)
+        assert not os.path.exists(snapshot_path(survey.uuid, 'en'))
+
+    def test_deleting_a_survey_removes_its_snapshot(self, client, settings, tmp_path, django_capture_on_commit_callbacks):
+        import os
+        settings.SURVEY_STATIC_SNAPSHOTS = True
+        settings.SURVEY_SNAPSHOT_ROOT = str(tmp_path)
+        survey = SurveyFactory(state='published', anonymous_responses=True)
+        RatingQuestionFactory(survey=survey, position=1)
+        refresh_snapshot(survey)
+        client.force_login(survey.created_by)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            client.post(reverse('DeleteSurvey', args=[survey.uuid]))
+
+        assert not os.path.exists(snapshot_path(survey.uuid, 'en'))
+        assert client.get(reverse('survey_start', args=[survey.uuid])).status_code == 404
+
+    def test_previewing_a_published_survey_refreshes_its_snapshot(self, client, settings, tmp_path, django_capture_on_commit_callbacks):
+        settings.SURVEY_STATIC_SNAPSHOTS = True
+        settings.SURVEY_SNAPSHOT_ROOT = str(tmp_path)
+        survey = SurveyFactory(state='published', anonymous_responses=True, title="Feedback")
+        RatingQuestionFactory(survey=survey, position=1)
+        refresh_snapshot(survey)
+        client.force_login(survey.created_by)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            client.post(reverse('EditSurvey', args=[survey.uuid]), {
+                'title': "Renamed feedback", 'description': "How did we do?", 'action': 'preview',
+                'questions-TOTAL_FORMS': '0', 'questions-INITIAL_FORMS': '0',
+            })
+
+        with open(snapshot_path(survey.uuid, 'en'), encoding='utf-8') as f:
+            assert "Renamed feedback" in f.read()
+
+    def test_missing_gzip_copy_falls_back_to_the_rendered_page(self, client, settings, tmp_path):
+        import os
+        settings.SURVEY_STATIC_SNAPSHOTS = True
+        settings.SURVEY_SNAPSHOT_ROOT = str(tmp_path)
+        survey = SurveyFactory(state='published', anonymous_responses=True)
+        RatingQuestionFactory(survey=survey, position=1)
+        refresh_snapshot(survey)
+        os.remove(f"{snapshot_path(survey.uuid, 'en')}.gz")
+
+        page = client.get(reverse('survey_start', args=[survey.uuid]), HTTP_ACCEPT_LANGUAGE='en', HTTP_ACCEPT_ENCODING='gzip')
+
+        assert page.status_code == 200
+        assert 'Content-Encoding' not in page
+
+    def test_session_carries_the_submit_errors(self, client, settings, tmp_path):
+        settings.SURVEY_STATIC_SNAPSHOTS = True
+        settings.SURVEY_SNAPSHOT_ROOT = str(tmp_path)
+        survey = SurveyFactory(state='published', anonymous_responses=True)
+        RatingQuestionFactory(survey=survey, position=1, required=True, label="How was it?")
+
+        client.post(reverse('survey_submit', args=[survey.uuid]), {})
+        session = client.get(reverse('survey_session', args=[survey.uuid])).json()
+
+        assert [m['level'] for m in session['messages']] == ['error']
+        assert "How was it?" in session['messages'][0]['text']
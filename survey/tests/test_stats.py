@@ -0,0 +1,285 @@
+import math
+import random
+import statistics
+import numpy as np
+import pytest
+from survey.stats import describe, pad_columns, scale_statistics, label_codes
+from survey.tests.factories import LikertQuestionFactory, MatrixQuestionFactory, RatingQuestionFactory, TextQuestionFactory, AnswerFactory, ResponseFactory
+
+
+def reference(scores, midpoint):
+    """The statistics-module figures the models computed before the kernels."""
+    t_stat = None
+    if len(scores) > 1:
+        std_dev = statistics.stdev(scores)
+        t_stat = 0 if std_dev == 0 else (statistics.mean(scores) - midpoint) / (std_dev / math.sqrt(len(scores)))
+    return statistics.mean(scores), statistics.median(scores), t_stat
+
+
+class TestKernels:
+    def test_columns_match_the_statistics_module(self):
+        rng = random.Random(7)
+        score_lists = [[rng.randint(1, 7) for _ in range(rng.randint(1, 60))] for _ in range(40)]
+        score_lists += [[4], [3, 3, 3], []]
+
+        described = describe(pad_columns(score_lists))
+
+        for column, scores in enumerate(score_lists):
+            assert described['n'][column] == len(scores)
+            if len(scores) > 1:
+                assert described['stdev'][column] == pytest.approx(statistics.stdev(scores), rel=1e-12)
+            if scores:
+                assert described['mean'][column] == statistics.mean(scores)
+                assert described['median'][column] == statistics.median(scores)
+        assert np.isnan(described['mean'][-1])
+
+    def test_scale_statistics_keep_result_types(self):
+        rng = random.Random(11)
+        score_lists = [[rng.randint(1, 5) for _ in range(rng.randint(1, 30))] for _ in range(50)]
+
+        for scores, figures in zip(score_lists, scale_statistics(score_lists, midpoint=3.0, scale_points=5, integer_scores=True)):
+            mean, median, t_stat = reference(scores, 3.0)
+            assert (figures['mean'], type(figures['mean'])) == (mean, type(mean))
+            assert (figures['median'], type(figures['median'])) == (median, type(median))
+            assert (t_stat is None) == (figures['t_stat'] is None)
+            if t_stat is not None:
+                assert round(figures['t_stat'], 5) == round(t_stat, 5)
+
+    def test_counted_scores_match_expanded_scores(self):
+        rng = random.Random(13)
+        score_lists = [[rng.randint(1, 5) for _ in range(rng.randint(0, 30))] for _ in range(50)]
+        histograms = [{score: scores.count(score) for score in sorted(set(scores))} for scores in score_lists]
+
+        counted = scale_statistics([list(h) for h in histograms], midpoint=3.0, scale_points=5, integer_scores=True,
+                                   counts=[list(h.values()) for h in histograms])
+
+        for expected, figures in zip(scale_statistics(score_lists, midpoint=3.0, scale_points=5, integer_scores=True), counted):
+            assert figures == pytest.approx(expected)
+            assert (type(figures['mean']), type(figures['median'])) == (type(expected['mean']), type(expected['median']))
+
+    def test_label_codes_keep_first_position(self):
+        assert label_codes(["Low", "High", "Low"]) == {"Low": 1, "High": 2}
+
+
+@pytest.mark.django_db
+class TestQuestionStatistics:
+    def test_likert_and_rating_match_reference(self):
+        rng = random.Random(3)
+        likert = LikertQuestionFactory()
+        rating = RatingQuestionFactory(range_min=0, range_max=10)
+
+        for _ in range(30):
+            labels = [rng.choice(likert.options) for _ in range(rng.randint(1, 25))]
+            scores = likert.get_all_scores(labels)
+            mean, median, t_stat = reference(scores, 3.0)
+            statistic = likert.get_statistic(labels)
+            assert statistic['mean'] == round(mean, 3)
+            assert statistic['median'] == round(median, 3)
+            assert statistic['t_test'] == (None if t_stat is None else round(t_stat, 5))
+            index = min(max(int((round(mean, 3) - 1) / (4 / 5)), 0), 4)
+            assert statistic['interpretation'] == likert.options[index]
+
+            values = [str(rng.randint(0, 10)) for _ in range(rng.randint(1, 25))]
+            mean, median, t_stat = reference([float(v) for v in values], 5.0)
+            statistic = rating.get_statistic(values)
+            assert statistic['mean'] == round(mean, 3)
+            assert statistic['median'] == round(median, 3)
+            assert statistic['t_test'] == (None if t_stat is None else round(t_stat, 5))
+            assert statistic['interpretation'] == str(min(max(int(mean / (10 / 11)), 0), 10))
+
+    def test_matrix_rows_match_reference(self):
+        rng = random.Random(5)
+        matrix = MatrixQuestionFactory(rows=["A", "B", "C"], columns=["1", "2", "3", "4", "5"])
+        answers = [{row: rng.choice(matrix.columns + [""]) for row in ("A", "B_row2")} for _ in range(40)]
+
+        stats = matrix.get_row_statistics(answers)
+
+        for row, key in (("A", "A"), ("B", "B_row2")):
+            scores = [int(a[key]) for a in answers if a[key]]
+            mean, median, t_stat = reference(scores, 3.0)
+            assert stats[row]['mean'] == round(mean, 2)
+            assert stats[row]['median'] == round(median, 2)
+            assert stats[row]['t_stat'] == round(t_stat, 5)
+        assert stats["C"] == {'mean': 0, 'median': 0, 'interpretation': 'N/A', 't_stat': 0}
+
+
+class TestSketch:
+    def test_small_scales_stay_exact_and_merge(self):
+        from survey import sketch
+        rng = random.Random(13)
+        first = [rng.randint(1, 5) for _ in range(501)]
+        second = [rng.randint(1, 5) for _ in range(300)]
+
+        digest = sketch.merge(sketch.empty(), [(v, 1) for v in first])
+        other = sketch.merge(sketch.empty(), [(v, 1) for v in second])
+        sketch.merge(digest, other['centroids'])
+
+        assert digest['exact'] and len(digest['centroids']) == 5
+        assert digest['n'] == len(first + second) and digest['sum'] == sum(first + second)
+        assert sketch.median(digest) == statistics.median(first + second)
+
+    def test_wide_scales_are_compressed(self):
+        from survey import sketch
+        rng = random.Random(17)
+        values = [rng.randint(0, 1000) for _ in range(20000)]
+
+        digest = sketch.empty()
+        for start in range(0, len(values), 1000):
+            sketch.merge(digest, [(v, 1) for v in values[start:start + 1000]])
+
+        assert not digest['exact']
+        assert len(digest['centroids']) <= 2 * sketch.COMPRESSION
+        assert digest['n'] == len(values)
+        assert abs(sketch.median(digest) - statistics.median(values)) <= 10
+        assert abs(sketch.quantile(digest, 0.99) - sorted(values)[int(0.99 * len(values))]) <= 10
+
+
+@pytest.mark.django_db
+class TestSketchAnalytics:
+    def test_large_questions_read_the_sketch(self, settings):
+        from survey.aggregates import aggregate_analytics, rebuild_aggregates
+        from survey.models import QuestionAggregate
+        from survey.tests.factories import AnswerFactory, ResponseFactory
+        from survey.utility import get_question_analytics
+        rating = RatingQuestionFactory(range_min=1, range_max=5)
+        for value in ["1", "4", "4", "5", "2", "", "x"]:
+            AnswerFactory(response=ResponseFactory(survey=rating.survey), question=rating, answer_data=value)
+        rebuild_aggregates([rating])
+        aggregate = QuestionAggregate.objects.get(question=rating)
+
+        settings.SURVEY_SKETCH_MIN_ANSWERS = 1
+        # The sketch path does not need the exact histogram
+        from_sketch = aggregate_analytics(rating, QuestionAggregate(answered=aggregate.answered, sketch=aggregate.sketch))
+        settings.SURVEY_SKETCH_MIN_ANSWERS = None
+        exact = aggregate_analytics(rating, aggregate)
+
+        assert aggregate.sketch['n'] == 5
+        assert from_sketch == exact == get_question_analytics(rating)
+
+
+@pytest.mark.django_db
+class TestNumericMatrix:
+    def test_matches_numeric_export_converted_by_pandas(self, settings):
+        import pandas as pd
+        from survey.numeric import build_sparse_matrix
+        from survey.tests.test_analytics import make_survey
+        from survey.utility import get_survey_export_data
+        survey = make_survey()
+        questions = list(survey.questions.all())
+        text = TextQuestionFactory(survey=survey, position=10, is_long_answer=False)
+        for response, value in zip(survey.responses.order_by('id'), ["0", "great", "", "2.5"]):
+            AnswerFactory(response=response, question=text, answer_data=value)
+        questions.append(text)
+        questions.append(RatingQuestionFactory(survey=survey, position=11))  # never answered
+        settings.SURVEY_CORRELATION_BLOCK_CELLS = 5  # several blocks of rows
+
+        matrix, headers, observed, response_ids = build_sparse_matrix(survey, questions)
+
+        head, rows, _ = get_survey_export_data(survey, 'numeric', responses=survey.responses.order_by('id'))
+        expected = pd.DataFrame(rows, columns=head).drop(columns=['Respondent', 'Submitted At'])\
+                     .apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        assert headers == head[2:]
+        assert response_ids == list(survey.responses.order_by('id').values_list('id', flat=True))
+        assert matrix.nnz < expected.size
+        np.testing.assert_array_equal(matrix.toarray(), expected)
+        np.testing.assert_array_equal(observed, ~np.isnan(expected).all(axis=0))
+        assert not observed[-1]
+
+
+class TestSparseCorrelation:
+    def test_pearson_matches_pandas(self):
+        import pandas as pd
+        from survey.sparse import CSRMatrix, pearson
+        rng = np.random.default_rng(7)
+        dense = (rng.random((500, 40)) < 0.1).astype(float)
+        dense[:, :5] = rng.integers(1, 6, size=(500, 5))
+        dense[rng.random((500, 40)) < 0.05] = np.nan
+        dense[:, 7] = 0  # option nobody chose
+        dense[:, 8] = 3  # constant rating
+
+        rows, cols = np.nonzero(~np.isnan(dense))
+        matrix = CSRMatrix.from_cells(rows, cols, dense[rows, cols], dense.shape)
+
+        expected = pd.DataFrame(dense).fillna(0).corr().fillna(0).to_numpy()
+        # Small blocks, to accumulate XᵀX over many of them
+        np.testing.assert_allclose(pearson(500, matrix.column_sums(), matrix.gram(max_cells=400)), expected, atol=1e-12)
+
+    def test_repeated_cells_keep_the_last_value(self):
+        from survey.sparse import CSRMatrix
+        matrix = CSRMatrix.from_cells([0, 1, 0, 1], [1, 0, 1, 2], [5.0, 2.0, 0.0, 3.0], (2, 3))
+
+        np.testing.assert_array_equal(matrix.toarray(), [[0, 0, 0], [2, 0, 3]])
+
+    def test_typed_array_cells_and_nan_fill(self):
+        from array import array
+        from survey.sparse import CSRMatrix
+        matrix = CSRMatrix.from_cells(array('i', [0, 1, 1]), array('i', [1, 0, 1]), array('d', [5.0, 0.0, np.nan]),
+                                      (2, 2), fill=[np.nan, 0.0])
+
+        # The answered 0 is kept, the NaN is missing; the correlation side sees 0s
+        np.testing.assert_array_equal(matrix.toarray(), [[np.nan, 5], [0, 0]])
+        np.testing.assert_array_equal(matrix.column_counts(), [1, 1])
+        np.testing.assert_array_equal(next(matrix.row_blocks(4)), [[0, 5], [0, 0]])
+
+
+@pytest.mark.django_db
+class TestCorrelationStats:
+    def test_submissions_update_the_statistics_incrementally(self):
+        from survey.correlation import correlation_of, rebuild_correlation_stats
+        from survey.models import CorrelationStats
+        from survey.numeric import build_sparse_matrix
+        from survey.submission import build_submission, save_submissions
+        from survey.tests.test_analytics import make_survey
+        survey = make_survey()
+        questions = list(survey.questions.order_by('position'))
+        rebuild_correlation_stats(survey)
+
+        fields = [{'question_id': q.id} for q in questions]
+        save_submissions([build_submission(survey, None, list(zip(fields, values))) for values in [
+            (["Red"], "Disagree", {"Row 1": "Col 1", "Row 2": "Col 2"}, "1", {"Option A": "1", "Option B": "2", "Option C": "3"}),
+            ("Blue", "Agree", {"Row 1": "Col 3", "Row 2": ""}, "3", {"Option A": "3", "Option B": "1", "Option C": "2"}),
+        ]])
+        assert CorrelationStats.objects.get(survey=survey).n == 6
+
+        matrix = build_sparse_matrix(survey, questions)[0].toarray()
+        selected_ids = [questions[1].id, questions[3].id]
+        selected, correlation, observed, n = correlation_of(survey, selected_ids)
+
+        # Likert options then the rating column, as df.fillna(0).corr().fillna(0)
+        import pandas as pd
+        from survey.numeric import question_columns
+        starts = np.cumsum([0] + [len(question_columns(q)[0]) for q in questions])
+        columns = list(range(starts[1], starts[2])) + [starts[3]]
+        expected = pd.DataFrame(matrix[:, columns]).fillna(0).corr().fillna(0).to_numpy()
+        assert [q.id for q in selected] == selected_ids and n == 6
+        assert observed.all()
+        np.testing.assert_allclose(correlation, expected, atol=1e-9)
+        # Served from the incremental statistics, not rebuilt
+        assert CorrelationStats.objects.get(survey=survey).n == 6
+
+    def test_stale_statistics_are_rebuilt_on_read(self):
+        from survey.correlation import correlation_of, rebuild_correlation_stats
+        from survey.models import CorrelationStats
+        from survey.tests.test_analytics import make_survey
+        survey = make_survey()
+        rebuild_correlation_stats(survey)
+
+        # Answers stored outside save_submissions leave n behind the response count
+        AnswerFactory(response=ResponseFactory(survey=survey), question=survey.questions.get(position=4), answer_data="5")
+        assert correlation_of(survey)[3] == 5
+        assert CorrelationStats.objects.get(survey=survey).n == 5
+
+    def test_wide_surveys_are_left_to_the_rebuild(self, settings):
+        from survey.correlation import correlation_of, rebuild_correlation_stats
+        from survey.models import CorrelationStats
+        from survey.submission import build_submission, save_submissions
+        from survey.tests.test_analytics import make_survey
+        settings.SURVEY_CORRELATION_INCREMENTAL_MAX_COLUMNS = 5
+        survey = make_survey()
+        rating = survey.questions.get(position=4)
+        rebuild_correlation_stats(survey)
+
+        save_submissions([build_submission(survey, None, [({'question_id': rating.id}, "3")])])
+
+        assert CorrelationStats.objects.get(survey=survey).n == 4
+        assert correlation_of(survey)[3] == 5
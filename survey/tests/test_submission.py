@@ -0,0 +1,328 @@
+import io
+import pytest
+from django.urls import reverse
+from survey.models import Answer, QuestionAggregate, Response, ResponseRollup, Survey
+from survey.submission import get_submission_plan, parse_submission, validate_submission, decode_matrix, decode_rank
+from django.http import QueryDict
+from survey.tests.factories import (
+    SurveyFactory,
+    SectionHeaderFactory,
+    MultiChoiceQuestionFactory,
+    MatrixQuestionFactory,
+    RankQuestionFactory,
+    RatingQuestionFactory,
+    TextQuestionFactory,
+)
+
+
+@pytest.mark.django_db
+class TestSurveySubmit:
+    def make_survey(self):
+        survey = SurveyFactory(state='published', anonymous_responses=True)
+        MultiChoiceQuestionFactory(survey=survey, position=1, required=True, options=["Red", "Blue"])
+        SectionHeaderFactory(survey=survey, position=2)
+        MatrixQuestionFactory(survey=survey, position=3, required=False, rows=["Service", "Quality"], columns=["Poor", "Good"])
+        RankQuestionFactory(survey=survey, position=4, required=False, options=["A", "B", "C"])
+        RatingQuestionFactory(survey=survey, position=5, required=False)
+        return survey
+
+    def test_submission_is_parsed_and_stored(self, client):
+        survey = self.make_survey()
+        client.post(reverse('survey_submit', args=[survey.uuid]), {
+            'question_1': 'Red',
+            'Service_row1': 'Good',
+            'question_4': ['C', 'B', 'A'],
+            'question_5': '4',
+        })
+
+        response = Response.objects.get(survey=survey)
+        data = {a.question.position: a.answer_data for a in response.answers.all()}
+        assert data[1] == 'Red'
+        assert data[3] == {'Service': 'Good', 'Quality': ''}
+        assert data[4] == {'A': '1', 'B': '2', 'C': '3'}
+        assert data[5] == '4'
+
+    def test_answers_are_inserted_in_one_batch(self, client, django_assert_max_num_queries):
+        survey = self.make_survey()
+        for position in range(6, 40):
+            RatingQuestionFactory(survey=survey, position=position, required=False)
+
+        # The first submission caches the plan and creates the question aggregates and rollups
+        client.post(reverse('survey_submit', args=[survey.uuid]), {'question_1': 'Red'})
+
+        # survey + savepoints + 2 INSERTs + aggregate and rollup SELECT/UPDATEs, independent of question count
+        with django_assert_max_num_queries(10):
+            client.post(reverse('survey_submit', args=[survey.uuid]), {'question_1': 'Blue'})
+
+        assert Answer.objects.filter(response__survey=survey).count() == 76
+
+    def test_replayed_token_is_stored_once(self, client):
+        survey = self.make_survey()
+        url = reverse('survey_submit', args=[survey.uuid])
+        payload = {'question_1': 'Red', 'submission_token': 'a' * 32}
+
+        first = client.post(url, payload)
+        second = client.post(url, payload)
+
+        assert first.status_code == second.status_code == 200
+        response = Response.objects.get(survey=survey)
+        assert response.submission_token == 'a' * 32
+        assert Answer.objects.filter(response__survey=survey).count() == 4
+
+    def test_start_page_renders_a_fresh_token(self, client):
+        survey = self.make_survey()
+        first = client.get(reverse('survey_start', args=[survey.uuid]))
+        second = client.get(reverse('survey_start', args=[survey.uuid]))
+
+        assert first.context['submission_token'] != second.context['submission_token']
+        assert b'name="submission_token"' in first.content
+
+    def test_missing_required_answer_writes_nothing(self, client, django_assert_num_queries):
+        survey = self.make_survey()
+        get_submission_plan(survey)
+
+        # Only the survey lookup: validation runs before any write is attempted
+        with django_assert_num_queries(1):
+            result = client.post(reverse('survey_submit', args=[survey.uuid]), {'question_5': '3'})
+
+        assert result.status_code == 302
+        assert not Response.objects.filter(survey=survey).exists()
+
+
+@pytest.mark.django_db
+class TestSubmissionPlan:
+    def test_plan_compiles_keys_and_decoders(self):
+        survey = SurveyFactory()
+        MatrixQuestionFactory(survey=survey, position=1, rows=["Service", "Quality"])
+        SectionHeaderFactory(survey=survey, position=2)
+        rank = RankQuestionFactory(survey=survey, position=3)
+
+        plan = get_submission_plan(survey)
+
+        assert len(plan['fields']) == 2
+        assert plan['fields'][0]['decoder'] is decode_matrix
+        assert plan['fields'][0]['row_keys'] == [("Service", "Service_row1"), ("Quality", "Quality_row2")]
+        assert plan['fields'][1]['decoder'] is decode_rank
+        assert plan['fields'][1]['question_id'] == rank.id
+
+    def test_plan_is_cached_per_revision(self, django_assert_num_queries):
+        survey = SurveyFactory()
+        RatingQuestionFactory(survey=survey, position=1)
+        plan = get_submission_plan(survey)
+
+        with django_assert_num_queries(0):
+            assert get_submission_plan(survey) == plan
+
+        # Editing the survey bumps last_updated, which is a new revision
+        RatingQuestionFactory(survey=survey, position=2)
+        survey.save()
+        survey = Survey.objects.get(pk=survey.pk)
+        assert len(get_submission_plan(survey)['fields']) == 2
+
+
+@pytest.mark.django_db
+class TestValidateSubmission:
+    def validate(self, survey, **data):
+        post = QueryDict(mutable=True)
+        for key, value in data.items():
+            post.setlist(key, value if isinstance(value, list) else [value])
+        return validate_submission(parse_submission(get_submission_plan(survey), post))
+
+    def test_valid_payload(self):
+        survey = SurveyFactory()
+        MultiChoiceQuestionFactory(survey=survey, position=1, required=True, allow_multiple=True, the_minimum_number_of_options_to_be_selected=2)
+        TextQuestionFactory(survey=survey, position=2, required=False, is_long_answer=False, min_length=3, max_length=10)
+        RatingQuestionFactory(survey=survey, position=3, required=False, range_min=1, range_max=5)
+
+        assert self.validate(survey, question_1=['Red', 'Blue'], question_2='hello', question_3='5') == []
+        # Optional questions may be skipped entirely
+        assert self.validate(survey, question_1=['Red', 'Blue']) == []
+
+    def test_rule_violations(self):
+        survey = SurveyFactory()
+        MultiChoiceQuestionFactory(survey=survey, position=1, required=True, allow_multiple=True, the_minimum_number_of_options_to_be_selected=2)
+        TextQuestionFactory(survey=survey, position=2, required=False, is_long_answer=False, min_length=3, max_length=10)
+        RatingQuestionFactory(survey=survey, position=3, required=False, range_min=1, range_max=5)
+        MatrixQuestionFactory(survey=survey, position=4, required=True, rows=["Service", "Quality"])
+
+        errors = self.validate(survey, question_1='Red', question_2='a' * 11, question_3='9', Service_row1='Col 1')
+
+        assert len(errors) == 4
+
+
+@pytest.mark.django_db
+class TestSubmissionSpool:
+    def test_spooled_submissions_are_drained_in_bulk(self, client, settings, tmp_path):
+        from django.core.management import call_command
+        from survey import spool
+        settings.SURVEY_SUBMISSION_SPOOL = True
+        settings.SURVEY_SPOOL_PATH = tmp_path / 'spool.sqlite3'
+
+        survey = SurveyFactory(state='published', anonymous_responses=True)
+        question = RatingQuestionFactory(survey=survey, position=1, required=True)
+        for score in ['2', '4', '5']:
+            result = client.post(reverse('survey_submit', args=[survey.uuid]), {'question_1': score})
+            assert result.status_code == 200
+
+        # Respondents got their thank-you page, nothing hit the main tables yet
+        assert not Response.objects.filter(survey=survey).exists()
+        assert spool.pending_count() == 3
+
+        call_command('drain_submissions', '--once', stdout=io.StringIO())
+
+        assert spool.pending_count() == 0
+        assert sorted(Answer.objects.filter(question=question).values_list('answer_data', flat=True)) == ['2', '4', '5']
+
+        # The aggregated question ids survive the spool's JSON round-trip
+        histogram = {'"2"': 1, '"4"': 1, '"5"': 1}
+        aggregate = QuestionAggregate.objects.get(question=question)
+        assert (aggregate.answered, aggregate.values) == (3, histogram)
+        rollup = ResponseRollup.objects.get(survey=survey, period='day')
+        assert rollup.responses == 3
+        assert rollup.questions[str(question.id)]['values'] == histogram
+
+
+@pytest.mark.django_db(transaction=True)
+class TestGroupCommit:
+    def test_concurrent_submissions_share_a_commit(self, monkeypatch):
+        import threading
+        from django.db import connection
+        from survey import submission as submission_module
+        from survey.submission import GroupCommitter, build_submission, parse_submission
+
+        survey = SurveyFactory(state='published')
+        RatingQuestionFactory(survey=survey, position=1)
+        plan = get_submission_plan(survey)
+        post = QueryDict('question_1=3')
+
+        groups = []
+        save_submissions = submission_module.save_submissions
+        def counting_save(submissions):
+            groups.append(len(submissions))
+            return save_submissions(submissions)
+        monkeypatch.setattr(submission_module, 'save_submissions', counting_save)
+
+        committer = GroupCommitter(window=0.2, max_batch=50)
+        def respond():
+            try:
+                committer.submit(build_submission(survey, None, parse_submission(plan, post)))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=respond) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert Response.objects.filter(survey=survey).count() == 8
+        assert sum(groups) == 8
+        assert len(groups) < 8
+
+
+@pytest.mark.django_db
+class TestImportResponses:
+    def test_ndjson_lines_are_validated_and_bulk_inserted(self, client, settings):
+        import json
+        settings.SURVEY_IMPORT_CHUNK_SIZE = 2
+        survey = SurveyFactory(state='published')
+        question = RatingQuestionFactory(survey=survey, position=1, required=True, range_min=1, range_max=5)
+        client.force_login(survey.created_by)
+
+        lines = [
+            {'answers': {'question_1': '4'}, 'submitted_at': '2025-03-01T10:00:00Z', 'submission_token': 'k1'},
+            {'answers': {'question_1': 5}},
+            {'answers': {'question_1': '9'}},
+            'not json',
+            {'answers': {'question_1': '2'}, 'submission_token': 'k1'},
+            {'answers': {'question_1': '1'}},
+        ]
+        body = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+
+        result = client.post(reverse('import_responses', args=[survey.uuid]), body, content_type='application/x-ndjson')
+        report = result.json()
+
+        assert report['imported'] == 3
+        assert report['replayed'] == 1
+        assert [e['line'] for e in report['errors']] == [3, 4]
+        assert sorted(Answer.objects.filter(question=question).values_list('answer_data', flat=True)) == ['1', '4', '5']
+        assert Response.objects.get(submission_token='k1').created_at.year == 2025
+
+    def test_anonymous_clients_get_a_401(self, client):
+        survey = SurveyFactory(state='published')
+
+        result = client.post(reverse('import_responses', args=[survey.uuid]), '', content_type='application/x-ndjson')
+
+        assert result.status_code == 401
+
+    def test_overlong_tokens_are_line_errors(self, client):
+        import json
+        survey = SurveyFactory(state='published')
+        RatingQuestionFactory(survey=survey, position=1, required=True, range_min=1, range_max=5)
+        client.force_login(survey.created_by)
+        body = json.dumps({'answers': {'question_1': '4'}, 'submission_token': 'k' * 65})
+
+        report = client.post(reverse('import_responses', args=[survey.uuid]), body, content_type='application/x-ndjson').json()
+
+        assert report['imported'] == 0
+        assert [e['line'] for e in report['errors']] == [1]
+
+    def test_failed_chunks_are_reported(self, client, settings, monkeypatch):
+        import json
+        from django.db import DatabaseError
+        from survey import submission
+        settings.SURVEY_IMPORT_CHUNK_SIZE = 2
+        survey = SurveyFactory(state='published')
+        RatingQuestionFactory(survey=survey, position=1, required=True, range_min=1, range_max=5)
+        client.force_login(survey.created_by)
+        save_submissions = submission.save_submissions
+
+        def failing_second_chunk(submissions):
+            if submissions[0]['line'] == 3:
+                raise DatabaseError('value too long')
+            return save_submissions(submissions)
+
+        monkeypatch.setattr(submission, 'save_submissions', failing_second_chunk)
+        body = "\n".join(json.dumps({'answers': {'question_1': str(n)}}) for n in range(1, 6))
+
+        report = client.post(reverse('import_responses', args=[survey.uuid]), body, content_type='application/x-ndjson').json()
+
+        assert report['imported'] == 3
+        assert report['failed_chunks'] == [{'lines': [3, 4], 'error': 'value too long'}]
+        assert Response.objects.filter(survey=survey).count() == 3
+
+
+@pytest.mark.django_db
+class TestImportResponsesCommand:
+    def test_raw_export_round_trips_through_the_importer(self, tmp_path):
+        import csv
+        from django.core.management import call_command
+        from survey.utility import get_survey_export_data
+        from survey.tests.factories import AnswerFactory, ResponseFactory
+
+        survey = SurveyFactory()
+        multi = MultiChoiceQuestionFactory(survey=survey, position=1, label="Colors", allow_multiple=True, options=["Red", "Blue"])
+        matrix = MatrixQuestionFactory(survey=survey, position=2, label="Grid", rows=["Service", "Quality"], columns=["Poor", "Good"])
+        rank = RankQuestionFactory(survey=survey, position=3, label="Order", options=["A", "B"])
+        rating = RatingQuestionFactory(survey=survey, position=4, label="Score")
+
+        for colors, score in [(["Red", "Blue"], "4"), ("Red", "2")]:
+            response = ResponseFactory(survey=survey)
+            AnswerFactory(response=response, question=multi, answer_data=colors)
+            AnswerFactory(response=response, question=matrix, answer_data={"Service": "Good", "Quality": "Poor"})
+            AnswerFactory(response=response, question=rank, answer_data={"A": "2", "B": "1"})
+            AnswerFactory(response=response, question=rating, answer_data=score)
+        ResponseFactory(survey=survey, respondent=None)
+
+        header, rows, _ = get_survey_export_data(survey, 'raw')
+        csv_path = tmp_path / 'history.csv'
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+        Response.objects.filter(survey=survey).delete()
+        call_command('import_responses', str(survey.uuid), str(csv_path), '--chunk-size', '2', stdout=io.StringIO())
+
+        _, imported_rows, _ = get_survey_export_data(survey, 'raw')
+        assert sorted(imported_rows) == sorted(rows)
@@ -1,5 +1,6 @@
 from django.http import QueryDict
 import pytest
+from django.urls import reverse
 from survey.tests.factories import (
     RatingQuestionFactory, ResponseFactory, SurveyFactory, SectionHeaderFactory, AnswerFactory, MatrixQuestionFactory, MultiChoiceQuestionFactory, LikertQuestionFactory)
 from survey.utility import (
@@ -174,11 +175,12 @@ class TestGetCorrelationTable:
             AnswerFactory(response=r, question=q1, answer_data=str(s1))
             AnswerFactory(response=r, question=q2, answer_data=str(s2))
         
-        # This should generate a base64 string
-        chart_b64 = get_correlation_table(survey)
+        # This should generate the matrix for the client-side heatmap
+        table = get_correlation_table(survey)
         
-        assert isinstance(chart_b64, str)
-        assert len(chart_b64) > 100 # Ensure it's not an empty string
+        assert table['labels'] == ["Q1", "Q2"]
+        assert len(table['matrix']) == 2 and len(table['matrix'][0]) == 2
+        assert table['legend'] == [{'code': 'Q1', 'label': 'Service'}, {'code': 'Q2', 'label': 'Price'}]
 
     def test_get_correlation_table_success(self):
         survey = SurveyFactory()
@@ -199,13 +201,13 @@ class TestGetCorrelationTable:
             AnswerFactory(response=resp, question=q1, answer_data=s1)
             AnswerFactory(response=resp, question=q2, answer_data=s2)
         
-        chart_b64 = get_correlation_table(survey)
+        table = get_correlation_table(survey)
         
         # Assertions
-        assert chart_b64 is not None
-        assert isinstance(chart_b64, str)
-        # Check for the base64 PNG header (standard for encoded images)
-        assert len(chart_b64) > 500
+        assert table is not None
+        assert table['matrix'][0][0] == 1.0
+        assert table['matrix'][0][1] > 0.8
+        assert table['matrix'][0][1] == table['matrix'][1][0]
 
     def test_get_correlation_table_incompatible_columns(self):
         survey = SurveyFactory()
@@ -215,10 +217,10 @@ class TestGetCorrelationTable:
             resp = ResponseFactory(survey=survey)
             AnswerFactory(response=resp, question=q1, answer_data=str(i))
             
-        chart_b64 = get_correlation_table(survey)
+        table = get_correlation_table(survey)
         
-        # Should return None because df.shape[1] < 2
-        assert chart_b64 is None
+        # Should return None because there are fewer than 2 columns
+        assert table is None
 
     def test_get_correlation_table_no_variance(self):
         survey = SurveyFactory()
@@ -231,11 +233,11 @@ class TestGetCorrelationTable:
             AnswerFactory(response=resp, question=q1, answer_data="5")
             AnswerFactory(response=resp, question=q2, answer_data="5")
             
-        chart_b64 = get_correlation_table(survey)
+        table = get_correlation_table(survey)
         
 
-        # 'if correlation_matrix.empty: return None'
-        assert chart_b64 is not None or chart_b64 is None
+        # Columns without variance correlate as 0, even with themselves
+        assert table['matrix'] == [[0.0, 0.0], [0.0, 0.0]]
 
     def test_get_correlation_table_with_matrix(self):
         survey = SurveyFactory()
@@ -251,10 +253,10 @@ class TestGetCorrelationTable:
             resp = ResponseFactory(survey=survey)
             AnswerFactory(response=resp, question=q_matrix, answer_data={"Cleanliness_row1": "Good"})
             
-        chart_b64 = get_correlation_table(survey)
+        table = get_correlation_table(survey)
 
         # in the test above the corr will generate two columns Cleanliness [Poor] and Cleanliness [Good]
-        assert chart_b64 is not None
+        assert table['labels'] == ["Q1 [Cleanliness - Poor]", "Q1 [Cleanliness - Good]"]
 
 @pytest.mark.django_db
 class TestSurveyDataBySections:  
@@ -413,3 +415,17 @@ class TestSurveyDataBySections:
         results = get_survey_data_by_sections(survey)
         assert results[0]['rows'][0][0] == "Anonymous"
 
+
+@pytest.mark.django_db
+class TestResponsesPage:
+    def test_lists_the_users_surveys(self, client):
+        survey = SurveyFactory(title="Customer Feedback")
+        ResponseFactory(survey=survey)
+        client.force_login(survey.created_by)
+
+        page = client.get(reverse('Responses'))
+        assert page.status_code == 200
+        assert "Customer Feedback" in page.content.decode()
+
+        partial = client.get(reverse('Responses'), {'q': 'Customer'}, HTTP_HX_REQUEST='true')
+        assert partial.status_code == 200
@@ -21,7 +21,9 @@ urlpatterns = [
     path("survey/<uuid:uuid>/copy", views.CopySurveyView, name="Copy"),
     path('surveys/<uuid:uuid>/delete-confirm', views.delete_survey_confirm, name='DeleteSurveyConfirmModal'),
     path("surveys/<uuid:uuid>/delete", views.DeleteSurvey, name="DeleteSurvey"),
+    path('survey/<uuid:uuid>/session', views.survey_session, name='survey_session'),
     path('survey/<uuid:uuid>/submit', views.survey_submit, name='survey_submit'),
+    path('api/survey/<uuid:uuid>/responses/import', views.import_responses, name='import_responses'),
     
     # the views need to be Change
     path('responses', views.Responses, name='Responses'),
@@ -35,6 +37,9 @@ urlpatterns = [
 
     # API endpoint for chart data
     path('api/survey/<uuid:uuid>/question/<int:question_id>/chart-data', views.GetChartData, name='GetChartData'),
+    path('api/survey/<uuid:uuid>/chart-data', views.SurveyChartData, name='SurveyChartData'),
+    path('api/survey/<uuid:uuid>/correlation', views.correlation_data, name='correlation_data'),
+    path('api/survey/<uuid:uuid>/trend', views.survey_trend, name='survey_trend'),
 ]
 
 url_for_htmx = [
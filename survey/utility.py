@@ -4,23 +4,8 @@ from django.core.paginator import Paginator
 from django.db.models import Q, Count
 from datetime import  datetime
 from .models import SectionHeader, Response, LikertQuestion, MultiChoiceQuestion, MatrixQuestion, RankQuestion, Answer, RatingQuestion
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import seaborn as sns
-import matplotlib.pyplot as plt
-import io
-import urllib, base64
+from .correlation import correlation_of
 import numpy as np
-import arabic_reshaper
-from bidi.algorithm import get_display
-
-def fix_ar(text):
-    if not text:
-        return ""
-    reshaped_text = arabic_reshaper.reshape(str(text))
-    bidi_text = get_display(reshaped_text)
-    return bidi_text
 
 def normalize_formset_indexes( data: QueryDict, prefix: str):
     """
@@ -336,58 +321,64 @@ def organize_survey_sections(survey):
     
     return sections
 
-def get_question_analytics(question):
+def get_question_analytics(question, answers=None, respondent_count=None):
     """
     Calculate and return analytics data for a single question.
+    `answers` (the question's answer_data values) and `respondent_count` can be
+    passed in pre-gathered, as analytics.get_survey_analytics does; otherwise
+    they are queried here.
     """
-    # Count unique respondents who answered this question (excluding empty answers)
-    unique_respondents = Answer.objects.filter(question=question)\
-                                       .exclude(answer_data__isnull=True)\
-                                       .exclude(answer_data__exact='')\
-                                       .values('response')\
-                                       .distinct()\
-                                       .count()
+    if answers is None:
+        answers = list(Answer.objects.filter(question=question).values_list('answer_data', flat=True))
+
+    if respondent_count is None:
+        # Count unique respondents who answered this question (excluding empty answers)
+        respondent_count = Answer.objects.filter(question=question)\
+                                         .exclude(answer_data__isnull=True)\
+                                         .exclude(answer_data__exact='')\
+                                         .values('response')\
+                                         .distinct()\
+                                         .count()
     
     data = {
         'question': question,
         'type': type(question).__name__,
-        'total_question_answers': unique_respondents 
+        'total_question_answers': respondent_count 
     }
     
     # Polymorphic handling - optimization: use 'question' directly if it's already the child instance
     # (Django Polymorphic handles this if QuerySet was polymorphic, otherwise check type)
     
     if isinstance(question, MultiChoiceQuestion):
-        data['distribution'] = question.get_answer_distribution()
+        data['distribution'] = question.get_answer_distribution(answers)
         data['chart_type'] = 'bar'
         
     elif isinstance(question, LikertQuestion):
-        data.update(question.get_statistic())
-        data['distribution'] = question.get_rating_distribution()
+        data.update(question.get_statistic(answers))
+        data['distribution'] = question.get_rating_distribution(answers)
         data['chart_type'] = 'bar'
         
     elif isinstance(question, RatingQuestion):
-        data.update(question.get_statistic())
-        data['distribution'] = question.get_rating_distribution()
-        data['average'] = question.get_average_rating()
+        data.update(question.get_statistic(answers))
+        data['distribution'] = question.get_rating_distribution(answers)
+        data['average'] = question.get_average_rating(answers)
         data['chart_type'] = 'bar'
         
     elif isinstance(question, RankQuestion):
-        data['distribution'] = question.get_average_ranks()
+        data['distribution'] = question.get_average_ranks(answers)
         data['chart_type'] = 'bar'
         
     elif isinstance(question, MatrixQuestion):
         # Override total_question_answers for MatrixQuestion to exclude empty submissions
         # (Matrix answers are saved as dicts with empty strings, so generic exclude fails)
         valid_responses_count = 0
-        all_matrix_answers = Answer.objects.filter(question=question)
-        for ans in all_matrix_answers:
-            if isinstance(ans.answer_data, dict) and any(v for v in ans.answer_data.values() if v):
+        for answer_data in answers:
+            if isinstance(answer_data, dict) and any(v for v in answer_data.values() if v):
                 valid_responses_count += 1
         data['total_question_answers'] = valid_responses_count
 
-        distribution = question.get_matrix_distribution()
-        stats = question.get_row_statistics()
+        distribution = question.get_matrix_distribution(answers)
+        stats = question.get_row_statistics(answers)
         
         # Calculate respondents count per row
         # This assumes distribution[row] has counts for each column
@@ -414,12 +405,18 @@ def get_question_analytics(question):
         
     return data
 
-def get_correlation_table(survey, questions_id: list = None, split_count: int = 1):
-    head, rows, data_questions = get_survey_export_data(survey, format_type='numeric', questions_id=questions_id)
+def get_correlation_table(survey, questions_id: list = None):
+    """
+    Correlation matrix of the numeric columns of the selected questions, for the
+    client-side heatmap: {'labels': [...], 'matrix': [[...]], 'legend': [...]},
+    or None when fewer than two columns hold numbers.
+    """
+    # Correlation of the selected columns, from the survey's running statistics (n, column sums, XᵀX)
+    data_questions, correlation, observed, response_count = correlation_of(survey, questions_id)
 
     # If not enough rows or columns, we can't do correlation
-    if not rows or len(head) < 2:
-        return [], []
+    if not response_count or observed.sum() < 2:
+        return None
 
     # Build Legend and Short Headers
     new_headers = []
@@ -448,135 +445,10 @@ def get_correlation_table(survey, questions_id: list = None, split_count: int =
         else:
             new_headers.append(code)
 
-    # head is [Col1, Col2, ...]
-    # rows is [[val1, val2...], [val1, val2...]]
-    df = pd.DataFrame(rows, columns=head)
-    
-    # Clean data: Remove non-numeric columns and convert
-    cols_to_drop = ['Respondent', 'Submitted At']
-    
-    # We must drop these FIRST before replacing columns because head includes them
-    df_clean = df.drop(columns=[c for c in cols_to_drop if c in df.columns], errors='ignore')
-    
-    # Now df_clean columns should match new_headers length
-    if len(df_clean.columns) == len(new_headers):
-        df_clean.columns = new_headers
-    
-    df_clean = df_clean.apply(pd.to_numeric, errors='coerce')
-    df_clean = df_clean.dropna(axis=1, how='all') # Drop empty cols
-    df_clean = df_clean.fillna(0)
-
-    # Need at least 2 columns with variance for correlation
-    num_total_vars = df_clean.shape[1]
-    if num_total_vars < 2:
-        return [], []
-    
-    # 1. Calculate Full Correlation Matrix
-    correlation_matrix = df_clean.corr().fillna(0)
-
-    # Process Arabic labels
-    new_labels = [fix_ar(col) for col in correlation_matrix.columns]
-    correlation_matrix.columns = new_labels
-    correlation_matrix.index = new_labels
-
-    # Validate split_count
-    try:
-        split_count = int(split_count)
-    except (ValueError, TypeError):
-        split_count = 1
-        
-    if split_count < 1: split_count = 1
-    if split_count > 4: split_count = 4 # Max limit
-    
-    # Ensure splits have at least 2 variables (if possible)
-    if split_count > 1 and (num_total_vars // split_count) < 2:
-         split_count = 1 # Fallback to no split if resulting chunks are too small
-
-    charts = []
-    
-    # Calculate chunk size
-    # Grid Tiling Strategy: Determine block size
-    chunk_size = -(-num_total_vars // split_count) # Ceiling division
-
-    # Nested Loops for Grid Tiling
-    for row_start in range(0, num_total_vars, chunk_size):
-        row_end = min(row_start + chunk_size, num_total_vars)
-        
-        for col_start in range(0, num_total_vars, chunk_size):
-            col_end = min(col_start + chunk_size, num_total_vars)
-
-            # Slice the correlation matrix which corresponds to:
-            # Rows: questions[row_start:row_end]
-            # Cols: questions[col_start:col_end]
-            sub_matrix = correlation_matrix.iloc[row_start:row_end, col_start:col_end]
-            
-            if sub_matrix.empty:
-                continue
-
-            # ---------------------------------------------------------
-            # PLOTTING
-            # ---------------------------------------------------------
-            n_rows, n_cols = sub_matrix.shape
-            
-            # Logic for sizing based on view type
-            if split_count == 1:
-                # Full View: compact & organized sizes to prevent "zoomed out" look
-                if n_cols > 25:
-                     figsize = (20, 18)
-                     annot_size = 7
-                elif n_cols > 15:
-                     figsize = (16, 14) 
-                     annot_size = 8
-                else:
-                     figsize = (11, 9)
-                     annot_size = 10
-                
-                sns.set_context("paper", font_scale=1.0)
-            else:
-                # Split View (Tiles): Zoomed in detailing
-                cell_size = 0.8
-                figsize = (max(10, n_cols * cell_size), max(8, n_rows * cell_size))
-                annot_size = 9
-                sns.set_context("paper", font_scale=1.1)
-
-            plt.figure(figsize=figsize)
-            fmt = ".2f"
-            
-            try:
-                ax = sns.heatmap(
-                    sub_matrix, 
-                    annot=True, 
-                    fmt=fmt, 
-                    cmap='YlGnBu', 
-                    linewidths=0.5, 
-                    linecolor='white',
-                    cbar=True,
-                    annot_kws={"size": annot_size}
-                )
-                
-                # Move X-Axis Labels to Top
-                ax.xaxis.set_ticks_position('top')
-                ax.xaxis.set_label_position('top')
-                
-                # Title with Range
-                range_title = f"{fix_ar('Features')} {row_start + 1}-{row_end} {fix_ar('vs')} {col_start + 1}-{col_end}"
-                plt.title(range_title, fontsize=16, pad=40)
-                
-                # Rotate top labels for readability
-                plt.xticks(rotation=45, fontsize=10, ha='left')
-                plt.yticks(rotation=0, fontsize=10)
-                plt.tight_layout()
-        
-                # ---------------------------------------------------------
-                # SAVE TO BUFFER (Base64)
-                # ---------------------------------------------------------
-                buffer = io.BytesIO()
-                plt.savefig(buffer, format='png', bbox_inches='tight')
-                buffer.seek(0)
-                string = base64.b64encode(buffer.read()).decode('utf-8')
-                charts.append(string)
-                
-            finally:
-                plt.close()
-
-    return charts, legend
+    # Drop empty cols (no number in any response); missing values count as 0
+    keep = np.flatnonzero(observed)
+    return {
+        'labels': [new_headers[i] for i in keep],
+        'matrix': np.round(correlation[np.ix_(keep, keep)], 4).tolist(),
+        'legend': legend,
+    }
@@ -1,17 +1,22 @@
 from django import forms
 from django.forms import BooleanField, HiddenInput
 import csv
+import hashlib
 import json
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, FileResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404, render
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_GET, etag
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
 from django.db.models import Q, Count, Avg, Max, Prefetch
-from django.db import transaction
+from django.db import transaction, IntegrityError
 from django.core.paginator import Paginator
 from .models import Question as que, Survey, Response, Answer, MultiChoiceQuestion, LikertQuestion, CustomUser, Question, SectionHeader, RatingQuestion, RankQuestion, MatrixQuestion, TextQuestion
 from .forms import MultiChoiceQuestionForm, RatingQuestionForm, SurveyForm,  LikertQuestionForm,  QuestionFormSet, MatrixQuestionForm, RankQuestionForm, TextQuestionForm, SectionHeaderForm, CustomUserCreationForm
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
+from django.conf import settings
 from datetime import timedelta, datetime
 from django.views import View
 from django.views.generic import CreateView, UpdateView, DeleteView, DetailView
@@ -19,12 +24,22 @@ from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib import messages
 from django.utils.translation import gettext as _
-from .utility import normalize_formset_indexes, get_dashboard_surveys, get_survey_export_data,organize_survey_sections, get_question_analytics, get_correlation_table, get_survey_data_by_sections
+from .utility import normalize_formset_indexes, get_dashboard_surveys, get_survey_export_data,organize_survey_sections, get_survey_data_by_sections
+from .caching import response_watermark, analytics_revision, cached_survey_analytics, cached_correlation_table, cached_export_data, cached_sections_data, cached_response_index
+from .counters import record_view
+from .aggregates import aggregate_analytics
+from .analytics import chart_payload
+from .rollups import PERIODS, parse_day, day_start, rollups_complete, trend, window_aggregates
+from .bitmaps import parse_filters
+from .pages import get_survey_page, snapshot_path
+from .submission import get_submission_plan, warm_submission_plan, parse_submission, validate_submission, build_submission, commit_submission, is_replay, parse_ndjson_submissions, save_in_chunks
+from .spool import spool_submission
 from django.urls import reverse_lazy
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout
 from django.contrib.auth.mixins import LoginRequiredMixin
 import zipfile
+import uuid as uuid_lib
 import io
 from django.shortcuts import render
 from allauth.account.views import LoginView, SignupView
@@ -130,6 +145,9 @@ def create_survey(request):
             survey.question_count = survey.real_question_count
             survey.save(update_fields=['question_count'])
 
+        if new_state == 'published':
+            warm_submission_plan(survey)
+
         return redirect('/Dashboard')
 
     return render(request, template_name, {
@@ -228,6 +246,9 @@ def edit_survey(request, uuid):
             updated_survey.question_count = updated_survey.real_question_count
             updated_survey.save(update_fields=['question_count'])
 
+        if new_state == 'published':
+            warm_submission_plan(updated_survey)
+
         return redirect('/Dashboard')
 
     return render(request, template_name, {
@@ -665,6 +686,29 @@ def GetResponseDetail(request, response_id):
         'answers': display_items
     })
 
+def filtered_survey_analytics(request, survey, questions, watermark=None):
+    """
+    Analytics of `questions` under the request's cross-filters and date range.
+    Returns (analytics data, matching responses, filters, start date, end date).
+    """
+    watermark = watermark or response_watermark(survey)
+    revision = analytics_revision(survey, watermark)
+    start_date = parse_day(request.GET.get('start'))
+    end_date = parse_day(request.GET.get('end'))
+    filters = parse_filters(request.GET.getlist('filter'))
+    windowed = bool(start_date or end_date)
+    if filters or (windowed and not rollups_complete(survey, watermark[1])):
+        # Cross-filter (AND/OR of the per-option response bitmaps), or a date
+        # range the rollups do not cover yet: read from the response index
+        index = cached_response_index(survey, revision)
+        mask = index.match(filters) & index.between(start_date, end_date)
+        return index.analytics(questions, mask), int(mask.sum()), filters, start_date, end_date
+    if windowed:
+        # Date range: summed from the daily rollups of the window
+        aggregates, total_responses = window_aggregates(survey, questions, start_date, end_date)
+        return [aggregate_analytics(q, aggregates[q.id]) for q in questions], total_responses, filters, start_date, end_date
+    return cached_survey_analytics(survey, questions, revision), watermark[1], filters, start_date, end_date
+
 @login_required
 def SurveyAnalytics(request, uuid):
     """Analytics and charts for a specific survey"""
@@ -692,87 +736,105 @@ def SurveyAnalytics(request, uuid):
     
     # 3. Prepare analytics data using helper
     # Logic note: organize_survey_sections filters SectionHeaders out of 'questions' list already
-    analytics_data = [get_question_analytics(q) for q in questions_to_analyze]
-    
+    # Cached per response watermark; a miss is one answer stream for the whole page
+    watermark = response_watermark(survey)
+    revision = analytics_revision(survey, watermark)
+    analytics_data, total_responses, filters, start_date, end_date = \
+        filtered_survey_analytics(request, survey, questions_to_analyze, watermark)
+
     context = {
         'survey': survey,
         'analytics_data': analytics_data,
-        'total_responses': survey.response_count,
+        'total_responses': total_responses,
+        'start_date': start_date,
+        'end_date': end_date,
+        'active_filters': describe_filters(request, survey, filters),
+        'filter_query': request.GET.urlencode(),
         'sections': sections,
         'selected_section': selected_section_id,
         'current_section_label': current_section_label,
         'displayed_question_count': len(analytics_data),
-        'chart': get_correlation_table(survey, [q.id for q in questions_to_analyze]) if current_section_label != "All Sections" else None,
+        # A section's questions are correlated as soon as the page loads
+        'correlation_questions': [q.id for q in questions_to_analyze] if current_section_label != "All Sections" else [],
     }
     
     return render(request, 'SurveyAnalytics.html', context)
 
+def describe_filters(request, survey, filters):
+    """Active cross-filters for display, each with the query string that removes it."""
+    if not filters:
+        return []
+    labels = dict(survey.questions.filter(pk__in=filters).values_list('pk', 'label'))
+    described = []
+    for question_id, options in filters.items():
+        for option in options:
+            query = request.GET.copy()
+            query.setlist('filter', [f for f in query.getlist('filter') if f != f"{question_id}:{option}"])
+            described.append({'question': labels.get(question_id, question_id), 'option': option,
+                              'value': f"{question_id}:{option}", 'remove_query': query.urlencode()})
+    return described
+
 @login_required
 def GetChartData(request, uuid, question_id):
     """API endpoint to get chart data for a specific question"""
     survey = get_object_or_404(Survey, uuid=uuid, created_by=request.user)
-    question = get_object_or_404(que, pk=question_id)
-    
-    data = {
-        'labels': [],
-        'values': [],
-        'question_label': question.label,
-    }
-    
-    if isinstance(question, MultiChoiceQuestion):
-        mc_question = MultiChoiceQuestion.objects.get(pk=question.pk)
-        distribution = mc_question.get_answer_distribution()
-        data['labels'] = list(distribution.keys())
-        data['values'] = list(distribution.values())
-        
-    elif isinstance(question, LikertQuestion):
-        likert_question = LikertQuestion.objects.get(pk=question.pk)
-        distribution = likert_question.get_rating_distribution()
-        data['labels'] = [str(k) for k in distribution.keys()]
-        data['values'] = list(distribution.values())
-        data['average'] = likert_question.get_mean()
-        
-    elif isinstance(question, RatingQuestion):
-        rating_question = RatingQuestion.objects.get(pk=question.pk)
-        distribution = rating_question.get_rating_distribution()
-        data['labels'] = [str(k) for k in distribution.keys()]
-        data['values'] = list(distribution.values())
-        data['average'] = rating_question.get_average_rating()
-        
-    elif isinstance(question, RankQuestion):
-        rank_question = RankQuestion.objects.get(pk=question.pk)
-        distribution = rank_question.get_average_ranks()
-        # distribution is {option: avg_rank}
-        # We might want to sort by rank (which is already sorted in the method)
-        data['labels'] = list(distribution.keys())
-        data['values'] = list(distribution.values())
-
-    elif isinstance(question, MatrixQuestion):
-        mx_question = MatrixQuestion.objects.get(pk=question.pk)
-        distribution = mx_question.get_matrix_distribution()
-        # Complex struct for stacked bar:
-        # labels = Rows
-        # datasets = Columns (each col is a stack)
-        data['labels'] = mx_question.rows
-        data['datasets'] = []
-        
-        # We need a list of values for each column across all rows
-        for col in mx_question.columns:
-            col_values = []
-            for row in mx_question.rows:
-                 # get count for this cell (row, col)
-                 count = distribution.get(row, {}).get(col, 0)
-                 col_values.append(count)
-            
-            data['datasets'].append({
-                'label': col,
-                'data': col_values
-            })
-        data['is_stacked'] = True
-    
-    return JsonResponse(data)
+    question = get_object_or_404(que, pk=question_id, survey=survey)
+
+    question_data = filtered_survey_analytics(request, survey, [question])[0][0]
+    return JsonResponse(chart_payload(question_data))
+
+def chart_data_etag(request, uuid):
+    """ETag of the survey chart data: its analytics revision and the request's filters."""
+    survey = get_object_or_404(Survey, uuid=uuid, created_by=request.user)
+    return hashlib.md5(f"{analytics_revision(survey)}?{request.GET.urlencode()}".encode()).hexdigest()
+
+@require_GET
+@login_required
+@cache_control(private=True, no_cache=True)
+@etag(chart_data_etag)
+def SurveyChartData(request, uuid):
+    """
+    API endpoint with the chart data of every question of a survey (or of the
+    comma-separated `questions` ids), keyed by question id. Answers with 304
+    Not Modified while no response came in and the survey was not edited.
+    """
+    survey = get_object_or_404(Survey, uuid=uuid, created_by=request.user)
+    questions = survey.questions.not_instance_of(SectionHeader).order_by('position')
+    requested = [int(pk) for pk in request.GET.get('questions', '').split(',') if pk.isdigit()]
+    if requested:
+        questions = questions.filter(pk__in=requested)
+
+    analytics_data, total_responses = filtered_survey_analytics(request, survey, list(questions))[:2]
+    return JsonResponse({
+        'total_responses': total_responses,
+        'questions': {data['question'].id: chart_payload(data) for data in analytics_data},
+    })
 
 
+@require_GET
+@login_required
+def survey_trend(request, uuid):
+    """
+    API endpoint for the response trend chart: responses per hour or day
+    between the start and end dates (default: the last SURVEY_TREND_DEFAULT_DAYS days).
+    """
+    survey = get_object_or_404(Survey, uuid=uuid, created_by=request.user)
+    period = request.GET.get('period', 'day')
+    if period not in PERIODS:
+        return JsonResponse({'error': _('Unknown period.')}, status=400)
+
+    end_date = parse_day(request.GET.get('end')) or timezone.localdate()
+    start_date = parse_day(request.GET.get('start')) or end_date - timedelta(days=settings.SURVEY_TREND_DEFAULT_DAYS - 1)
+    if start_date > end_date or (end_date - start_date).days >= settings.SURVEY_TREND_MAX_DAYS:
+        return JsonResponse({'error': _('Invalid date range.')}, status=400)
+
+    series = trend(survey, period, day_start(start_date), day_start(end_date + timedelta(days=1)))
+    label_format = '%Y-%m-%d %H:00' if period == 'hour' else '%Y-%m-%d'
+    return JsonResponse({
+        'period': period,
+        'labels': [bucket.strftime(label_format) for bucket, _count in series],
+        'values': [count for _bucket, count in series],
+    })
 
 @require_POST
 @login_required
@@ -837,6 +899,9 @@ def ToggleSurveyStatus(request, uuid):
         
     survey.save()
 
+    if survey.state == 'published':
+        warm_submission_plan(survey)
+
     saved_state = request.session.get('dashboard_last_state', {})
     saved_page = saved_state.get('page_number', 1)
     saved_params = saved_state.get('params', {})
@@ -860,25 +925,64 @@ def ToggleSurveyStatusConfirm(request, uuid):
 
 def survey_Start_View(request, uuid):
     """View to start taking the survey."""
+    # A published static snapshot needs neither the template engine nor the DB
+    if settings.SURVEY_STATIC_SNAPSHOTS:
+        path = snapshot_path(uuid, request.LANGUAGE_CODE)
+        gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+        try:
+            # The file actually served may be missing while a snapshot is (un)published
+            snapshot = open(f'{path}.gz' if gzipped else path, 'rb')
+        except FileNotFoundError:
+            pass
+        else:
+            response = FileResponse(snapshot, content_type='text/html; charset=utf-8')
+            if gzipped:
+                response['Content-Encoding'] = 'gzip'
+            response['Vary'] = 'Accept-Encoding'
+            return response
+
     survey = get_object_or_404(Survey, uuid=uuid, state='published')
     if not survey.anonymous_responses and not request.user.is_authenticated:
         login_url = reverse('respondent_login')
         next_url = request.path
         return redirect(f"{login_url}?next={next_url}")
         
-    # Increment view count
-    survey.view_count += 1
-    survey.save()
+    # Increment view count (buffered, flushed with F() updates)
+    record_view(survey.id)
     
-    questions = survey.questions.all().order_by('position')
+    # Rendered question flow, served from cache after the first render
+    page = get_survey_page(survey)
     
     context = {
         'survey': survey,
-        'questions': questions,
+        'questions_html': page['html'],
+        'section_count': page['section_count'],
+        'question_count': page['question_count'],
+        'submission_token': uuid_lib.uuid4().hex,
     }
 
     return render(request, 'Survey_Start.html', context)
 
+@require_GET
+def survey_session(request, uuid):
+    """
+    Per-visitor part of a static survey snapshot: the CSRF and submission
+    tokens and the pending messages (e.g. survey_submit's validation errors),
+    or the login URL when the survey does not accept anonymous answers.
+    Also counts the page view the snapshot itself cannot record.
+    """
+    survey = get_object_or_404(Survey.objects.only('id', 'anonymous_responses'), uuid=uuid, state='published')
+    if not survey.anonymous_responses and not request.user.is_authenticated:
+        login_url = reverse('respondent_login')
+        return JsonResponse({'login_url': f"{login_url}?next={reverse('survey_start', args=[uuid])}"})
+
+    record_view(survey.id)
+    return JsonResponse({
+        'csrf_token': get_token(request),
+        'submission_token': uuid_lib.uuid4().hex,
+        'messages': [{'level': message.tags, 'text': str(message)} for message in messages.get_messages(request)],
+    })
+
 @login_required
 def survey_preview_view(request, uuid):
     """Read-only preview of a saved survey"""
@@ -932,62 +1036,35 @@ def survey_submit(request, uuid):
     survey = get_object_or_404(Survey, uuid=uuid)
 
     if request.method == 'POST':
+        # 0. A replayed submit (double tap, network retry) gets the original result
+        token = request.POST.get('submission_token') or None
+        if is_replay(token):
+            return render(request, 'Thanks.html', {'survey': survey})
+
+        # 1. Parse the whole payload before touching the database
+        plan = get_submission_plan(survey)
+        answers = parse_submission(plan, request.POST)
+
+        # 2. Server-side Validation (invalid payloads never open a write transaction)
+        errors = validate_submission(answers)
+        if errors:
+            for error in errors:
+                messages.error(request, error)
+            redirect_url = reverse('survey_start', args=[survey.uuid])
+            return redirect(redirect_url)
+
+        # 3. Persist the response and all its answers in one batch (group-committed
+        #    with concurrent submissions), or hand them to the local spool
         try:
-            with transaction.atomic():
-                respondent = request.user if request.user.is_authenticated else None
-                response = Response.objects.create(survey=survey, respondent=respondent)
-
-                for question in survey.questions.all():   
-                    if isinstance(question, SectionHeader):
-                        continue  # Skip SectionHeader questions
-
-                    base_key = f'question_{question.position}'
-                    values = request.POST.getlist(base_key)
-                    
-                    if question.NAME in  ['Matrix Question', "سؤال مصفوفة"]:
-                        answer_data = {}
-                        for i, row_label in enumerate(question.rows, start=1):
-                            old_key = f'{row_label}_row{i}'
-                            val = request.POST.get(old_key)
-                            if val:
-                                answer_data[row_label] = val
-                            else:
-                                answer_data[row_label] = ""  # some default value
-
-
-                    elif question.NAME in ['Rank Question', 'Ranking Question', "سؤال ترتيب"]:
-                        if values:
-                            # Save as dict where key is the rank (1-based)
-                            # values are typically ordered from top (1) to bottom (N)
-                            # Using enumerate(values, 1) maps FirstItem -> 1, SecondItem -> 2
-                            # The original code used values[::-1]. If the frontend sends [First, Second], 
-                            # values[::-1] is [Second, First]. Enumerate gives Second:1, First:2.
-                            # This implies the frontend sends reverse order OR the user wants reverse scoring.
-                            # We will preserve existing logic for now, but adding the correct name check.
-                            answer_data = {val: str(i) for i, val in enumerate(values[::-1], start=1)}
-                        else:
-                            answer_data = ""
-
-                    else:
-                        if len(values) > 1:
-                            answer_data = values 
-                        elif len(values) == 1:
-                            answer_data = values[0] # Single string handling
-                        else:
-                            answer_data = ''
-                    
-                    # 2. Server-side Validation
-                    if question.required and not answer_data:
-                        redirect_url = reverse('survey_start', args=[survey.uuid])
-                        return redirect(redirect_url)
-
-                    if answer_data is not None:
-                        Answer.objects.create(
-                            response=response,
-                            question=question,
-                            answer_data=answer_data
-                        )
-        
+            respondent = request.user if request.user.is_authenticated else None
+            submission = build_submission(survey, respondent, answers, token=token)
+            if settings.SURVEY_SUBMISSION_SPOOL:
+                spool_submission(submission)
+            else:
+                commit_submission(submission)
+        except IntegrityError:
+            # A concurrent replay with the same token won the race
+            return render(request, 'Thanks.html', {'survey': survey})
         except Exception as e:
             # Handle exceptions, possibly logging or user feedback
             return HttpResponse("An error occurred while submitting the survey.", status=500)
@@ -995,6 +1072,44 @@ def survey_submit(request, uuid):
             logout(request)
         return render(request, 'Thanks.html', {'survey': survey})
 
+IMPORT_CONTENT_TYPES = ('application/x-ndjson', 'application/json')
+
+@csrf_exempt
+@require_POST
+def import_responses(request, uuid):
+    """
+    Batch import for offline/kiosk collection. The body is NDJSON, one response
+    per line (see parse_ndjson_submissions). Valid lines are stored in chunked
+    bulk inserts; the reply reports what was imported, the errors per line and
+    the chunks the database rejected.
+
+    This is an API: anonymous clients get a 401 instead of the login redirect.
+    CSRF is covered by requiring the NDJSON content type, which a cross-site
+    form cannot send without a CORS preflight.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': _('Authentication required.')}, status=401)
+    if request.content_type not in IMPORT_CONTENT_TYPES:
+        return JsonResponse({'error': _('Expected an application/x-ndjson body.')}, status=415)
+    survey = get_object_or_404(Survey, uuid=uuid, created_by=request.user)
+
+    errors = []
+    failed_chunks = []
+
+    def on_error(chunk, exc):
+        lines = [s['line'] for s in chunk]
+        failed_chunks.append({'lines': [lines[0], lines[-1]], 'error': str(exc)})
+
+    submissions = parse_ndjson_submissions(survey, request, errors)
+    imported, replayed = save_in_chunks(submissions, settings.SURVEY_IMPORT_CHUNK_SIZE, on_error=on_error)
+
+    return JsonResponse({
+        'imported': imported,
+        'replayed': replayed,
+        'errors': errors,
+        'failed_chunks': failed_chunks,
+    })
+
 def export_survey_data(request, uuid):
     """
     Export survey responses.
@@ -1019,7 +1134,7 @@ def export_survey_data(request, uuid):
     
     if view_mode == 'sections' and has_sections:
         # Export as ZIP containing multiple CSVs
-        results = get_survey_data_by_sections(survey, format_type)
+        results = cached_sections_data(survey, format_type)
         
         # In-memory ZIP buffer
         zip_buffer = io.BytesIO()
@@ -1069,7 +1184,7 @@ def export_survey_data(request, uuid):
         writer = csv.writer(response)
         
         # Export as Flat Table
-        header, rows, _ = get_survey_export_data(survey, format_type)
+        header, rows, _ = cached_export_data(survey, format_type)
         
         if custom_headers:
             # Basic validation: only replace if lengths match to avoid misalignment
@@ -1130,12 +1245,23 @@ def SurveyDataGrid(request, uuid):
 
 @login_required
 def correlation_table(request, uuid):
+    """The correlation card for the selected questions; the heatmap is drawn from correlation_data."""
     survey = get_object_or_404(Survey, uuid=uuid, created_by=request.user)
     questions_id = request.GET.getlist('correlation_question', None)
-    split_count = request.GET.get('split', 1)
+    return render(request, 'partials/SurveyAnalytics/correlation_table.html', {'survey': survey, 'correlation_questions': questions_id})
 
+@require_GET
+@login_required
+@cache_control(private=True, no_cache=True)
+@etag(chart_data_etag)
+def correlation_data(request, uuid):
+    """
+    API endpoint with the correlation matrix of the selected questions
+    (correlation_question ids): {'labels', 'matrix', 'legend'}, or null when
+    fewer than two columns hold numbers.
+    """
+    survey = get_object_or_404(Survey, uuid=uuid, created_by=request.user)
+    questions_id = request.GET.getlist('correlation_question')
     if not questions_id:
-        return render(request, 'partials/SurveyAnalytics/correlation_table.html', {'charts': [], 'legend': [], 'survey': survey})
-
-    charts, legend = get_correlation_table(survey, questions_id, split_count=split_count)
-    return render(request, 'partials/SurveyAnalytics/correlation_table.html', {'charts': charts, 'legend': legend, 'survey': survey})
\ No newline at end of file
+        return JsonResponse(None, safe=False)
+    return JsonResponse(cached_correlation_table(survey, questions_id), safe=False)
\ No newline at end of file